@@ -7,25 +7,56 @@ import streamlit as st
 import os
 import sys
 import time
-from dotenv import load_dotenv
+import uuid
+import html
 from datetime import datetime
 
 # Add utils directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
 
-from utils.openai_helper import (
-    generate_character_profile, chat_with_character, analyze_fortune,
-    generate_character_image, download_image
-)
+from utils.openai_helper import generate_character_profile, chat_with_character, get_last_usage
 from utils.supabase_helper import (
-    create_character, create_session, save_message, 
-    end_session, get_conversation_history, save_fortune_result,
-    get_all_sessions, get_session_detail, upload_image_to_storage,
-    update_character_image
+    create_character, create_session, start_returning_guest, save_message,
+    get_all_sessions, get_session_detail, summarize_usage, expire_sessions
+)
+from utils.image_helper import pick_variant
+from utils.avatar import avatar_data_uri
+from utils.portrait import start_portrait, wait_for_portrait
+from utils import metrics, profiler
+from utils.config import load_env
+from utils.admission import AdmissionRejected, get_admission_stats
+from utils.job_queue import (
+    JOB_COMPLETED, JOB_FAILED, enqueue_analysis, get_analysis_job
 )
+from utils.realtime_helper import create_inbox, is_realtime_connected
+from utils.speculative import SpeculativeAnalyzer, draft_matches
+from utils.singleflight import once, get_duplicate_stats
+from utils.http_client import get_connection_stats
+from utils.session_memory import Transcript, track, get_memory_stats
+from utils.prompts import chat_history
+
+# 프로파일링 모드(PROFILE_RERUNS)에서는 외부 호출 helper의 소요 시간을 재실행 기록에 남깁니다
+generate_character_profile = profiler.timed(generate_character_profile)
+chat_with_character = profiler.timed(chat_with_character)
+create_character = profiler.timed(create_character)
+create_session = profiler.timed(create_session)
+start_returning_guest = profiler.timed(start_returning_guest)
+save_message = profiler.timed(save_message)
+get_all_sessions = profiler.timed(get_all_sessions)
+get_session_detail = profiler.timed(get_session_detail)
+enqueue_analysis = profiler.timed(enqueue_analysis)
+get_analysis_job = profiler.timed(get_analysis_job)
+get_admission_stats = profiler.timed(get_admission_stats)
+
+FORTUNE_FIELDS = ("fortune_analysis", "personality_analysis", "advice", "summary")
+
+# 프로필 칸에 표시하는 인물 이미지 크기(CSS px)
+PORTRAIT_DISPLAY_PX = 192
 
 # Load environment variables
-load_dotenv()
+load_env()
+
+profiler.start_rerun(st.session_state)
 
 # Page configuration
 st.set_page_config(
@@ -36,6 +67,7 @@ st.set_page_config(
 )
 
 # Custom CSS for traditional Korean aesthetic
+profiler.checkpoint("css")
 st.markdown("""
 <style>
     .main-header {
@@ -202,8 +234,10 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Initialize session state
+profiler.checkpoint("session_state")
 if 'messages' not in st.session_state:
-    st.session_state.messages = []
+    # 최근 턴만 메모리에 두는 대화 기록 (세션이 만들어지면 새로 만듭니다)
+    st.session_state.messages = Transcript()
 if 'character' not in st.session_state:
     st.session_state.character = None
 if 'character_id' not in st.session_state:
@@ -218,22 +252,398 @@ if 'view_mode' not in st.session_state:
     st.session_state.view_mode = 'new'  # 'new', 'history', 'detail'
 if 'selected_session_id' not in st.session_state:
     st.session_state.selected_session_id = None
+if 'client_id' not in st.session_state:
+    # 로그인 기능이 없으므로 요청 수락 제어는 브라우저 세션 단위로 구분합니다
+    st.session_state.client_id = uuid.uuid4().hex
+if 'inbox' not in st.session_state:
+    # Realtime으로 전달되는 변경 이벤트를 받는 곳
+    st.session_state.inbox = create_inbox()
+if 'history_sessions' not in st.session_state:
+    st.session_state.history_sessions = None
+if 'session_detail' not in st.session_state:
+    st.session_state.session_detail = None
+if 'analysis_job_status' not in st.session_state:
+    st.session_state.analysis_job_status = None
+if 'analysis_polled_at' not in st.session_state:
+    st.session_state.analysis_polled_at = 0.0
+if 'analysis_partial' not in st.session_state:
+    # 스트리밍 해석 중 먼저 완성된 항목들
+    st.session_state.analysis_partial = {}
+if 'speculative' not in st.session_state:
+    # 대화 중 미리 해 두는 초안 해석
+    st.session_state.speculative = None
+if 'greet_key' not in st.session_state:
+    # "손님 맞이하기" 동작의 멱등 키 (성공할 때까지 재실행/중복 클릭에도 같은 값)
+    st.session_state.greet_key = None
+if 'portrait_future' not in st.session_state:
+    # 마감 시간 안에 끝나지 않은 초상화 생성 작업
+    st.session_state.portrait_future = None
+if 'show_earlier_turns' not in st.session_state:
+    # 메모리에서 내려놓은 이전 대화를 DB에서 불러와 보여줄지 여부
+    st.session_state.show_earlier_turns = False
+
+# 보고 있지 않은 기록 화면의 데이터는 들고 있지 않습니다 (다시 열면 새로 읽음)
+if st.session_state.view_mode != 'detail':
+    st.session_state.session_detail = None
+if st.session_state.view_mode != 'history':
+    st.session_state.history_sessions = None
+session_memory_bytes = track(st.session_state.client_id, st.session_state)
+
+def watch_realtime_sessions():
+    """진행 중인 세션과 보고 있는 기록의 변경 이벤트만 Inbox로 받도록 범위를 맞춥니다."""
+    st.session_state.inbox.watch(
+        {st.session_state.session_id, st.session_state.selected_session_id},
+        history=st.session_state.view_mode == 'history',
+    )
+
+watch_realtime_sessions()
+
+def apply_realtime_events() -> bool:
+    """
+    Inbox에 쌓인 변경 이벤트를 세션 상태(현재 결과, 기록 목록, 상세 보기)에 반영합니다.
+    
+    Returns:
+        화면을 다시 그려야 하는지 여부
+    """
+    changed = False
+    detail = st.session_state.session_detail
+    watch_realtime_sessions()
+    
+    for event in st.session_state.inbox.drain():
+        record = event["record"]
+        
+        if event["table"] == "fortune_results":
+            session_id = record.get("session_id")
+            # UPDATE는 다시 해석해 결과가 바뀐 경우이므로 이미 받은 결과도 바꿉니다
+            if session_id == st.session_state.session_id and (
+                not st.session_state.fortune_result or event["type"] == "UPDATE"
+            ):
+                st.session_state.fortune_result = {key: record.get(key) for key in FORTUNE_FIELDS}
+                changed = True
+            if detail and detail.get("id") == session_id:
+                detail["fortune_result"] = record
+                changed = True
+        
+        elif event["table"] == "analysis_job_events":
+            # 알림에는 결과가 없으므로 자기 세션의 작업만 다시 읽습니다
+            if record.get("session_id") == st.session_state.session_id and not st.session_state.fortune_result:
+                job = get_analysis_job(st.session_state.session_id)
+                if job:
+                    st.session_state.analysis_job_status = job.get("status")
+                    if job.get("status") == JOB_COMPLETED:
+                        st.session_state.fortune_result = job.get("result")
+                    else:
+                        st.session_state.analysis_partial = job.get("result") or {}
+                    changed = True
+        
+        elif event["table"] == "sessions":
+            session_id = record.get("id")
+            if st.session_state.history_sessions is not None:
+                known = False
+                for session in st.session_state.history_sessions:
+                    if session["id"] == session_id:
+                        session.update(record)
+                        known = True
+                if not known:
+                    # 목록을 불러온 뒤 생긴 세션이므로 다음 화면에서 목록을 새로 불러옵니다
+                    st.session_state.history_sessions = None
+                changed = True
+            if detail and detail.get("id") == session_id:
+                detail.update(record)
+                changed = True
+    
+    return changed
+
+@st.fragment(run_every=1)
+def realtime_listener():
+    """Realtime으로 받은 변경 사항이 있으면 화면을 다시 그립니다. (자기 해석 작업 알림을 받았을 때만 DB를 조회합니다)"""
+    if apply_realtime_events():
+        st.rerun()
+
+def queue_feedback(placeholder):
+    """대기열 순번을 placeholder에 표시하는 콜백을 만듭니다."""
+    def on_wait(position):
+        placeholder.info(f"⏳ 요청이 많아 잠시 기다리는 중입니다... (대기 순번: {position})")
+    return on_wait
+
+def rejection_message(error: AdmissionRejected) -> str:
+    """수락 거절 사유를 사용자 안내 문구로 변환합니다."""
+    if error.retry_after:
+        return f"요청이 많아 처리하지 못했습니다. 약 {max(1, round(error.retry_after))}초 후에 다시 시도해주세요."
+    return "요청이 많아 처리하지 못했습니다. 잠시 후에 다시 시도해주세요."
+
+@profiler.timed
+def render_portrait(character: dict):
+    """
+    인물 이미지를 표시 크기에 맞는 가장 작은 썸네일로 지연 로딩하여 그립니다.
+    썸네일이 없는 예전 인물은 원본 이미지를 사용합니다.
+    """
+    started = time.perf_counter()
+    variants = character.get('image_variants') or {}
+    one_x = pick_variant(variants, PORTRAIT_DISPLAY_PX)
+    two_x = pick_variant(variants, PORTRAIT_DISPLAY_PX, dpr=2)
+    
+    if one_x:
+        src = one_x['url']
+        srcset = f' srcset="{html.escape(one_x["url"])} 1x, {html.escape(two_x["url"])} 2x"'
+        # 기기 픽셀 비율에 따라 둘 중 하나만 받으므로 두 값을 모두 기록합니다
+        metrics.observe("portrait.bytes_per_view.1x", one_x.get('bytes') or 0)
+        metrics.observe("portrait.bytes_per_view.2x", two_x.get('bytes') or 0)
+    else:
+        src = character.get('image_url')
+        if not src or src == 'None' or str(src).strip() == '':
+            # 초상화가 아직 없거나 실패했으면 로컬 아바타를 바로 보여줍니다
+            avatar_started = time.perf_counter()
+            src = avatar_data_uri(character)
+            metrics.observe("portrait.avatar_seconds", time.perf_counter() - avatar_started)
+            metrics.incr("portrait.views.avatar")
+        else:
+            metrics.incr("portrait.views.without_variants")
+        srcset = ''
+    
+    st.markdown(
+        f'<img src="{html.escape(src)}"{srcset} alt="{html.escape(str(character.get("name", "인물")))}" '
+        f'loading="lazy" decoding="async" width="{PORTRAIT_DISPLAY_PX}" height="{PORTRAIT_DISPLAY_PX}" '
+        f'style="width: 100%; max-width: {PORTRAIT_DISPLAY_PX}px; height: auto; border-radius: 0.5rem;">'
+        '<div style="color: #888; font-size: 0.875em; margin-top: 0.25rem;">인물 이미지</div>',
+        unsafe_allow_html=True
+    )
+    metrics.observe("portrait.render_seconds", time.perf_counter() - started)
+
+@profiler.timed
+def render_compatibility(character: dict, character_id: str):
+    """이 손님과 궁합이 잘 맞는 지난 손님을 보여줍니다. (궁합 캐시가 준비된 뒤부터 표시)"""
+    if not character or not character_id:
+        return
+    # 궁합 계산(NumPy)은 이 화면을 처음 그릴 때 불러옵니다
+    from utils.compatibility import top_matches
+    
+    matches = top_matches({**character, "id": character_id})
+    if matches:
+        st.caption("🤝 궁합이 잘 맞는 지난 손님: " + " · ".join(
+            f"{html.escape(str(match['name']))}({match['age']}세, {html.escape(str(match['occupation']))}) {match['score']}점"
+            for match in matches
+        ))
+
+@st.fragment(run_every=2)
+def pending_portrait():
+    """백그라운드 초상화 생성이 끝나면 아바타를 실제 초상화로 바꿉니다."""
+    future = st.session_state.portrait_future
+    if future is None or not future.done():
+        return
+    
+    st.session_state.portrait_future = None
+    try:
+        portrait = future.result()
+    except Exception as e:
+        print(f"⚠️ 이미지 생성 실패 (아바타 유지): {str(e)}")
+        portrait = None
+    if portrait and st.session_state.character is not None:
+        st.session_state.character.update(portrait)
+        st.rerun()
+
+def render_profile_panel():
+    """최근 재실행의 구간별/호출별 소요 시간을 보여주는 디버그 패널입니다."""
+    history = profiler.get_history(st.session_state)
+    if not history:
+        return
+    
+    latest = history[-1]
+    totals = [record['total_ms'] for record in history if record['status'] == 'completed']
+    interrupted = sum(1 for record in history if record['status'] == 'interrupted')
+    
+    with st.expander("🐢 재실행 성능 (디버그)"):
+        st.caption(
+            f"이번 재실행 {latest['total_ms']:.0f} ms · 최근 {len(totals)}회 평균 "
+            f"{sum(totals) / max(len(totals), 1):.0f} ms, p95 {metrics.percentile(totals, 95):.0f} ms · "
+            f"중간 종료 {interrupted}회"
+        )
+        st.table([{"구간": name, "ms": ms} for name, ms in latest['sections']])
+        if latest['calls']:
+            st.table([
+                {"호출": name, "횟수": count, "ms": ms}
+                for name, (count, ms) in sorted(latest['calls'].items(), key=lambda item: -item[1][1])
+            ])
+        if latest.get('cprofile'):
+            st.code("\n".join(latest['cprofile']), language=None)
+        if latest.get('samples'):
+            st.code("\n".join(latest['samples']), language=None)
+        st.caption(f"기록 파일: {profiler.PROFILE_LOG_PATH}")
+
+def open_consultation(character_data: dict, character_id: str, session_id: str, greeting: str, portrait_future=None):
+    """
+    만들어진 세션으로 상담 화면 상태를 채우고 인물의 첫인사를 저장합니다.
+    
+    Args:
+        character_data: 인물 프로필 딕셔너리
+        character_id: 인물 UUID
+        session_id: 세션 UUID
+        greeting: 인물의 첫인사
+        portrait_future: 아직 끝나지 않은 초상화 생성 작업 (없으면 None)
+    """
+    st.session_state.character = character_data
+    st.session_state.character_id = character_id
+    st.session_state.session_id = session_id
+    st.session_state.view_mode = 'new'
+    st.session_state.portrait_future = portrait_future
+    st.session_state.speculative = SpeculativeAnalyzer(
+        character_data, user_id=st.session_state.client_id
+    )
+    st.session_state.messages = Transcript(session_id, client_id=st.session_state.client_id)
+    
+    # Add initial greeting message
+    st.session_state.messages.append({"role": "assistant", "content": greeting})
+    once("greeting", session_id, save_message, session_id, character_id, "ai", greeting)
+    st.session_state.greet_key = None
+
+def returning_character(guest: dict) -> dict:
+    """다시 찾아온 손님의 인물 정보에 지난 상담 요약을 붙입니다. (대화와 사주 해석 프롬프트에 들어갑니다)"""
+    character_data = dict(guest["character"])
+    previous = guest.get("previous")
+    if previous and previous.get("summary"):
+        consulted_on = str(previous.get("started_at") or "")[:10]
+        character_data['previous_consultation'] = (
+            f"{consulted_on} 상담 - 요약: {previous['summary']} / 들은 조언: {previous.get('advice') or '없음'}"
+        )
+    return character_data
+
+def current_conversation(messages=None) -> list:
+    """
+    대화를 사주 해석용 형식({"speaker", "message"})으로 변환합니다.
+    
+    Args:
+        messages: 변환할 Transcript (기본값: 현재 화면의 대화). 스크립트 밖의 스레드에서 부를 때는 직접 넘깁니다.
+    """
+    if messages is None:
+        messages = st.session_state.messages
+    return [
+        {"speaker": "ai" if msg["role"] == "assistant" else "user", "message": msg["content"]}
+        for msg in messages.full()
+    ]
+
+@profiler.timed
+def render_fortune_cards(result: dict, pending: bool = False):
+    """
+    사주 해석 결과 카드(요약 + 세 항목)를 그립니다.
+    
+    Args:
+        result: 해석 결과 딕셔너리 (일부 항목만 있어도 됩니다)
+        pending: True면 아직 없는 항목을 '작성 중'으로 표시합니다
+    """
+    def field(key, fallback):
+        if result.get(key):
+            return result[key]
+        return "✍️ 풀이를 적고 있습니다..." if pending else fallback
+    
+    # Summary card - prominent display
+    st.markdown('''
+    <div class="summary-card">
+        <div class="fortune-icon">📜</div>
+        <div style="font-size: 1.5em; color: #8B4513; font-weight: bold; margin-bottom: 1rem;">운세 요약</div>
+        <div class="summary-text">{}</div>
+    </div>
+    '''.format(field('summary', '운세 요약 없음')), unsafe_allow_html=True)
+    
+    st.markdown("<div style='height: 1rem;'></div>", unsafe_allow_html=True)
+    
+    # Detailed analysis in three columns for better readability
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.markdown('''
+        <div class="fortune-card" style="background: linear-gradient(135deg, #FFF9E6 0%, #FFFEF5 100%); border-color: #E6C68C;">
+            <div class="fortune-icon">🌟</div>
+            <div class="fortune-section-title">전체 운세</div>
+            <div class="fortune-content">{}</div>
+        </div>
+        '''.format(field('fortune_analysis', '운세 분석 없음')), unsafe_allow_html=True)
+    
+    with col2:
+        st.markdown('''
+        <div class="fortune-card" style="background: linear-gradient(135deg, #F0F8FF 0%, #F8FCFF 100%); border-color: #9BC4E2;">
+            <div class="fortune-icon">💎</div>
+            <div class="fortune-section-title">성격 및 성향</div>
+            <div class="fortune-content">{}</div>
+        </div>
+        '''.format(field('personality_analysis', '성격 분석 없음')), unsafe_allow_html=True)
+    
+    with col3:
+        st.markdown('''
+        <div class="fortune-card" style="background: linear-gradient(135deg, #FFF5F0 0%, #FFFAF8 100%); border-color: #E6B09B;">
+            <div class="fortune-icon">💡</div>
+            <div class="fortune-section-title">조언</div>
+            <div class="fortune-content">{}</div>
+        </div>
+        '''.format(field('advice', '조언 없음')), unsafe_allow_html=True)
+
+@st.fragment(run_every=1)
+def analysis_status():
+    """백그라운드 사주 해석 작업의 진행 상황을 표시하고, 완료되면 결과 화면으로 전환합니다."""
+    # 결과는 Realtime으로 전달되므로, 연결되어 있으면 작업 상태는 실패 감지용으로 가끔만 조회합니다
+    if apply_realtime_events() and st.session_state.fortune_result:
+        st.toast("✨ 사주 해석이 완료되었습니다! 결과가 저장되었습니다.")
+        st.rerun()
+    
+    poll_interval = 15 if is_realtime_connected() else 0
+    now = time.monotonic()
+    if now - st.session_state.analysis_polled_at >= poll_interval:
+        st.session_state.analysis_polled_at = now
+        job = get_analysis_job(st.session_state.session_id)
+        st.session_state.analysis_job_status = job.get("status") if job else None
+        
+        if st.session_state.analysis_job_status == JOB_COMPLETED:
+            st.session_state.fortune_result = job["result"]
+            st.toast("✨ 사주 해석이 완료되었습니다! 결과가 저장되었습니다.")
+            st.rerun()
+        if job:
+            st.session_state.analysis_partial = job.get("result") or {}
+    
+    if st.session_state.analysis_job_status == JOB_FAILED:
+        st.error("사주 해석에 실패했습니다. 세션은 종료되었습니다.")
+        if st.button("🔁 다시 해석하기", use_container_width=True):
+            enqueue_analysis(
+                st.session_state.session_id,
+                st.session_state.character_id,
+                st.session_state.character,
+                conversation=current_conversation(),
+                draft=st.session_state.speculative.snapshot() if st.session_state.speculative else None,
+                user_id=st.session_state.client_id
+            )
+            st.session_state.analysis_job_status = None
+            st.rerun(scope="fragment")
+    else:
+        st.info("🔮 대화 내용을 분석하고 사주를 해석하고 있습니다... 완성된 항목부터 바로 보여드립니다.")
+        if st.session_state.analysis_partial:
+            st.markdown('<div class="fortune-title">🔮 사주 해석 결과 🔮</div>', unsafe_allow_html=True)
+            render_fortune_cards(st.session_state.analysis_partial, pending=True)
 
 # Header
+profiler.checkpoint("header")
 st.markdown('<div class="main-header">사담(四談)</div>', unsafe_allow_html=True)
 st.markdown('<div class="sub-header">AI와 함께하는 감성 사주 상담</div>', unsafe_allow_html=True)
 
 # Sidebar
+profiler.checkpoint("sidebar")
 with st.sidebar:
     st.header("🎭 메뉴")
     
     if st.button("🆕 새로운 상담 시작"):
-        st.session_state.messages = []
+        # 끝내지 않고 떠나는 상담은 바로 만료 처리합니다 (놓친 세션은 utils/reaper.py 가 정리)
+        if st.session_state.session_id and not st.session_state.consultation_ended:
+            expire_sessions([st.session_state.session_id])
+        st.session_state.messages = Transcript()
         st.session_state.character = None
         st.session_state.character_id = None
         st.session_state.session_id = None
         st.session_state.fortune_result = None
         st.session_state.consultation_ended = False
+        st.session_state.analysis_job_status = None
+        st.session_state.analysis_polled_at = 0.0
+        st.session_state.analysis_partial = {}
+        st.session_state.speculative = None
+        st.session_state.portrait_future = None
+        st.session_state.greet_key = None
+        st.session_state.show_earlier_turns = False
         st.rerun()
     
     st.divider()
@@ -242,11 +652,14 @@ with st.sidebar:
     
     if st.button("📅 상담 기록 보기", use_container_width=True):
         st.session_state.view_mode = 'history'
+        st.session_state.history_sessions = None  # 목록을 새로 불러옵니다
         st.rerun()
     
     if st.session_state.view_mode == 'history':
-        # 과거 상담 목록 표시
-        sessions = get_all_sessions(limit=10)
+        # 과거 상담 목록 표시 (Realtime 연결 중에는 변경 사항을 push로 받아 캐시를 갱신합니다)
+        if st.session_state.history_sessions is None or not is_realtime_connected():
+            st.session_state.history_sessions = get_all_sessions(limit=10)
+        sessions = st.session_state.history_sessions
         
         if sessions:
             st.write(f"📊 총 {len(sessions)}건의 상담 기록")
@@ -267,7 +680,7 @@ with st.sidebar:
                 else:
                     date_str = '날짜 없음'
                 
-                status_emoji = '✅' if status == 'completed' else '🔄'
+                status_emoji = {'completed': '✅', 'expired': '💤'}.get(status, '🔄')
                 
                 if st.button(
                     f"{status_emoji} {character_name} ({date_str})",
@@ -284,11 +697,65 @@ with st.sidebar:
     
     st.subheader("⚙️ 설정")
     st.checkbox("배경 음악", value=False, disabled=True)
+    
+    with st.expander("📊 요청 처리 현황"):
+        admission_stats = get_admission_stats()
+        st.caption(
+            f"처리 중 {admission_stats['active']}/{admission_stats['max_concurrency']} · "
+            f"대기 {admission_stats['queued']}건 ({admission_stats['users_waiting']}명)"
+        )
+        st.caption(
+            f"누적 수락 {admission_stats['admitted_total']} · 대기 {admission_stats['queued_total']} · "
+            f"거절 {admission_stats['rejected_rate_limited'] + admission_stats['rejected_queue_full'] + admission_stats['rejected_timeout']}"
+        )
+        structured = metrics.snapshot("structured.")
+        responses = sum(v for k, v in structured["counters"].items() if k.endswith(".responses"))
+        if responses:
+            failed = sum(v for k, v in structured["counters"].items() if k.endswith(".failed"))
+            saved = sum(v for k, v in structured["counters"].items() if k.endswith(".tokens_saved_total"))
+            st.caption(f"응답 재생성률 {failed / responses:.0%} · 부분 재요청으로 절약한 토큰 {saved:,.0f}")
+        replica_counters = metrics.snapshot("replica.")["counters"]
+        replica_reads = sum(v for k, v in replica_counters.items() if k.endswith((".hit", ".miss")))
+        if replica_reads:
+            replica_hits = sum(v for k, v in replica_counters.items() if k.endswith(".hit"))
+            st.caption(f"기록 조회 로컬 복제본 적중률 {replica_hits / replica_reads:.0%}")
+        llm_counters = metrics.snapshot("llm.")["counters"]
+        prompt_tokens = sum(v for k, v in llm_counters.items() if k.endswith(".prompt_tokens"))
+        if prompt_tokens:
+            cached_tokens = sum(v for k, v in llm_counters.items() if k.endswith(".cached_tokens"))
+            st.caption(f"프롬프트 캐시 적중 {cached_tokens / prompt_tokens:.0%} (입력 토큰 {prompt_tokens:,.0f} 중 {cached_tokens:,.0f})")
+        memory = get_memory_stats()
+        st.caption(
+            f"세션 메모리 {memory['sessions']}개 · 합계 {memory['total_bytes'] / 1024:,.0f}KB "
+            f"(최대 {memory['max_bytes'] / 1024:,.0f}KB) · 이 세션 {session_memory_bytes / 1024:,.0f}KB"
+        )
+        connection_labels = {"openai": "OpenAI", "download": "이미지 다운로드"}
+        for target, connections in get_connection_stats().items():
+            st.caption(
+                f"{connection_labels[target]} 연결 재사용률 {connections['reuse_rate']:.0%} · "
+                f"새 연결 {connections['new']}개 (평균 연결 수립 {connections['connect_ms_avg']:.0f}ms)"
+            )
+        merged = {
+            action: counts["shared"] + counts["replayed"]
+            for action, counts in get_duplicate_stats().items()
+            if counts["shared"] + counts["replayed"]
+        }
+        if merged:
+            details = ", ".join(f"{action} {count}" for action, count in merged.items())
+            st.caption(f"중복 요청 합침 {sum(merged.values())}건 ({details})")
 
 # Main content area
+profiler.checkpoint("main")
 if st.session_state.view_mode == 'detail' and st.session_state.selected_session_id:
     # 과거 상담 상세 보기 모드
-    session_detail = get_session_detail(st.session_state.selected_session_id)
+    session_detail = st.session_state.session_detail
+    if (
+        session_detail is None
+        or session_detail.get('id') != st.session_state.selected_session_id
+        or not is_realtime_connected()
+    ):
+        session_detail = get_session_detail(st.session_state.selected_session_id)
+        st.session_state.session_detail = session_detail
     
     if session_detail:
         character = session_detail.get('characters', {})
@@ -301,16 +768,14 @@ if st.session_state.view_mode == 'detail' and st.session_state.selected_session_
             col1, col2 = st.columns([1, 3])
             
             with col1:
-                image_url = character.get('image_url')
-                if not image_url or image_url == 'None' or image_url.strip() == '':
-                    image_url = 'https://via.placeholder.com/150'
-                st.image(image_url, caption="인물 이미지")
+                render_portrait(character)
             
             with col2:
                 st.markdown(f"### {character.get('name', '알 수 없음')}")
                 st.write(f"**나이**: {character.get('age', '?')}세 | **성별**: {character.get('gender', '?')}")
                 st.write(f"**직업**: {character.get('occupation', '?')}")
                 st.write(f"**성격**: {character.get('personality', '?')}")
+                render_compatibility(character, character.get('id'))
             
             st.markdown('</div>', unsafe_allow_html=True)
         
@@ -328,51 +793,22 @@ if st.session_state.view_mode == 'detail' and st.session_state.selected_session_
             else:
                 st.markdown(f'<div class="chat-message ai-message"><strong>{character.get("name", "AI")}</strong><br>{message}</div>', unsafe_allow_html=True)
         
+        # 이 상담에 든 OpenAI 사용량 (기록된 응답만)
+        usage = summarize_usage(session_detail)
+        if usage:
+            st.caption(
+                f"🧾 OpenAI 요청 {usage['requests']}회 · "
+                f"토큰 {usage['prompt_tokens'] + usage['completion_tokens']:,} "
+                f"(입력 {usage['prompt_tokens']:,}, 캐시 {usage['cached_tokens']:,}, 출력 {usage['completion_tokens']:,}) · "
+                f"응답 시간 합계 {usage['latency_ms'] / 1000:.1f}s, 최대 {usage['max_latency_ms'] / 1000:.1f}s"
+            )
+        
         # 사주 결과 표시
         if fortune_result:
             st.divider()
             st.markdown('<div class="fortune-title">🔮 사주 해석 결과 🔮</div>', unsafe_allow_html=True)
             
-            # Summary card
-            st.markdown('''
-            <div class="summary-card">
-                <div class="fortune-icon">📜</div>
-                <div style="font-size: 1.5em; color: #8B4513; font-weight: bold; margin-bottom: 1rem;">운세 요약</div>
-                <div class="summary-text">{}</div>
-            </div>
-            '''.format(fortune_result.get('summary', '운세 요약 없음')), unsafe_allow_html=True)
-            
-            st.markdown("<div style='height: 1rem;'></div>", unsafe_allow_html=True)
-            
-            # Detailed analysis
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                st.markdown('''
-                <div class="fortune-card" style="background: linear-gradient(135deg, #FFF9E6 0%, #FFFEF5 100%); border-color: #E6C68C;">
-                    <div class="fortune-icon">🌟</div>
-                    <div class="fortune-section-title">전체 운세</div>
-                    <div class="fortune-content">{}</div>
-                </div>
-                '''.format(fortune_result.get('fortune_analysis', '운세 분석 없음')), unsafe_allow_html=True)
-            
-            with col2:
-                st.markdown('''
-                <div class="fortune-card" style="background: linear-gradient(135deg, #F0F8FF 0%, #F8FCFF 100%); border-color: #9BC4E2;">
-                    <div class="fortune-icon">💎</div>
-                    <div class="fortune-section-title">성격 및 성향</div>
-                    <div class="fortune-content">{}</div>
-                </div>
-                '''.format(fortune_result.get('personality_analysis', '성격 분석 없음')), unsafe_allow_html=True)
-            
-            with col3:
-                st.markdown('''
-                <div class="fortune-card" style="background: linear-gradient(135deg, #FFF5F0 0%, #FFFAF8 100%); border-color: #E6B09B;">
-                    <div class="fortune-icon">💡</div>
-                    <div class="fortune-section-title">조언</div>
-                    <div class="fortune-content">{}</div>
-                </div>
-                '''.format(fortune_result.get('advice', '조언 없음')), unsafe_allow_html=True)
+            render_fortune_cards(fortune_result)
     else:
         st.error("세션 정보를 불러올 수 없습니다.")
     
@@ -384,59 +820,85 @@ elif st.session_state.character is None and st.session_state.view_mode == 'new':
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
         if st.button("손님 맞이하기", type="primary", use_container_width=True):
+            if st.session_state.greet_key is None:
+                st.session_state.greet_key = uuid.uuid4().hex
+            greet_key = st.session_state.greet_key
+            queue_notice = st.empty()
             with st.spinner("손님이 들어오고 있습니다..."):
                 # Generate character using OpenAI
-                character_data = generate_character_profile()
+                character_data = None
+                rejected = None
+                try:
+                    # 중복 클릭이나 요청 도중 재실행으로 같은 동작이 다시 와도 한 번만 생성합니다
+                    character_data = once(
+                        "profile", greet_key, generate_character_profile,
+                        user_id=st.session_state.client_id,
+                        on_wait=queue_feedback(queue_notice)
+                    )
+                except AdmissionRejected as e:
+                    rejected = e
+                queue_notice.empty()
                 
                 if character_data:
+                    character_data = dict(character_data)
                     # Save character to database
-                    character_id = create_character(character_data)
+                    character_id = once(
+                        "character", greet_key, create_character, character_data, idempotency_key=greet_key
+                    )
                     
                     if character_id:
-                        # Generate character image (optional - don't fail if it doesn't work)
+                        # 초상화는 백그라운드에서 만들고, 마감 시간까지만 기다립니다
+                        portrait_future = once(
+                            "portrait", character_id, start_portrait,
+                            character_data, character_id, user_id=st.session_state.client_id
+                        )
                         with st.spinner("인물 이미지를 생성하고 있습니다..."):
-                            try:
-                                image_url = generate_character_image(character_data)
-                                
-                                if image_url:
-                                    # Download image
-                                    image_data = download_image(image_url)
-                                    
-                                    if image_data:
-                                        # Upload to Supabase Storage
-                                        storage_url = upload_image_to_storage(image_data, character_id)
-                                        
-                                        if storage_url:
-                                            # Update character image URL in database
-                                            update_character_image(character_id, storage_url)
-                                            character_data['image_url'] = storage_url
-                                        else:
-                                            character_data['image_url'] = image_url  # Use temporary URL
-                            except Exception as e:
-                                print(f"⚠️ 이미지 생성 실패 (계속 진행): {str(e)}")
-                                character_data['image_url'] = None
+                            portrait = wait_for_portrait(portrait_future)
+                        if portrait:
+                            character_data.update(portrait)
+                            portrait_future = None
+                        else:
+                            # 늦으면 로컬 아바타로 먼저 시작하고, 완성되면 교체합니다
+                            character_data['image_url'] = None
                         
                         # Create session
-                        session_id = create_session(character_id)
+                        session_id = once("session", greet_key, create_session, character_id, idempotency_key=greet_key)
                         
                         if session_id:
-                            st.session_state.character = character_data
-                            st.session_state.character_id = character_id
-                            st.session_state.session_id = session_id
-                            st.session_state.view_mode = 'new'
-                            
-                            # Add initial greeting message
                             greeting = f"안녕하세요... 저는 {character_data['name']}이라고 합니다. 사주를 보러 왔어요."
-                            st.session_state.messages.append({"role": "assistant", "content": greeting})
-                            save_message(session_id, character_id, "ai", greeting)
-                            
+                            open_consultation(character_data, character_id, session_id, greeting, portrait_future)
                             st.rerun()
                         else:
                             st.error("세션 생성에 실패했습니다.")
                     else:
                         st.error("인물 저장에 실패했습니다.")
+                elif rejected:
+                    st.warning(rejection_message(rejected))
                 else:
                     st.error("인물 생성에 실패했습니다. 다시 시도해주세요.")
+        
+        # 이미 만든 인물을 다시 불러 생성 요청 없이 바로 상담을 시작합니다
+        gender = st.selectbox("다시 찾아올 손님", ("누구든", "남성", "여성"), label_visibility="collapsed")
+        if st.button("🔁 다시 찾아온 손님 맞이하기", use_container_width=True):
+            if st.session_state.greet_key is None:
+                st.session_state.greet_key = uuid.uuid4().hex
+            greet_key = st.session_state.greet_key
+            with st.spinner("지난번 손님이 다시 찾아오고 있습니다..."):
+                guest = once(
+                    "returning", greet_key, start_returning_guest,
+                    gender=None if gender == "누구든" else gender, idempotency_key=greet_key
+                )
+            
+            if guest:
+                character_data = returning_character(guest)
+                if guest["previous"]:
+                    greeting = f"안녕하세요, 또 왔어요. 저 {character_data['name']}이에요. 지난번 상담 이후로 생각이 많아져서 다시 찾아왔어요."
+                else:
+                    greeting = f"안녕하세요... 저는 {character_data['name']}이라고 합니다. 사주를 보러 왔어요."
+                open_consultation(character_data, character_data['id'], guest["session_id"], greeting)
+                st.rerun()
+            else:
+                st.warning("다시 찾아올 손님이 없습니다. 새 손님을 맞이해 주세요.")
 elif st.session_state.character is not None and st.session_state.view_mode == 'new':
     # Character profile display
     with st.container():
@@ -444,16 +906,18 @@ elif st.session_state.character is not None and st.session_state.view_mode == 'n
         col1, col2 = st.columns([1, 3])
         
         with col1:
-            image_url = st.session_state.character.get('image_url')
-            if not image_url or image_url == 'None' or str(image_url).strip() == '':
-                image_url = 'https://via.placeholder.com/150'
-            st.image(image_url, caption="인물 이미지")
+            render_portrait(st.session_state.character)
+            if st.session_state.portrait_future is not None:
+                pending_portrait()
         
         with col2:
             st.markdown(f"### {st.session_state.character['name']}")
             st.write(f"**나이**: {st.session_state.character['age']}세 | **성별**: {st.session_state.character['gender']}")
             st.write(f"**직업**: {st.session_state.character['occupation']}")
             st.write(f"**성격**: {st.session_state.character['personality']}")
+            if st.session_state.character.get('previous_consultation'):
+                st.caption(f"📜 지난 상담: {html.escape(st.session_state.character['previous_consultation'])}")
+            render_compatibility(st.session_state.character, st.session_state.character_id)
         
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -463,7 +927,17 @@ elif st.session_state.character is not None and st.session_state.view_mode == 'n
     st.markdown("### 💬 대화")
     
     # Display chat messages
-    for message in st.session_state.messages:
+    profiler.checkpoint("messages")
+    messages = st.session_state.messages
+    shown = messages.recent()
+    if messages.spilled:
+        # 오래된 턴은 메모리에 없으므로 요청할 때만 DB에서 읽어 옵니다
+        if st.session_state.show_earlier_turns:
+            shown = messages.full()
+        elif st.button(f"⬆️ 이전 대화 {messages.spilled}개 보기", use_container_width=True):
+            st.session_state.show_earlier_turns = True
+            st.rerun()
+    for message in shown:
         role = message["role"]
         content = message["content"]
         
@@ -473,6 +947,7 @@ elif st.session_state.character is not None and st.session_state.view_mode == 'n
             st.markdown(f'<div class="chat-message ai-message"><strong>{st.session_state.character["name"]}</strong><br>{content}</div>', unsafe_allow_html=True)
     
     # Chat input
+    profiler.checkpoint("chat")
     user_input = st.chat_input("메시지를 입력하세요...")
     
     if user_input:
@@ -488,35 +963,40 @@ elif st.session_state.character is not None and st.session_state.view_mode == 'n
             unsafe_allow_html=True
         )
         
-        # Prepare character context
-        character_context = f"""
-이름: {st.session_state.character['name']}
-나이: {st.session_state.character['age']}세
-성별: {st.session_state.character['gender']}
-직업: {st.session_state.character['occupation']}
-성격: {st.session_state.character['personality']}
-현재 고민: {st.session_state.character['concern']}
-말투: {st.session_state.character['speaking_style']}
-
-당신은 사주를 보러 온 손님입니다. 자연스럽고 진솔하게 대화하세요.
-너무 많이 말하지 말고, 간결하게 답변하세요.
-"""
-        
-        # Prepare conversation history for API
-        conversation_history = []
-        for msg in st.session_state.messages[:-1]:  # Exclude the current user message
-            role = "assistant" if msg["role"] == "assistant" else "user"
-            conversation_history.append({"role": role, "content": msg["content"]})
+        # 이전 대화 (최근 턴만, 앞부분은 정해진 단위로만 잘라 프롬프트 캐시가 유지되게 합니다)
+        messages = st.session_state.messages
+        conversation_history = chat_history(messages[:-1], offset=messages.spilled)  # Exclude the current user message
         
         # Get AI response
-        ai_response = chat_with_character(character_context, user_input, conversation_history)
+        queue_notice = st.empty()
+        try:
+            ai_response = chat_with_character(
+                st.session_state.character, user_input, conversation_history,
+                user_id=st.session_state.client_id,
+                on_wait=queue_feedback(queue_notice)
+            )
+        except AdmissionRejected as e:
+            # 안내 문구가 보이도록 rerun 하지 않습니다 (보낸 메시지는 다음 화면에 표시됩니다)
+            typing_placeholder.empty()
+            queue_notice.warning(rejection_message(e))
+            st.stop()
+        queue_notice.empty()
         
         # Clear typing indicator
         typing_placeholder.empty()
         
         if ai_response:
             st.session_state.messages.append({"role": "assistant", "content": ai_response})
-            save_message(st.session_state.session_id, st.session_state.character_id, "ai", ai_response)
+            save_message(
+                st.session_state.session_id, st.session_state.character_id, "ai", ai_response,
+                usage=get_last_usage()
+            )
+            
+            # N턴마다 백그라운드에서 초안 해석을 갱신해 둡니다
+            # (대화 전체는 초안을 실제로 만들 때만 읽습니다. 내려놓은 앞부분이 있으면 DB 조회가 필요하므로)
+            if st.session_state.speculative:
+                messages = st.session_state.messages
+                st.session_state.speculative.on_turn(lambda: current_conversation(messages))
         else:
             st.error("응답 생성에 실패했습니다. 다시 시도해주세요.")
         
@@ -529,57 +1009,35 @@ elif st.session_state.character is not None and st.session_state.view_mode == 'n
         with col2:
             if st.button("🔮 상담 종료 및 사주 결과 보기", use_container_width=True):
                 if len(st.session_state.messages) > 2:  # At least some conversation happened
-                    # First, mark the session as ended in the database so status reflects user's action
-                    with st.spinner("상담을 종료 처리하고 있습니다..."):
-                        ended = end_session(st.session_state.session_id)
-
-                    if not ended:
-                        st.warning("세션 상태를 데이터베이스에 업데이트하지 못했습니다. 계속해서 결과 생성을 시도합니다.")
-
-                    # Show a new spinner while analyzing and saving the result
-                    with st.spinner("대화 내용을 분석하고 사주를 해석하고 있습니다..."):
-                        # Get conversation history from database
-                        db_messages = get_conversation_history(st.session_state.session_id)
-
-                        # Convert to format needed for analysis
-                        conversation_for_analysis = [
-                            {"speaker": msg["speaker"], "message": msg["message"]}
-                            for msg in db_messages
-                        ]
-
-                        # Analyze fortune
-                        fortune_result = analyze_fortune(
-                            st.session_state.character,
-                            conversation_for_analysis
-                        )
-
-                        if fortune_result:
-                            # Try to save fortune result to database
-                            save_success = save_fortune_result(
-                                st.session_state.session_id,
-                                st.session_state.character_id,
-                                fortune_result
-                            )
+                    # 세션 종료, 사주 해석, 결과 저장은 백그라운드 워커가 처리합니다
+                    # 대화는 이미 화면 상태에 있으므로 DB에서 다시 읽지 않고 그대로 넘깁니다
+                    conversation = current_conversation()
+                    draft = st.session_state.speculative.snapshot() if st.session_state.speculative else None
+                    job = once(
+                        "analysis", st.session_state.session_id, enqueue_analysis,
+                        st.session_state.session_id,
+                        st.session_state.character_id,
+                        st.session_state.character,
+                        conversation=conversation,
+                        draft=draft,
+                        user_id=st.session_state.client_id
+                    )
 
-                            # Update session state regardless of save success (session already ended)
-                            st.session_state.fortune_result = fortune_result
-                            st.session_state.consultation_ended = True
-
-                            if save_success:
-                                st.success("✨ 사주 해석이 완료되었습니다! 결과가 저장되었습니다.")
-                            else:
-                                st.error("사주 해석은 완료되었지만, 결과 저장에 실패했습니다. 로그를 확인해주세요.")
-
-                            # Rerun to show results (or partial state)
-                            st.rerun()
-                        else:
-                            # Analysis failed, but session is ended
-                            st.session_state.consultation_ended = True
-                            st.error("사주 해석에 실패했습니다. 세션은 종료되었습니다.")
-                            st.rerun()
+                    if job:
+                        st.session_state.consultation_ended = True
+                        # 초안이 대화 전체를 반영하고 있으면 바로 보여주고, 저장은 워커가 마칩니다
+                        if draft_matches(draft, conversation) and draft["covered"] == len(conversation):
+                            st.session_state.fortune_result = draft["result"]
+                        st.rerun()
+                    else:
+                        st.error("사주 해석 요청을 등록하지 못했습니다. 다시 시도해주세요.")
                 else:
                     st.warning("대화를 더 나눈 후에 상담을 종료해주세요.")
     
+    # Show analysis progress until the background job completes
+    if st.session_state.consultation_ended and not st.session_state.fortune_result:
+        analysis_status()
+    
     # Display fortune result if consultation ended
     if st.session_state.consultation_ended and st.session_state.fortune_result:
         st.divider()
@@ -587,55 +1045,24 @@ elif st.session_state.character is not None and st.session_state.view_mode == 'n
         # Fortune result title with traditional style
         st.markdown('<div class="fortune-title">🔮 사주 해석 결과 🔮</div>', unsafe_allow_html=True)
         
-        result = st.session_state.fortune_result
-        
-        # Summary card - prominent display
-        st.markdown('''
-        <div class="summary-card">
-            <div class="fortune-icon">📜</div>
-            <div style="font-size: 1.5em; color: #8B4513; font-weight: bold; margin-bottom: 1rem;">운세 요약</div>
-            <div class="summary-text">{}</div>
-        </div>
-        '''.format(result.get('summary', '운세 요약 없음')), unsafe_allow_html=True)
-        
-        st.markdown("<div style='height: 1rem;'></div>", unsafe_allow_html=True)
-        
-        # Detailed analysis in three columns for better readability
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            st.markdown('''
-            <div class="fortune-card" style="background: linear-gradient(135deg, #FFF9E6 0%, #FFFEF5 100%); border-color: #E6C68C;">
-                <div class="fortune-icon">🌟</div>
-                <div class="fortune-section-title">전체 운세</div>
-                <div class="fortune-content">{}</div>
-            </div>
-            '''.format(result.get('fortune_analysis', '운세 분석 없음')), unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown('''
-            <div class="fortune-card" style="background: linear-gradient(135deg, #F0F8FF 0%, #F8FCFF 100%); border-color: #9BC4E2;">
-                <div class="fortune-icon">💎</div>
-                <div class="fortune-section-title">성격 및 성향</div>
-                <div class="fortune-content">{}</div>
-            </div>
-            '''.format(result.get('personality_analysis', '성격 분석 없음')), unsafe_allow_html=True)
-        
-        with col3:
-            st.markdown('''
-            <div class="fortune-card" style="background: linear-gradient(135deg, #FFF5F0 0%, #FFFAF8 100%); border-color: #E6B09B;">
-                <div class="fortune-icon">💡</div>
-                <div class="fortune-section-title">조언</div>
-                <div class="fortune-content">{}</div>
-            </div>
-            '''.format(result.get('advice', '조언 없음')), unsafe_allow_html=True)
+        render_fortune_cards(st.session_state.fortune_result)
         
         # Additional decorative element
         st.markdown("<div style='text-align: center; margin-top: 2rem; color: #A0826D; font-size: 1.1em;'>🪶 상담이 완료되었습니다 🪶</div>", unsafe_allow_html=True)
 
+# Keep history views fresh via Realtime push instead of re-querying on every rerun
+if st.session_state.view_mode in ('history', 'detail') and is_realtime_connected():
+    realtime_listener()
+
 # Footer
+profiler.checkpoint("footer")
 st.markdown("---")
 st.markdown(
     '<div style="text-align: center; color: #888; font-size: 0.9em;">사담(四談) - Fortune Dialogue | Powered by OpenAI & Supabase</div>',
     unsafe_allow_html=True
-)
\ No newline at end of file
+)
+
+# 프로파일링 모드에서는 이번 재실행 측정을 마치고 사이드바에 결과를 보여줍니다
+if profiler.finish_rerun(st.session_state):
+    with st.sidebar:
+        render_profile_panel()
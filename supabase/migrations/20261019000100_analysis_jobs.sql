@@ -0,0 +1,26 @@
+-- 사주 해석 백그라운드 작업 큐
+create table if not exists public.analysis_jobs (
+    id uuid primary key default gen_random_uuid(),
+    session_id uuid not null unique references public.sessions(id) on delete cascade,
+    character_id uuid references public.characters(id) on delete set null,
+    payload jsonb,
+    status text not null default 'queued',
+    attempts integer not null default 0,
+    result jsonb,
+    error text,
+    worker_id text,
+    claimed_at timestamptz,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists analysis_jobs_status_idx
+    on public.analysis_jobs (status, created_at);
+
+-- 재시도해도 세션당 사주 결과는 하나만 남도록 합니다 (save_fortune_result upsert 대상)
+delete from public.fortune_results a
+    using public.fortune_results b
+    where a.session_id = b.session_id and a.ctid < b.ctid;
+
+create unique index if not exists fortune_results_session_id_key
+    on public.fortune_results (session_id);
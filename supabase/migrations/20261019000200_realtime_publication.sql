@@ -0,0 +1,3 @@
+-- 앱이 구독하는 테이블을 Realtime 발행 대상에 추가합니다 (utils/realtime_helper.py SUBSCRIPTIONS)
+alter publication supabase_realtime add table public.fortune_results;
+alter publication supabase_realtime add table public.sessions;
@@ -0,0 +1,2 @@
+-- 스트리밍 해석 중 완성된 항목(analysis_jobs.result)을 화면에 바로 전달하기 위해 Realtime 발행 대상에 추가합니다
+alter publication supabase_realtime add table public.analysis_jobs;
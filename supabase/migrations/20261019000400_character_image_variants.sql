@@ -0,0 +1,4 @@
+-- 크기별 인물 이미지 (원본 + WebP 썸네일) 정보
+-- 예: {"original": {"url": "...", "bytes": 1500000, "width": 1024}, "192": {"url": "...", "bytes": 9000, "width": 192}}
+alter table public.characters
+    add column if not exists image_variants jsonb;
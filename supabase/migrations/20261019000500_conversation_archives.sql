@@ -0,0 +1,31 @@
+-- 완료된 세션의 대화를 세션당 한 행으로 압축 보관합니다 (utils/archive.py)
+-- transcript 예: [{"id": "...", "speaker": "user", "message": "...", "timestamp": "..."}, ...]
+create table if not exists public.conversation_archives (
+    session_id uuid primary key references public.sessions(id) on delete cascade,
+    character_id uuid references public.characters(id) on delete set null,
+    message_count integer not null,
+    transcript jsonb not null,
+    archived_at timestamptz not null default now()
+);
+
+-- 큰 jsonb 값은 TOAST로 압축 저장됩니다. 기본 pglz 대신 더 빠른 lz4를 씁니다 (PostgreSQL 14 이상)
+alter table public.conversation_archives
+    alter column transcript set compression lz4;
+
+-- 보관 전 메시지 행 조회 (get_conversation_history)
+create index if not exists conversations_session_id_timestamp_idx
+    on public.conversations (session_id, "timestamp");
+
+-- 보관 전후 테이블 크기 비교용 (python -m utils.archive --measure-only)
+create or replace function public.conversation_storage_bytes()
+returns table (table_name text, total_bytes bigint, row_estimate bigint)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select c.relname::text, pg_total_relation_size(c.oid), greatest(c.reltuples, 0)::bigint
+    from pg_class c
+    join pg_namespace n on n.oid = c.relnamespace
+    where n.nspname = 'public' and c.relname in ('conversations', 'conversation_archives');
+$$;
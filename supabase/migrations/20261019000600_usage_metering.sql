@@ -0,0 +1,61 @@
+-- 응답을 만든 OpenAI 요청의 모델, 토큰 수, 지연 시간을 메시지/사주 결과 행에 함께 저장합니다
+-- (openai_helper.get_last_usage → supabase_helper.save_message / save_fortune_result)
+alter table public.conversations
+    add column if not exists model text,
+    add column if not exists prompt_tokens integer,
+    add column if not exists completion_tokens integer,
+    add column if not exists cached_tokens integer,
+    add column if not exists latency_ms integer;
+
+alter table public.fortune_results
+    add column if not exists model text,
+    add column if not exists prompt_tokens integer,
+    add column if not exists completion_tokens integer,
+    add column if not exists cached_tokens integer,
+    add column if not exists latency_ms integer;
+
+-- 세션별 사용량 합계 (용량 계획, 비용/지연이 큰 세션 찾기)
+-- 보관된 대화록(conversation_archives.transcript)의 사용량도 포함합니다.
+-- 보관 도중에는 같은 메시지가 양쪽에 있을 수 있어 메시지 id 기준 union으로 중복을 없앱니다.
+create or replace view public.session_usage as
+with replies as (
+    select id, session_id, prompt_tokens, completion_tokens, cached_tokens, latency_ms
+    from public.conversations
+    where model is not null
+    union
+    select (entry->>'id')::uuid, a.session_id,
+           (entry->>'prompt_tokens')::integer, (entry->>'completion_tokens')::integer,
+           (entry->>'cached_tokens')::integer, (entry->>'latency_ms')::integer
+    from public.conversation_archives a
+    cross join lateral jsonb_array_elements(a.transcript) entry
+    where entry ? 'model'
+),
+chat as (
+    select session_id,
+           count(*) as replies,
+           sum(prompt_tokens) as prompt_tokens,
+           sum(completion_tokens) as completion_tokens,
+           sum(cached_tokens) as cached_tokens,
+           sum(latency_ms) as latency_ms,
+           max(latency_ms) as max_latency_ms
+    from replies
+    group by session_id
+)
+select s.id as session_id,
+       s.user_id,
+       s.status,
+       s.started_at,
+       s.ended_at,
+       coalesce(c.replies, 0) as chat_replies,
+       coalesce(c.prompt_tokens, 0) + coalesce(f.prompt_tokens, 0) as prompt_tokens,
+       coalesce(c.completion_tokens, 0) + coalesce(f.completion_tokens, 0) as completion_tokens,
+       coalesce(c.cached_tokens, 0) + coalesce(f.cached_tokens, 0) as cached_tokens,
+       coalesce(c.prompt_tokens, 0) + coalesce(f.prompt_tokens, 0)
+           + coalesce(c.completion_tokens, 0) + coalesce(f.completion_tokens, 0) as total_tokens,
+       coalesce(c.latency_ms, 0) as chat_latency_ms,
+       c.max_latency_ms as chat_max_latency_ms,
+       f.latency_ms as fortune_latency_ms,
+       f.model as fortune_model
+from public.sessions s
+left join chat c on c.session_id = s.id
+left join public.fortune_results f on f.session_id = s.id;
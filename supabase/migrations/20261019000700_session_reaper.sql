@@ -0,0 +1,18 @@
+-- 버려진 세션 정리 (utils/reaper.py)
+-- 세션 status: active → completed (상담 종료) 또는 expired (마지막 활동 이후 SESSION_TTL_MINUTES 경과)
+
+-- 만료 대상 찾기: active 세션만 들어가는 작은 부분 인덱스
+create index if not exists sessions_active_started_at_idx
+    on public.sessions (started_at)
+    where status = 'active';
+
+-- 고아 인물 찾기 (sessions.character_id in (...)) 와 인물 생성 시각 범위 조회
+create index if not exists sessions_character_id_idx
+    on public.sessions (character_id);
+
+create index if not exists characters_created_at_idx
+    on public.characters (created_at);
+
+-- 상담 기록 목록 (get_all_sessions: user_id 별 started_at 내림차순)
+create index if not exists sessions_user_id_started_at_idx
+    on public.sessions (user_id, started_at desc);
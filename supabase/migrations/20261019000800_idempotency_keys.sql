@@ -0,0 +1,17 @@
+-- 사용자 동작별 멱등 키 ("손님 맞이하기" 한 번 = 키 하나)
+-- 중복 클릭, 요청 도중 재실행, 재시도로 같은 동작이 다시 와도 인물/세션 행은 하나만 생깁니다.
+-- (supabase_helper._insert_once: upsert on_conflict=idempotency_key, ignore_duplicates)
+-- 키가 없는 행(NULL)은 서로 겹치지 않는 것으로 보므로 기존 행과 일괄 생성 경로는 영향이 없습니다.
+alter table public.characters
+    add column if not exists idempotency_key text;
+
+alter table public.sessions
+    add column if not exists idempotency_key text;
+
+create unique index if not exists characters_idempotency_key_key
+    on public.characters (idempotency_key);
+
+create unique index if not exists sessions_idempotency_key_key
+    on public.sessions (idempotency_key);
+
+-- 사주 결과(fortune_results.session_id)와 해석 작업(analysis_jobs.session_id)은 이미 세션당 하나로 제한되어 있습니다.
@@ -0,0 +1,103 @@
+-- 다시 찾아온 손님 (supabase_helper.start_returning_guest)
+-- 이미 만들어 둔 인물(프로필 + 업로드된 초상화)을 골라 새 상담 세션을 여는 작업을 한 번의 호출로 처리합니다.
+-- 인물 생성/초상화 생성 요청 없이, 데이터베이스 왕복 한 번으로 상담을 시작합니다.
+
+-- 다시 부를 수 있는 인물 = 초상화가 있는 인물만 들어가는 부분 인덱스 (무작위 선택용)
+create index if not exists characters_returning_guest_idx
+    on public.characters (id)
+    where image_url is not null;
+
+-- 인물을 고르고 세션을 만든 뒤, 인물 정보와 지난 상담 요약을 함께 돌려줍니다.
+--   p_character_id 가 있으면 그 인물을, 없으면 조건(성별, 나이 범위)에 맞는 인물을 무작위로 고릅니다.
+--   무작위 선택은 임의의 uuid 위치부터 기본 키 인덱스를 따라 첫 인물을 고릅니다 (order by random() 전체 정렬 없음).
+--   p_idempotency_key 로 이미 만든 세션이 있으면 새로 만들지 않고 그 세션을 돌려줍니다.
+-- 반환: {"session": 세션 행, "character": 인물 행, "previous": 지난 상담 요약 또는 null}
+--   고를 인물이 없으면 null
+create or replace function public.start_returning_guest(
+    p_user_id text default 'anonymous',
+    p_character_id uuid default null,
+    p_gender text default null,
+    p_min_age integer default null,
+    p_max_age integer default null,
+    p_idempotency_key text default null
+)
+returns jsonb
+language plpgsql
+volatile
+set search_path = public
+as $$
+declare
+    v_session public.sessions;
+    v_character_id uuid;
+    v_pivot uuid := gen_random_uuid();
+    v_previous jsonb;
+begin
+    if p_idempotency_key is not null then
+        select * into v_session from public.sessions where idempotency_key = p_idempotency_key;
+    end if;
+
+    if v_session.id is null then
+        if p_character_id is not null then
+            select id into v_character_id from public.characters where id = p_character_id;
+        else
+            select id into v_character_id
+            from public.characters
+            where image_url is not null
+              and id >= v_pivot
+              and (p_gender is null or gender = p_gender)
+              and (p_min_age is null or age >= p_min_age)
+              and (p_max_age is null or age <= p_max_age)
+            order by id
+            limit 1;
+
+            -- 임의 위치 뒤에 맞는 인물이 없으면 처음부터 찾습니다
+            if v_character_id is null then
+                select id into v_character_id
+                from public.characters
+                where image_url is not null
+                  and id < v_pivot
+                  and (p_gender is null or gender = p_gender)
+                  and (p_min_age is null or age >= p_min_age)
+                  and (p_max_age is null or age <= p_max_age)
+                order by id
+                limit 1;
+            end if;
+        end if;
+
+        if v_character_id is null then
+            return null;
+        end if;
+
+        insert into public.sessions (character_id, user_id, status, idempotency_key)
+        values (v_character_id, p_user_id, 'active', p_idempotency_key)
+        on conflict (idempotency_key) do nothing
+        returning * into v_session;
+
+        -- 같은 키의 요청이 동시에 들어와 먼저 만들어진 세션이 있으면 그 세션을 씁니다
+        if v_session.id is null then
+            select * into v_session from public.sessions where idempotency_key = p_idempotency_key;
+        end if;
+    end if;
+
+    -- 같은 인물의 가장 최근 상담 결과 (sessions_character_id_idx)
+    select jsonb_build_object(
+               'session_id', s.id,
+               'started_at', s.started_at,
+               'summary', f.summary,
+               'advice', f.advice
+           )
+    into v_previous
+    from public.sessions s
+    join public.fortune_results f on f.session_id = s.id
+    where s.character_id = v_session.character_id
+      and s.id <> v_session.id
+    order by s.started_at desc
+    limit 1;
+
+    return jsonb_build_object(
+        'session', to_jsonb(v_session),
+        'character', (select to_jsonb(c) - 'idempotency_key' from public.characters c where c.id = v_session.character_id),
+        'previous', v_previous
+    );
+end;
+$$;
@@ -0,0 +1,53 @@
+-- 버려진 세션 정리 (utils/reaper.py) - 세션별 활동을 서버에서 집계합니다
+-- 대화 행을 모두 읽어 오면 PostgREST 행 수 제한(기본 1000)에 잘려, 대화 중인 세션을 버려진 세션으로 볼 수 있습니다.
+
+-- 세션별 마지막 메시지 시각과 손님 메시지 수 (conversations_session_id_timestamp_idx 사용)
+--   메시지가 없는 세션은 결과에 없습니다
+create or replace function public.session_activity(p_session_ids uuid[])
+returns table (session_id uuid, last_message_at timestamptz, user_messages bigint)
+language sql
+stable
+set search_path = public
+as $$
+    select c.session_id,
+           max(c.timestamp) as last_message_at,
+           count(*) filter (where c.speaker = 'user') as user_messages
+    from public.conversations c
+    where c.session_id = any(p_session_ids)
+    group by c.session_id;
+$$;
+
+-- 손님이 한 마디도 하지 않은 버려진 세션을 대화와 함께 지웁니다.
+-- 조회한 뒤 지우기 전까지 상태가 바뀌었거나 대화가 이어진 세션은 지우지 않도록 조건을 지울 때 다시 확인합니다.
+--   status = 'active', started_at < p_idle_before, 손님 메시지 없음, p_idle_before 이후 메시지 없음
+-- 반환: 지운 세션 id
+create or replace function public.delete_idle_sessions(p_session_ids uuid[], p_idle_before timestamptz)
+returns setof uuid
+language plpgsql
+volatile
+set search_path = public
+as $$
+declare
+    v_ids uuid[];
+begin
+    -- 지우는 동안 다른 요청이 세션 상태를 바꾸지 못하도록 행을 잠급니다
+    v_ids := array(
+        select s.id
+        from public.sessions s
+        where s.id = any(p_session_ids)
+          and s.status = 'active'
+          and s.started_at < p_idle_before
+          and not exists (
+              select 1 from public.conversations c
+              where c.session_id = s.id
+                and (c.speaker = 'user' or c.timestamp >= p_idle_before)
+          )
+        for update of s
+    );
+
+    delete from public.conversations where session_id = any(v_ids);
+    return query
+        with deleted as (delete from public.sessions where id = any(v_ids) returning id)
+        select id from deleted;
+end;
+$$;
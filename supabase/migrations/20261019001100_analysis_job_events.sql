@@ -0,0 +1,41 @@
+-- 해석 작업 진행 알림 (utils/realtime_helper.py SUBSCRIPTIONS)
+-- analysis_jobs를 그대로 발행하면 모든 구독자에게 payload(대화 전문)와 result가 전달되므로,
+-- 화면 갱신에 필요한 열만 담은 analysis_job_events를 대신 발행합니다.
+-- 앱은 이 알림을 받으면 자기 세션의 작업만 analysis_jobs에서 다시 읽습니다.
+alter publication supabase_realtime drop table public.analysis_jobs;
+
+create table if not exists public.analysis_job_events (
+    session_id uuid primary key references public.sessions(id) on delete cascade,
+    status text not null,
+    sections integer not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+create or replace function public.publish_analysis_job_event()
+returns trigger
+language plpgsql
+set search_path = public
+as $$
+begin
+    insert into public.analysis_job_events (session_id, status, sections, updated_at)
+    values (
+        new.session_id,
+        new.status,
+        case when jsonb_typeof(new.result) = 'object'
+             then (select count(*) from jsonb_object_keys(new.result)) else 0 end,
+        new.updated_at
+    )
+    on conflict (session_id) do update
+        set status = excluded.status,
+            sections = excluded.sections,
+            updated_at = excluded.updated_at;
+    return null;
+end;
+$$;
+
+drop trigger if exists analysis_jobs_publish_event on public.analysis_jobs;
+create trigger analysis_jobs_publish_event
+    after insert or update of status, result on public.analysis_jobs
+    for each row execute function public.publish_analysis_job_event();
+
+alter publication supabase_realtime add table public.analysis_job_events;
@@ -0,0 +1,24 @@
+-- 사주 결과를 다시 저장한 시각 (utils/replica.py 동기화)
+-- save_fortune_result 는 session_id 기준 upsert 이므로, 다시 해석해도(utils/reanalyze.py, 다른 서버의 워커)
+-- 세션의 started_at/ended_at 은 바뀌지 않습니다. 복제본은 이 열로 바뀐 결과를 찾습니다.
+alter table public.fortune_results
+    add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists fortune_results_updated_at_id_idx
+    on public.fortune_results (updated_at, id);
+
+create or replace function public.touch_fortune_result()
+returns trigger
+language plpgsql
+set search_path = public
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists fortune_results_touch on public.fortune_results;
+create trigger fortune_results_touch
+    before update on public.fortune_results
+    for each row execute function public.touch_fortune_result();
@@ -0,0 +1,320 @@
+"""
+LLM 호출 수락 제어(Admission Control) 모듈
+사용자별 토큰 버킷과 전역 동시 실행 상한, 사용자 간 공정 대기열을 제공합니다.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from utils import metrics
+
+# 요청 종류별 비용 (토큰 버킷에서 차감되는 토큰 수)
+COST_CHAT = 1
+COST_ANALYSIS = 2
+COST_PROFILE = 2
+COST_IMAGE = 4
+
+class AdmissionRejected(Exception):
+    """요청이 수락되지 않았을 때 발생하는 예외입니다."""
+
+    def __init__(self, reason: str, retry_after: float = None):
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"요청이 거절되었습니다: {reason}")
+
+class TokenBucket:
+    """초당 rate 만큼 채워지고 capacity 까지 쌓이는 토큰 버킷입니다."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def try_consume(self, cost: float) -> tuple:
+        """
+        토큰을 차감합니다.
+
+        Returns:
+            (성공 여부, 재시도까지 남은 초)
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        retry_after = (cost - self.tokens) / self.rate if self.rate > 0 else None
+        return False, retry_after
+
+    def refund(self, cost: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+    def available(self) -> float:
+        """지금 남아 있는 토큰 수를 반환합니다. (차감하지 않음)"""
+        self._refill(time.monotonic())
+        return self.tokens
+
+    def is_full(self) -> bool:
+        return self.available() >= self.capacity
+
+class _Waiter:
+    __slots__ = ("user_id", "event", "granted", "enqueued_at")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.event = threading.Event()
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+
+class AdmissionController:
+    """
+    사용자별 토큰 버킷 + 전역 동시 실행 상한을 적용하는 수락 제어기입니다.
+
+    동시 실행 슬롯이 모두 사용 중이면 요청은 사용자별 대기열에 들어가고,
+    슬롯이 비면 사용자 단위 라운드 로빈으로 배정되어 한 사용자가 대기열을 독점하지 못합니다.
+
+    상한과 버킷은 프로세스 안에서만 공유됩니다. 여러 프로세스가 같은 LLM_MAX_CONCURRENCY 를 나눠 쓰도록
+    get_admission_controller()가 프로세스마다 몫(process_concurrency)을 정해 만듭니다.
+    """
+
+    # 버킷 정리를 시작하는 사용자 수
+    BUCKET_PRUNE_THRESHOLD = 10000
+
+    def __init__(self, rate_per_minute: float = 20, burst: float = 10,
+                 max_concurrency: int = 8, max_queue: int = 64,
+                 queue_timeout: float = 30.0, poll_interval: float = 0.5):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._active = 0
+        self._queued = 0
+        # user_id -> deque[_Waiter], 삽입 순서가 라운드 로빈 순서입니다
+        self._queues = OrderedDict()
+
+    def _bucket(self, user_id: str) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= self.BUCKET_PRUNE_THRESHOLD:
+                # 가득 찬 버킷은 새로 만든 것과 같으므로 버려도 됩니다
+                for key in [k for k, b in self._buckets.items() if b.is_full()]:
+                    del self._buckets[key]
+            bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[user_id] = bucket
+        return bucket
+
+    def acquire(self, user_id: str, cost: float = 1, on_wait=None) -> None:
+        """
+        실행 슬롯을 획득합니다. 획득하면 반드시 release()를 호출해야 합니다.
+
+        Args:
+            user_id: 사용자 식별자 (토큰 버킷과 공정 대기열의 키)
+            cost: 요청 비용 (토큰 수)
+            on_wait: 대기 중 대기 순번(1부터)을 인자로 주기적으로 호출되는 콜백
+
+        Raises:
+            AdmissionRejected: 속도 제한 초과, 대기열 초과, 대기 시간 초과 시
+        """
+        with self._lock:
+            bucket = self._bucket(user_id)
+            allowed, retry_after = bucket.try_consume(cost)
+            if not allowed:
+                metrics.incr("admission.rejected.rate_limited")
+                raise AdmissionRejected("rate_limited", retry_after)
+
+            if self._active < self.max_concurrency and not self._queues:
+                self._active += 1
+                metrics.incr("admission.admitted")
+                metrics.observe("admission.wait_seconds", 0.0)
+                return
+
+            if self._queued >= self.max_queue:
+                bucket.refund(cost)
+                metrics.incr("admission.rejected.queue_full")
+                raise AdmissionRejected("queue_full", self.poll_interval)
+
+            waiter = _Waiter(user_id)
+            self._queues.setdefault(user_id, deque()).append(waiter)
+            self._queued += 1
+            metrics.incr("admission.queued")
+            position = self._position(waiter)
+
+        if on_wait:
+            on_wait(position)
+
+        deadline = waiter.enqueued_at + self.queue_timeout
+        while not waiter.event.wait(self.poll_interval):
+            with self._lock:
+                if waiter.granted:
+                    break
+                if time.monotonic() >= deadline:
+                    self._remove(waiter)
+                    # 실행하지 못한 요청이므로 차감한 토큰을 돌려줍니다
+                    self._bucket(user_id).refund(cost)
+                    metrics.incr("admission.rejected.timeout")
+                    raise AdmissionRejected("queue_timeout", self.poll_interval)
+                position = self._position(waiter)
+            if on_wait:
+                on_wait(position)
+
+        metrics.incr("admission.admitted")
+        metrics.observe("admission.wait_seconds", time.monotonic() - waiter.enqueued_at)
+
+    def release(self) -> None:
+        """실행 슬롯을 반납하고 다음 대기 요청에 배정합니다."""
+        with self._lock:
+            self._active -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, user_id: str, cost: float = 1, on_wait=None):
+        """acquire()/release()를 감싸는 컨텍스트 매니저입니다."""
+        self.acquire(user_id, cost=cost, on_wait=on_wait)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _dispatch(self) -> None:
+        while self._active < self.max_concurrency and self._queues:
+            user_id, waiters = next(iter(self._queues.items()))
+            waiter = waiters.popleft()
+            # 서비스 받은 사용자는 라운드 로빈 순서의 맨 뒤로 보냅니다
+            del self._queues[user_id]
+            if waiters:
+                self._queues[user_id] = waiters
+            self._queued -= 1
+            self._active += 1
+            waiter.granted = True
+            waiter.event.set()
+
+    def _remove(self, waiter: _Waiter) -> None:
+        waiters = self._queues.get(waiter.user_id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            self._queued -= 1
+            if not waiters:
+                del self._queues[waiter.user_id]
+
+    def _position(self, waiter: _Waiter) -> int:
+        """라운드 로빈 배정 순서상 대기 순번(1부터)을 계산합니다."""
+        waiters = self._queues.get(waiter.user_id)
+        if not waiters or waiter not in waiters:
+            return 0
+        index = waiters.index(waiter)
+        position = index + 1
+        seen_self = False
+        for user_id, queue in self._queues.items():
+            if user_id == waiter.user_id:
+                seen_self = True
+                continue
+            # 앞선 라운드의 몫 + 같은 라운드에서 순서가 앞서면 1건 더
+            position += min(len(queue), index + (0 if seen_self else 1))
+        return position
+
+    def tokens_available(self, user_id: str) -> float:
+        """사용자 버킷에 지금 남아 있는 토큰 수를 반환합니다. (차감하지 않음)"""
+        with self._lock:
+            return self._bucket(user_id).available()
+
+    def stats(self) -> dict:
+        """용량 산정을 위한 현재 상태와 누적 카운터를 반환합니다."""
+        with self._lock:
+            active = self._active
+            queued = self._queued
+            users_waiting = len(self._queues)
+        return {
+            "active": active,
+            "queued": queued,
+            "users_waiting": users_waiting,
+            "max_concurrency": self.max_concurrency,
+            "admitted_total": int(metrics.get_counter("admission.admitted")),
+            "queued_total": int(metrics.get_counter("admission.queued")),
+            "rejected_rate_limited": int(metrics.get_counter("admission.rejected.rate_limited")),
+            "rejected_queue_full": int(metrics.get_counter("admission.rejected.queue_full")),
+            "rejected_timeout": int(metrics.get_counter("admission.rejected.timeout")),
+        }
+
+# 항목별 동시 해석(FORTUNE_FANOUT=1)에서 슬롯 하나로 동시에 보내는 요청 수 (openai_helper.FANOUT_SECTION_TOKENS)
+FANOUT_REQUESTS = 4
+
+def worker_slots() -> int:
+    """
+    앱이 띄운 해석 작업 워커 프로세스(utils.job_queue.ensure_workers)가 쓰는 동시 요청 수입니다.
+    워커는 프로세스마다 작업 하나씩만 처리하고, 항목별 동시 해석이면 작업 하나가 요청 네 개를 보냅니다.
+    ANALYSIS_WORKER_MODE=external 이면 워커를 따로 운영하므로 0입니다. (워커 쪽 한도는 워커 서버에서 정합니다)
+    """
+    if os.getenv("ANALYSIS_WORKER_MODE", "spawn") != "spawn":
+        return 0
+    per_worker = FANOUT_REQUESTS if os.getenv("FORTUNE_FANOUT", "0") == "1" else 1
+    return int(os.getenv("ANALYSIS_WORKERS", "2")) * per_worker
+
+def process_concurrency() -> int:
+    """
+    이 프로세스의 동시 실행 상한을 반환합니다.
+
+    LLM_MAX_CONCURRENCY 는 서버 전체(앱 + 앱이 띄운 워커 프로세스)의 상한입니다.
+    - 워커 프로세스(ANALYSIS_WORKER_PROCESS=1): 작업 하나씩만 처리하므로 1
+    - 앱 프로세스: LLM_MAX_CONCURRENCY 에서 워커 몫(worker_slots)을 뺀 나머지 (최소 1)
+    """
+    if os.getenv("ANALYSIS_WORKER_PROCESS") == "1":
+        return 1
+    total = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    reserved = worker_slots()
+    if total - reserved < 1:
+        print(f"⚠️ LLM_MAX_CONCURRENCY({total})에서 해석 워커 몫({reserved})을 빼면 남는 슬롯이 없어 앱 상한을 1로 둡니다")
+        return 1
+    return total - reserved
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def get_admission_controller() -> AdmissionController:
+    """
+    환경 변수 설정으로 만든 프로세스 공용 수락 제어기를 반환합니다.
+    동시 실행 상한은 서버 전체 LLM_MAX_CONCURRENCY 중 이 프로세스의 몫입니다. (process_concurrency)
+    """
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    rate_per_minute=float(os.getenv("LLM_RATE_PER_MINUTE", "20")),
+                    burst=float(os.getenv("LLM_BURST", "10")),
+                    max_concurrency=process_concurrency(),
+                    max_queue=int(os.getenv("LLM_MAX_QUEUE", "64")),
+                    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "30")),
+                )
+    return _controller
+
+def configure_admission(**kwargs) -> AdmissionController:
+    """
+    프로세스 공용 수락 제어기를 주어진 설정으로 새로 만듭니다. (배치 작업/벤치마크처럼 별도 한도가 필요한 CLI용)
+
+    Args:
+        kwargs: AdmissionController 생성 인자
+    """
+    global _controller
+    with _controller_lock:
+        _controller = AdmissionController(**kwargs)
+    return _controller
+
+def get_admission_stats() -> dict:
+    """프로세스 공용 수락 제어기의 통계를 반환합니다."""
+    return get_admission_controller().stats()
@@ -0,0 +1,232 @@
+"""
+완료된 대화 압축 보관
+conversations 테이블은 메시지마다 한 행이라 계속 커집니다. 이 모듈은 완료된 세션의 메시지를
+conversation_archives 테이블의 세션당 한 행(jsonb 대화록)으로 옮기고 원래 행을 지웁니다.
+대화를 읽는 쪽(load_conversations)은 두 형태를 합쳐서 돌려주므로 보관 여부와 상관없이 같은 결과를 얻습니다.
+
+실행:
+    python -m utils.archive --older-than-hours 24           # 하루 전에 끝난 세션 보관
+    python -m utils.archive --measure-only                  # 테이블 크기와 대화 조회 시간만 측정
+"""
+
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+
+ARCHIVE_TABLE = "conversation_archives"
+# 대화록에 남기는 메시지 컬럼 (session_id/character_id는 행마다 반복되므로 빼고 보관 행에 한 번만 둡니다)
+TRANSCRIPT_COLUMNS = ("id", "speaker", "message", "timestamp")
+# 응답 메시지에만 있는 사용량 컬럼 (값이 있을 때만 대화록에 남깁니다)
+USAGE_COLUMNS = ("model", "prompt_tokens", "completion_tokens", "cached_tokens", "latency_ms")
+# 한 번에 보관할 세션 수
+ARCHIVE_BATCH = 100
+# delete ... in (...) 한 번에 넣는 메시지 id 수 (요청 URL 길이 제한)
+DELETE_CHUNK = 200
+
+def pack(rows: list) -> list:
+    """메시지 행들을 대화록(시간 순서)으로 만듭니다."""
+    return [
+        {
+            **{column: row.get(column) for column in TRANSCRIPT_COLUMNS},
+            **{column: row[column] for column in USAGE_COLUMNS if row.get(column) is not None},
+        }
+        for row in sorted(rows, key=lambda row: str(row.get("timestamp") or ""))
+    ]
+
+def unpack(archive: dict) -> list:
+    """보관 행을 conversations 행과 같은 형태의 리스트로 되돌립니다."""
+    return [
+        {**entry, "session_id": archive["session_id"], "character_id": archive.get("character_id")}
+        for entry in archive.get("transcript") or []
+    ]
+
+def _merge(archived: list, rows: list) -> list:
+    # 보관 도중(대화록 저장 후 행 삭제 전)에는 같은 메시지가 양쪽에 있을 수 있습니다
+    seen = {entry.get("id") for entry in archived}
+    merged = archived + [row for row in rows if row.get("id") not in seen]
+    return sorted(merged, key=lambda row: str(row.get("timestamp") or ""))
+
+def load_conversations(client, session_ids: list) -> dict:
+    """
+    세션들의 대화 기록을 보관 행과 메시지 행에서 함께 읽습니다.
+
+    Args:
+        client: Supabase 클라이언트
+        session_ids: 세션 UUID 리스트
+
+    Returns:
+        {세션 id: conversations 행 리스트 (시간 순서)}
+    """
+    if not session_ids:
+        return {}
+    archives = client.table(ARCHIVE_TABLE).select("*").in_("session_id", session_ids).execute().data or []
+    rows = client.table("conversations").select("*")\
+        .in_("session_id", session_ids).order("timestamp").execute().data or []
+
+    archived = {archive["session_id"]: unpack(archive) for archive in archives}
+    live = {}
+    for row in rows:
+        live.setdefault(row["session_id"], []).append(row)
+
+    conversations = {}
+    for session_id in set(archived) | set(live):
+        if session_id in archived and session_id in live:
+            conversations[session_id] = _merge(archived[session_id], live[session_id])
+        else:
+            conversations[session_id] = archived.get(session_id) or live[session_id]
+    return conversations
+
+def archive_sessions(client, sessions: list) -> dict:
+    """
+    세션들의 메시지 행을 보관 행으로 옮깁니다. 대화록을 먼저 저장(upsert)한 뒤 행을 지우므로
+    중간에 실패해도 메시지가 사라지지 않고, 다시 실행하면 이어서 정리합니다.
+
+    Args:
+        client: Supabase 클라이언트
+        sessions: {"id", "character_id"} 세션 리스트
+
+    Returns:
+        {"sessions": 보관한 세션 수, "messages": 옮긴 메시지 수}
+    """
+    session_ids = [session["id"] for session in sessions]
+    rows = client.table("conversations").select("*").in_("session_id", session_ids).execute().data or []
+    if not rows:
+        return {"sessions": 0, "messages": 0}
+    existing = {
+        archive["session_id"]: archive
+        for archive in client.table(ARCHIVE_TABLE).select("*").in_("session_id", session_ids).execute().data or []
+    }
+
+    by_session = {}
+    for row in rows:
+        by_session.setdefault(row["session_id"], []).append(row)
+    character_ids = {session["id"]: session.get("character_id") for session in sessions}
+
+    archives = []
+    for session_id, session_rows in by_session.items():
+        previous = unpack(existing[session_id]) if session_id in existing else []
+        transcript = pack(_merge(previous, session_rows))
+        archives.append({
+            "session_id": session_id,
+            "character_id": character_ids.get(session_id),
+            "message_count": len(transcript),
+            "transcript": transcript,
+            "archived_at": datetime.now().isoformat(),
+        })
+    client.table(ARCHIVE_TABLE).upsert(archives, on_conflict="session_id").execute()
+
+    row_ids = [row["id"] for row in rows]
+    for offset in range(0, len(row_ids), DELETE_CHUNK):
+        client.table("conversations").delete().in_("id", row_ids[offset:offset + DELETE_CHUNK]).execute()
+    return {"sessions": len(archives), "messages": len(rows)}
+
+def run(client, older_than: timedelta, batch: int = ARCHIVE_BATCH, limit: int = None) -> dict:
+    """
+    older_than 이전에 끝난 완료 세션을 id 순서로 훑으며 보관합니다.
+
+    Returns:
+        {"sessions", "messages", "seconds"}
+    """
+    cutoff = (datetime.now() - older_than).isoformat()
+    totals = {"sessions": 0, "messages": 0}
+    cursor, scanned = None, 0
+    started = time.perf_counter()
+
+    while limit is None or scanned < limit:
+        query = client.table("sessions").select("id, character_id")\
+            .eq("status", "completed").lt("ended_at", cutoff)
+        if cursor:
+            query = query.gt("id", cursor)
+        size = batch if limit is None else min(batch, limit - scanned)
+        sessions = query.order("id").limit(size).execute().data or []
+        if not sessions:
+            break
+        result = archive_sessions(client, sessions)
+        totals["sessions"] += result["sessions"]
+        totals["messages"] += result["messages"]
+        scanned += len(sessions)
+        cursor = sessions[-1]["id"]
+        if result["sessions"]:
+            print(f"🔄 보관 진행: 세션 {totals['sessions']}개, 메시지 {totals['messages']}개")
+
+    totals["seconds"] = time.perf_counter() - started
+    return totals
+
+def measure(client, sample: int = 20) -> dict:
+    """
+    대화 저장 공간과 상세 조회 시간을 잽니다.
+
+    Returns:
+        {"conversations_rows", "archive_rows", "storage": [...] 또는 None, "detail_ms": {"p50", "p95"}}
+    """
+    from utils import metrics
+    from utils.supabase_helper import get_conversation_history
+
+    def count(table):
+        return client.table(table).select("session_id", count="exact").limit(1).execute().count
+
+    try:
+        # 테이블 실제 크기 (마이그레이션의 conversation_storage_bytes 함수)
+        storage = client.rpc("conversation_storage_bytes").execute().data
+    except Exception:
+        storage = None
+
+    # 보관 대상이 되는 오래된 세션부터 잽니다
+    sessions = client.table("sessions").select("id").eq("status", "completed")\
+        .order("ended_at").limit(sample).execute().data or []
+    timings = []
+    for session in sessions:
+        started = time.perf_counter()
+        get_conversation_history(session["id"])
+        timings.append(time.perf_counter() - started)
+
+    return {
+        "conversations_rows": count("conversations"),
+        "archive_rows": count(ARCHIVE_TABLE),
+        "storage": storage,
+        "detail_ms": {
+            "p50": round(metrics.percentile(timings, 50) * 1000, 1),
+            "p95": round(metrics.percentile(timings, 95) * 1000, 1),
+        },
+    }
+
+def _print_measure(label: str, result: dict) -> None:
+    print(f"📏 {label}: 메시지 행 {result['conversations_rows']}개 · 보관 행 {result['archive_rows']}개 · "
+          f"대화 조회 p50 {result['detail_ms']['p50']:.1f} ms / p95 {result['detail_ms']['p95']:.1f} ms")
+    for row in result["storage"] or []:
+        print(f"   {row['table_name']}: {row['total_bytes'] / 1024:,.0f} KB (약 {row['row_estimate']}행)")
+
+def main(argv: list = None) -> dict:
+    parser = argparse.ArgumentParser(description="완료된 대화 압축 보관")
+    parser.add_argument("--older-than-hours", type=float, default=24, help="이 시간보다 먼저 끝난 세션만 보관")
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH, help="한 번에 보관할 세션 수")
+    parser.add_argument("--limit", type=int, help="이번 실행에서 살펴볼 최대 세션 수")
+    parser.add_argument("--measure", type=int, default=20, metavar="N", help="전후 측정에 쓸 세션 수 (0이면 측정 안 함)")
+    parser.add_argument("--measure-only", action="store_true", help="보관하지 않고 측정만")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    args = parser.parse_args(argv)
+
+    from utils.supabase_helper import get_supabase_client
+
+    client = get_supabase_client()
+    report = {}
+    if args.measure:
+        report["before"] = measure(client, args.measure)
+        if not args.json:
+            _print_measure("보관 전", report["before"])
+    if not args.measure_only:
+        report["archived"] = run(client, timedelta(hours=args.older_than_hours), args.batch, args.limit)
+        if not args.json:
+            archived = report["archived"]
+            print(f"✅ 세션 {archived['sessions']}개의 메시지 {archived['messages']}개 보관 ({archived['seconds']:.1f}s)")
+        if args.measure:
+            report["after"] = measure(client, args.measure)
+            if not args.json:
+                _print_measure("보관 후", report["after"])
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+로컬 인물 아바타 생성 모듈
+실제 초상화가 준비되지 않았을 때 보여줄 초상화풍 아바타를 Pillow로 그립니다.
+같은 인물 프로필이면 항상 같은 그림이 나옵니다. (외부 요청 없음, 수 ms 이내)
+"""
+
+import io
+import base64
+import hashlib
+import random
+from functools import lru_cache
+
+from utils.saju import birth_elements, ELEMENT_COLORS
+
+SKIN_TONES = ("#F3D5B5", "#EBC8A4", "#E0B793", "#D7A982")
+HAIR_COLORS = ("#1E1A17", "#2B211C", "#3A2A20")
+
+def _profile_key(character: dict) -> tuple:
+    return tuple(
+        str(character.get(key, ""))
+        for key in ("name", "gender", "age", "occupation", "birth_date", "birth_time")
+    )
+
+def _age(character: dict) -> int:
+    try:
+        return int(character.get("age", 30))
+    except (TypeError, ValueError):
+        return 30
+
+@lru_cache(maxsize=512)
+def _render(profile_key: tuple, size: int) -> bytes:
+    from PIL import Image, ImageDraw
+
+    name, gender, age, occupation, birth_date, birth_time = profile_key
+    seed = int(hashlib.md5("|".join(profile_key).encode("utf-8")).hexdigest(), 16)
+    rng = random.Random(seed)
+    age = _age({"age": age})
+    is_female = gender == "여성"
+
+    elements = birth_elements(birth_date, birth_time)
+    primary, primary_light = ELEMENT_COLORS[elements["primary"]]
+    secondary, secondary_light = ELEMENT_COLORS[elements["secondary"]]
+
+    s = size / 256  # 256px 기준 좌표를 크기에 맞게 조정합니다
+
+    def box(x0, y0, x1, y1):
+        return [x0 * s, y0 * s, x1 * s, y1 * s]
+
+    # 배경: 연간 오행 색의 세로 그라데이션
+    gradient = Image.linear_gradient("L").resize((size, size))
+    image = Image.composite(
+        Image.new("RGB", (size, size), primary),
+        Image.new("RGB", (size, size), primary_light),
+        gradient
+    )
+    draw = ImageDraw.Draw(image)
+
+    skin = rng.choice(SKIN_TONES)
+    if age >= 58:
+        hair = "#BDBAB5"
+    elif age >= 48:
+        hair = "#6E6862"
+    else:
+        hair = rng.choice(HAIR_COLORS)
+
+    # 긴 머리는 얼굴 뒤에 먼저 그립니다
+    if is_female:
+        draw.rounded_rectangle(box(70, 70, 186, 200), radius=50 * s, fill=hair)
+
+    # 한복 저고리: 시지 오행 색, 깃과 동정은 밝은 색
+    draw.ellipse(box(36, 176, 220, 330), fill=secondary)
+    draw.polygon([(128 * s, 232 * s), (92 * s, 184 * s), (110 * s, 180 * s)], fill=secondary_light)
+    draw.polygon([(128 * s, 232 * s), (164 * s, 184 * s), (146 * s, 180 * s)], fill=secondary_light)
+    draw.line([(96 * s, 186 * s), (128 * s, 236 * s), (160 * s, 186 * s)], fill="#FFFFFF", width=max(1, int(5 * s)))
+    # 고름
+    draw.line([(128 * s, 236 * s), (122 * s, 256 * s)], fill=primary, width=max(1, int(4 * s)))
+
+    # 목과 얼굴
+    draw.rectangle(box(113, 150, 143, 190), fill=skin)
+    face_width = rng.randint(36, 42)
+    draw.ellipse(box(128 - face_width, 72, 128 + face_width, 170), fill=skin)
+
+    # 머리카락 (윗부분)
+    if is_female:
+        draw.chord(box(84, 62, 172, 128), 180, 360, fill=hair)
+        draw.ellipse(box(108, 46, 148, 76), fill=hair)  # 쪽 찐 머리
+    else:
+        draw.chord(box(86, 64, 170, 124), 180, 360, fill=hair)
+        draw.rectangle(box(88, 92, 96, 112), fill=hair)
+        draw.rectangle(box(160, 92, 168, 112), fill=hair)
+
+    # 눈, 눈썹, 입
+    eye_y = rng.randint(112, 118)
+    for eye_x in (110, 146):
+        draw.ellipse(box(eye_x - 4, eye_y - 3, eye_x + 4, eye_y + 3), fill="#2A2420")
+        draw.line([((eye_x - 9) * s, (eye_y - 11) * s), ((eye_x + 9) * s, (eye_y - 12) * s)],
+                  fill=hair if age < 58 else "#8A8580", width=max(1, int(3 * s)))
+    mouth_y = eye_y + 30
+    draw.arc(box(116, mouth_y - 6, 140, mouth_y + 6), 20, 160, fill="#9E5A4E", width=max(1, int(3 * s)))
+    if age >= 45:
+        # 나이에 따른 팔자 주름
+        draw.arc(box(100, mouth_y - 16, 116, mouth_y + 6), 100, 200, fill="#C79C7E", width=max(1, int(2 * s)))
+        draw.arc(box(140, mouth_y - 16, 156, mouth_y + 6), -20, 80, fill="#C79C7E", width=max(1, int(2 * s)))
+
+    # 직업에 따라 안경을 씁니다
+    if int(hashlib.md5(occupation.encode("utf-8")).hexdigest(), 16) % 3 == 0:
+        for eye_x in (110, 146):
+            draw.ellipse(box(eye_x - 12, eye_y - 9, eye_x + 12, eye_y + 9), outline="#3B3B3B", width=max(1, int(2 * s)))
+        draw.line([(122 * s, eye_y * s), (134 * s, eye_y * s)], fill="#3B3B3B", width=max(1, int(2 * s)))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=85)
+    return buffer.getvalue()
+
+def render_avatar(character: dict, size: int = 256) -> bytes:
+    """
+    인물 프로필(성별, 나이, 직업, 오행 색)로 아바타를 그립니다.
+
+    Args:
+        character: 인물 프로필 딕셔너리
+        size: 이미지 크기(px)
+
+    Returns:
+        WebP 이미지 바이트 데이터
+    """
+    return _render(_profile_key(character or {}), size)
+
+def avatar_data_uri(character: dict, size: int = 256) -> str:
+    """아바타를 HTML에 바로 넣을 수 있는 data URI로 반환합니다."""
+    encoded = base64.b64encode(render_avatar(character, size)).decode("ascii")
+    return f"data:image/webp;base64,{encoded}"
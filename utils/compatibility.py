@@ -0,0 +1,529 @@
+"""
+손님 사이 궁합 점수
+저장된 인물의 birth_date/birth_time에서 사주팔자 특징을 뽑아 NumPy 배열로 모아 두고,
+인물 전체에 대한 궁합 점수를 한 번에(벡터 연산) 계산합니다. LLM은 쓰지 않습니다.
+
+- 인물마다 궁합이 좋은 상위 k명을 캐시해 두고, 새 인물이 들어오면 그 인물의 점수 한 줄만 계산해
+  기존 인물들의 상위 k명을 갱신합니다. (전체 N×N을 다시 계산하지 않습니다)
+- 앱에서는 처음 조회할 때 백그라운드에서 characters 테이블을 읽어 캐시를 만들고,
+  이후 COMPAT_REFRESH_SECONDS마다 새로 만든 인물만 더 읽어 옵니다.
+- 정리 작업(utils/reaper.py)이 지운 인물은 보여주기 전에 남아 있는지 확인해 캐시에서 뺍니다.
+
+점수(0-100)는 전통 궁합의 대표적인 규칙을 단순화한 것입니다.
+- 일간(日干): 천간합(+), 오행 상생(+), 같은 오행(약간 +), 오행 상극(-)
+- 일지/연지: 육합(+), 삼합(+), 충(-)
+- 오행 보완: 한쪽에 부족한 오행을 다른 쪽이 많이 가지고 있을수록 +
+
+실행:
+    python -m utils.compatibility --bench --count 5000     # 초당 점수 계산 수 벤치마크 (가상 인물)
+    python -m utils.compatibility --character-id <UUID>    # 저장된 인물의 궁합 상위 목록
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from utils import metrics
+from utils.saju import birth_chart, element_counts, ELEMENTS
+
+# 인물마다 캐시하는 궁합 상위 인원
+TOP_K = int(os.getenv("COMPAT_TOP_K", "5"))
+# 새 인물을 다시 읽어 오는 주기(초)
+REFRESH_SECONDS = float(os.getenv("COMPAT_REFRESH_SECONDS", "60"))
+# 한 번에 계산하는 행 수 (행 수 × 전체 인원 크기의 점수 행렬을 만듭니다)
+CHUNK_ROWS = 1024
+# characters 테이블을 읽을 때의 페이지 크기
+FETCH_PAGE = 1000
+# 서버마다 시계가 조금씩 다를 수 있으므로 마지막으로 읽은 시각보다 이만큼 앞에서부터 다시 읽습니다 (id로 중복 제거)
+FETCH_OVERLAP = timedelta(minutes=5)
+# 목록에 함께 보여줄 인물 컬럼
+CHARACTER_COLUMNS = ("id", "name", "age", "occupation", "birth_date", "birth_time", "created_at")
+
+def _features(characters: list) -> tuple:
+    """
+    인물 리스트에서 궁합 계산용 특징 배열을 만듭니다. 생년월일을 알 수 없는 인물은 빠집니다.
+
+    Returns:
+        (남은 인물 리스트, {"code": (n,) int 배열 (_code 참고), "elements": (n, 5) float 배열})
+    """
+    kept, day_stem, day_branch, year_branch, elements = [], [], [], [], []
+    for character in characters:
+        chart = birth_chart(character.get("birth_date"), character.get("birth_time"))
+        if chart is None:
+            continue
+        kept.append(character)
+        day_stem.append(chart["day"][0])
+        day_branch.append(chart["day"][1])
+        year_branch.append(chart["year"][1])
+        elements.append(element_counts(chart))
+    return kept, {
+        "code": _code(np.array(day_stem), np.array(day_branch), np.array(year_branch)).astype(np.int16),
+        "elements": np.array(elements, dtype=np.float32).reshape(-1, len(ELEMENTS)),
+    }
+
+def _branch_score(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # 육합: 자축, 인해, 묘술, 진유, 사신, 오미 (인덱스 합이 12로 나눠 1)
+    six = (a + b) % 12 == 1
+    # 삼합: 신자진, 해묘미, 인오술, 사유축 (인덱스가 4 간격)
+    three = ((a - b) % 4 == 0) & (a != b)
+    # 충: 정반대 지지
+    clash = (a - b) % 12 == 6
+    return 1.0 * six + 0.6 * three - 1.0 * clash
+
+def _needs_offers(elements: np.ndarray) -> tuple:
+    # 2개보다 적은 오행은 부족한 것으로 보고, 가진 오행의 비율을 줄 수 있는 양으로 봅니다
+    needs = np.clip(2.0 - elements, 0.0, 2.0) / 2.0
+    offers = elements / np.maximum(elements.sum(axis=1, keepdims=True), 1.0)
+    return needs, offers
+
+# 일간(10) × 일지(12) × 연지(12) 조합 번호. 규칙 점수는 이 번호 쌍으로 미리 계산한 표에서 읽습니다.
+CODES = 10 * 12 * 12
+
+def _code(day_stem, day_branch, year_branch):
+    return (day_stem * 12 + day_branch) * 12 + year_branch
+
+def _rule_score(stem_a, day_a, year_a, stem_b, day_b, year_b):
+    """일간/일지/연지 규칙 점수 (배열끼리 브로드캐스트)"""
+    element_a, element_b = stem_a // 2, stem_b // 2
+
+    # 일간 관계
+    stem_combo = (stem_a - stem_b) % 10 == 5
+    generating = ((element_b - element_a) % 5 == 1) | ((element_a - element_b) % 5 == 1)
+    controlling = ((element_b - element_a) % 5 == 2) | ((element_a - element_b) % 5 == 2)
+    same = element_a == element_b
+
+    raw = 1.5 * stem_combo + 1.0 * generating + 0.3 * same - 1.0 * controlling
+    return raw + _branch_score(day_a, day_b) + 0.5 * _branch_score(year_a, year_b)
+
+_rule_table = None
+
+def _rules() -> np.ndarray:
+    """조합 번호 쌍별 규칙 점수표 (CODES × CODES, 처음 쓸 때 한 번 만듭니다)"""
+    global _rule_table
+    if _rule_table is None:
+        codes = np.arange(CODES)
+        stem, day, year = codes // 144, codes // 12 % 12, codes % 12
+        _rule_table = _rule_score(
+            stem[:, None], day[:, None], year[:, None], stem[None, :], day[None, :], year[None, :]
+        ).astype(np.float32)
+    return _rule_table
+
+def score_matrix(a: dict, b: dict) -> np.ndarray:
+    """
+    특징 배열 a(m명)와 b(n명) 사이의 궁합 점수 행렬을 계산합니다.
+
+    Returns:
+        (m, n) float32 배열, 0-100
+    """
+    raw = _rules()[a["code"][:, None], b["code"][None, :]]
+
+    # 오행 보완 (서로 주고받는 양의 평균)
+    needs_a, offers_a = _needs_offers(a["elements"])
+    needs_b, offers_b = _needs_offers(b["elements"])
+    complement = needs_a @ offers_b.T
+    complement += offers_a @ needs_b.T
+
+    scores = raw * 10.0
+    scores += 20.0 * complement
+    scores += 50.0
+    return np.clip(scores, 0.0, 100.0, out=scores)
+
+def score_pair(a: dict, b: dict) -> float:
+    """인물 두 명의 궁합 점수 (벤치마크의 비교 기준, 화면에서는 쓰지 않습니다)"""
+    _, features = _features([a, b])
+    if len(features["code"]) < 2:
+        return None
+    first = {key: value[:1] for key, value in features.items()}
+    second = {key: value[1:] for key, value in features.items()}
+    return float(score_matrix(first, second)[0, 0])
+
+def _top_k(scores: np.ndarray, k: int) -> tuple:
+    """행마다 점수가 높은 k개의 (인덱스, 점수)를 점수 내림차순으로 반환합니다."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    index = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(scores, index, axis=1)
+    order = np.argsort(-top, axis=1, kind="stable")
+    return np.take_along_axis(index, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+def _take(features: dict, start: int, stop: int) -> dict:
+    return {key: value[start:stop] for key, value in features.items()}
+
+def _select(features: dict, rows: np.ndarray) -> dict:
+    return {key: value[rows] for key, value in features.items()}
+
+class CompatibilityIndex:
+    """인물 특징 배열과 인물별 궁합 상위 k명을 메모리에 보관합니다."""
+
+    def __init__(self, k: int = TOP_K):
+        self.k = k
+        self.characters = []
+        self._positions = {}
+        self._features = None
+        self._top_index = np.empty((0, k), dtype=np.int64)
+        self._top_score = np.empty((0, k), dtype=np.float32)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.characters)
+
+    def add(self, characters: list) -> int:
+        """
+        인물들을 추가하고 상위 k명을 갱신합니다. 이미 있는 인물(id 기준)은 건너뜁니다.
+
+        Returns:
+            새로 추가한 인물 수
+        """
+        with self._lock:
+            seen = set(self._positions)
+            fresh = []
+            for character in characters:
+                if character["id"] not in seen:
+                    seen.add(character["id"])
+                    fresh.append(character)
+            fresh, features = _features(fresh)
+            if not fresh:
+                return 0
+            started = time.perf_counter()
+            self._extend(fresh, features)
+            metrics.observe("compat.add_seconds", time.perf_counter() - started)
+            metrics.incr("compat.pairs_scored", len(fresh) * len(self.characters))
+            return len(fresh)
+
+    def _extend(self, fresh: list, features: dict) -> None:
+        old = len(self.characters)
+        if self._features is None:
+            merged = features
+        else:
+            merged = {key: np.concatenate([self._features[key], features[key]]) for key in features}
+        total = old + len(fresh)
+
+        top_index = np.full((total, self.k), -1, dtype=np.int64)
+        top_score = np.full((total, self.k), -np.inf, dtype=np.float32)
+        top_index[:old], top_score[:old] = self._top_index, self._top_score
+
+        for start in range(0, len(fresh), CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, len(fresh))
+            # 새 인물 [start, stop) × 전체 인원 점수 (자기 자신은 제외)
+            scores = score_matrix(_take(features, start, stop), merged)
+            rows = np.arange(stop - start)
+            scores[rows, old + start + rows] = -np.inf
+
+            index, score = _top_k(scores, self.k)
+            top_index[old + start:old + stop, :index.shape[1]] = index
+            top_score[old + start:old + stop, :score.shape[1]] = score
+
+            # 기존 인물의 상위 k명에 이번 묶음을 후보로 넣어 다시 고릅니다
+            # (새 인물끼리는 위에서 전체 인원과 비교했으므로 다시 넣지 않습니다, 점수는 대칭)
+            if old:
+                candidates = np.concatenate([top_score[:old], scores[:, :old].T], axis=1)
+                candidate_index = np.concatenate(
+                    [top_index[:old], np.broadcast_to(old + start + rows, (old, len(rows)))], axis=1
+                )
+                best, best_score = _top_k(candidates, self.k)
+                top_index[:old] = np.take_along_axis(candidate_index, best, axis=1)
+                top_score[:old] = best_score
+
+        for offset, character in enumerate(fresh):
+            self._positions[character["id"]] = old + offset
+        self.characters.extend(fresh)
+        self._features = merged
+        self._top_index, self._top_score = top_index, top_score
+
+    def remove(self, character_ids) -> int:
+        """
+        인물들을 뺍니다. 상위 k명에 뺀 인물이 있던 인물만 남은 전체 인원과 다시 비교합니다.
+
+        Returns:
+            뺀 인물 수
+        """
+        with self._lock:
+            gone = {self._positions[c] for c in character_ids if c in self._positions}
+            if not gone:
+                return 0
+            keep = np.array([i for i in range(len(self.characters)) if i not in gone], dtype=np.int64)
+            remap = np.full(len(self.characters), -1, dtype=np.int64)
+            remap[keep] = np.arange(len(keep))
+
+            self.characters = [self.characters[i] for i in keep]
+            self._positions = {character["id"]: i for i, character in enumerate(self.characters)}
+            if not len(keep):
+                self._features = None
+                self._top_index = np.empty((0, self.k), dtype=np.int64)
+                self._top_score = np.empty((0, self.k), dtype=np.float32)
+                return len(gone)
+
+            self._features = _select(self._features, keep)
+            top_index, top_score = self._top_index[keep], self._top_score[keep]
+            listed = top_index >= 0
+            mapped = np.where(listed, remap[np.where(listed, top_index, 0)], -1)
+            stale = np.flatnonzero((listed & (mapped < 0)).any(axis=1))
+            top_index = mapped
+
+            for start in range(0, len(stale), CHUNK_ROWS):
+                rows = stale[start:start + CHUNK_ROWS]
+                scores = score_matrix(_select(self._features, rows), self._features)
+                scores[np.arange(len(rows)), rows] = -np.inf
+                index, score = _top_k(scores, self.k)
+                top_index[rows], top_score[rows] = -1, -np.inf
+                top_index[rows, :index.shape[1]] = index
+                top_score[rows, :score.shape[1]] = score
+
+            self._top_index, self._top_score = top_index, top_score
+            metrics.incr("compat.removed", len(gone))
+            return len(gone)
+
+    def matches(self, character_id: str, k: int = None) -> list:
+        """
+        인물의 궁합 상위 목록을 반환합니다.
+
+        Returns:
+            [{"id", "name", "age", "occupation", "score"}, ...] (점수 내림차순, 없는 인물이면 None)
+        """
+        with self._lock:
+            position = self._positions.get(character_id)
+            if position is None:
+                return None
+            results = []
+            for index, score in zip(self._top_index[position][:k or self.k], self._top_score[position][:k or self.k]):
+                if index < 0 or not np.isfinite(score):
+                    continue
+                character = self.characters[index]
+                results.append({
+                    "id": character["id"],
+                    "name": character.get("name"),
+                    "age": character.get("age"),
+                    "occupation": character.get("occupation"),
+                    "score": round(float(score)),
+                })
+            return results
+
+def fetch_characters(client, since: str = None) -> list:
+    """
+    characters 테이블에서 궁합 계산에 필요한 컬럼만 (created_at, id) 순서의 키셋 페이지로 읽습니다.
+    한 번에 여러 명을 저장하면(create_characters) 같은 created_at이 많으므로, 페이지 경계에서는 id로 이어서 읽습니다.
+
+    Args:
+        client: Supabase 클라이언트
+        since: 이 시각 이후에 만든 인물만 (없으면 전체)
+    """
+    columns = ", ".join(CHARACTER_COLUMNS)
+    characters, cursor, last_id = [], since, None
+    while True:
+        page = []
+        if last_id is not None:
+            # 직전 페이지의 마지막 시각과 같은 나머지 인물
+            page = client.table("characters").select(columns).eq("created_at", cursor).gt("id", last_id)\
+                .order("id").limit(FETCH_PAGE).execute().data or []
+        if len(page) < FETCH_PAGE:
+            query = client.table("characters").select(columns)
+            if cursor:
+                query = query.gt("created_at", cursor)
+            page += query.order("created_at").order("id").limit(FETCH_PAGE - len(page)).execute().data or []
+        characters += page
+        if len(page) < FETCH_PAGE:
+            return characters
+        cursor, last_id = page[-1]["created_at"], page[-1]["id"]
+
+def _shift(timestamp: str, delta: timedelta) -> str:
+    return (datetime.fromisoformat(timestamp.replace("Z", "+00:00")) + delta).isoformat()
+
+class _CatalogIndex:
+    """characters 테이블 전체의 궁합 캐시를 백그라운드에서 만들고 새 인물만 주기적으로 더합니다."""
+
+    def __init__(self, client_factory):
+        self.index = CompatibilityIndex()
+        self._client_factory = client_factory
+        self._high_water = None
+        self._refreshed_at = None
+        self._loading = False
+        self._lock = threading.Lock()
+        # 남아 있는지 확인한 인물: {id: 확인한 시각}
+        self._verified = {}
+
+    def prune(self, matches: list) -> int:
+        """
+        궁합 목록의 인물이 아직 남아 있는지 확인하고, 지워진 인물은 캐시에서 뺍니다.
+        인물마다 REFRESH_SECONDS 동안은 다시 확인하지 않습니다.
+
+        Returns:
+            뺀 인물 수
+        """
+        now = time.monotonic()
+        with self._lock:
+            unchecked = [m["id"] for m in matches if now - self._verified.get(m["id"], -REFRESH_SECONDS) >= REFRESH_SECONDS]
+        if not unchecked:
+            return 0
+        rows = self._client_factory().table("characters").select("id").in_("id", unchecked).execute().data or []
+        alive = {row["id"] for row in rows}
+        with self._lock:
+            for character_id in alive:
+                self._verified[character_id] = now
+            for character_id in set(unchecked) - alive:
+                self._verified.pop(character_id, None)
+        return self.index.remove(set(unchecked) - alive)
+
+    def _refresh(self) -> None:
+        try:
+            started = time.perf_counter()
+            since = _shift(self._high_water, -FETCH_OVERLAP) if self._high_water else None
+            characters = fetch_characters(self._client_factory(), since)
+            added = self.index.add(characters)
+            if characters:
+                self._high_water = max(filter(None, (c.get("created_at") for c in characters)), default=self._high_water)
+            if added:
+                metrics.observe("compat.refresh_seconds", time.perf_counter() - started)
+                print(f"✅ 궁합 캐시 갱신: 인물 {added}명 추가 (전체 {len(self.index)}명)")
+        except Exception as e:
+            print(f"⚠️ 궁합 캐시 갱신 실패: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshed_at = time.monotonic()
+                self._loading = False
+
+    def ensure_fresh(self) -> bool:
+        """필요하면 백그라운드 갱신을 시작합니다. 캐시가 한 번이라도 만들어졌으면 True"""
+        with self._lock:
+            stale = self._refreshed_at is None or time.monotonic() - self._refreshed_at > REFRESH_SECONDS
+            if stale and not self._loading:
+                self._loading = True
+                threading.Thread(target=self._refresh, name="compat-refresh", daemon=True).start()
+            return self._refreshed_at is not None
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def top_matches(character: dict, k: int = 3) -> list:
+    """
+    인물과 궁합이 잘 맞는 지난 손님을 반환합니다. 캐시가 아직 준비되지 않았으면 None
+    (처음 호출하면 백그라운드에서 캐시를 만들기 시작합니다)
+
+    Args:
+        character: id, birth_date, birth_time 을 포함한 인물 딕셔너리
+        k: 돌려줄 인원
+
+    Returns:
+        [{"id", "name", "age", "occupation", "score"}, ...]
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                from utils.supabase_helper import get_supabase_client
+                _catalog = _CatalogIndex(get_supabase_client)
+    if not _catalog.ensure_fresh():
+        return None
+
+    # 방금 만든 인물은 다음 갱신 전에도 바로 볼 수 있도록 한 줄만 계산해 넣습니다
+    _catalog.index.add([character])
+    metrics.incr("compat.lookups")
+    matches = _catalog.index.matches(character["id"], k)
+    try:
+        if matches and _catalog.prune(matches):
+            # 지워진 손님을 뺐으므로 다시 고른 목록을 돌려줍니다
+            matches = _catalog.index.matches(character["id"], k)
+    except Exception as e:
+        print(f"⚠️ 궁합 목록 확인 실패: {str(e)}")
+    return matches
+
+# ---- 벤치마크 ----
+
+def _fake_characters(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    start = date(1950, 1, 1)
+    return [
+        {
+            "id": f"bench-{i}",
+            "name": f"손님{i}",
+            "birth_date": (start + timedelta(days=rng.randrange(365 * 55))).isoformat(),
+            "birth_time": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}" if rng.random() < 0.8 else None,
+        }
+        for i in range(count)
+    ]
+
+def bench(count: int, add: int = 100, loop_pairs: int = 2000) -> dict:
+    """
+    가상 인물 count명으로 전체 캐시 생성, 증분 추가, 쌍별 계산(비교 기준) 속도를 잽니다.
+
+    Returns:
+        {"characters", "build_seconds", "build_pairs_per_second", "add_one_ms", "add_batch_ms",
+         "loop_pairs_per_second", "speedup"}
+    """
+    characters = _fake_characters(count + add + 1)
+    index = CompatibilityIndex()
+
+    started = time.perf_counter()
+    index.add(characters[:count])
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index.add(characters[count:count + 1])
+    add_one = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index.add(characters[count + 1:])
+    add_batch = time.perf_counter() - started
+
+    # 비교 기준: 쌍마다 따로 계산
+    pairs = [(characters[i % count], characters[(i * 7 + 1) % count]) for i in range(loop_pairs)]
+    started = time.perf_counter()
+    for a, b in pairs:
+        score_pair(a, b)
+    loop_rate = loop_pairs / (time.perf_counter() - started)
+
+    build_rate = count * count / build_seconds if build_seconds else 0.0
+    return {
+        "characters": count,
+        "build_seconds": round(build_seconds, 3),
+        "build_pairs_per_second": round(build_rate),
+        "add_one_ms": round(add_one * 1000, 2),
+        "add_batch_ms": round(add_batch * 1000, 2),
+        "add_batch_size": add,
+        "loop_pairs_per_second": round(loop_rate),
+        "speedup": round(build_rate / loop_rate, 1) if loop_rate else None,
+    }
+
+def main(argv: list = None) -> dict:
+    parser = argparse.ArgumentParser(description="손님 궁합 점수 계산")
+    parser.add_argument("--bench", action="store_true", help="가상 인물로 초당 점수 계산 수를 잽니다")
+    parser.add_argument("--count", type=int, default=5000, help="[--bench] 가상 인물 수")
+    parser.add_argument("--character-id", help="저장된 인물의 궁합 상위 목록을 출력")
+    parser.add_argument("--top", type=int, default=TOP_K, help="출력할 인원")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    args = parser.parse_args(argv)
+
+    if args.bench or not args.character_id:
+        result = bench(args.count)
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        else:
+            print(f"📏 인물 {result['characters']:,}명 전체 캐시: {result['build_seconds']:.2f}s "
+                  f"({result['build_pairs_per_second']:,}쌍/초)")
+            print(f"   새 인물 1명 추가: {result['add_one_ms']:.1f} ms · {result['add_batch_size']}명 추가: {result['add_batch_ms']:.1f} ms")
+            print(f"   쌍별 계산(비교 기준): {result['loop_pairs_per_second']:,}쌍/초 → 벡터 연산 {result['speedup']}배")
+        return result
+
+    from utils.supabase_helper import get_supabase_client
+
+    index = CompatibilityIndex(k=args.top)
+    index.add(fetch_characters(get_supabase_client()))
+    matches = index.matches(args.character_id)
+    if args.json:
+        print(json.dumps(matches, ensure_ascii=False, indent=2))
+    elif matches is None:
+        print(f"❌ 인물을 찾을 수 없거나 생년월일이 없습니다: {args.character_id}")
+    else:
+        for match in matches:
+            print(f"🤝 {match['score']:>3}점  {match['name']} ({match['age']}세, {match['occupation']})")
+    return matches
+
+if __name__ == "__main__":
+    main()
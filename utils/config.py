@@ -0,0 +1,20 @@
+"""
+환경 설정 모듈
+.env 파일은 프로세스당 한 번만 읽습니다.
+"""
+
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+def load_env() -> None:
+    """.env 파일의 환경 변수를 불러옵니다. 이미 불러왔으면 아무것도 하지 않습니다."""
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _loaded = True
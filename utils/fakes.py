@@ -0,0 +1,506 @@
+"""
+로컬 대체 클라이언트 (OpenAI / Supabase)
+부하 테스트와 로컬 실행에서 외부 API 대신 사용하는 가짜 클라이언트입니다.
+호출마다 설정한 지연 시간만큼 기다린 뒤 그럴듯한 응답을 돌려줍니다.
+
+사용 예:
+    from utils import fakes
+    fakes.install(llm_latency=0.5, db_latency=0.02)
+"""
+
+import io
+import os
+import re
+import json
+import time
+import uuid
+import random
+import threading
+from collections import deque
+from copy import deepcopy
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+_SURNAMES = ("김", "이", "박", "최", "정", "강", "조", "윤")
+_GIVEN_NAMES = ("민준", "서연", "지훈", "하은", "도윤", "수아", "현우", "지민")
+_OCCUPATIONS = ("교사", "간호사", "개발자", "요리사", "택시기사", "디자이너", "공무원", "자영업자")
+_CONCERNS = ("이직을 해야 할지 고민입니다", "자녀 진학 문제로 걱정이 많습니다", "사업을 시작해도 될지 궁금합니다")
+
+# 자동 프롬프트 캐시 흉내: 최소 길이와 캐시 단위(토큰), 기억하는 최근 프롬프트 수
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_BLOCK = 128
+PROMPT_CACHE_SIZE = 256
+
+def _sleep(latency: float, jitter: float) -> None:
+    if latency > 0:
+        time.sleep(max(0.0, random.gauss(latency, latency * jitter)))
+
+def _estimate_tokens(text: str) -> int:
+    # 한국어 기준 대략 글자 2개당 1토큰
+    return max(1, len(text) // 2)
+
+class _FakeCompletions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, model=None, messages=None, max_tokens=None, stream=False, **kwargs):
+        owner = self._owner
+        owner.calls += 1
+        prompt = "\n".join(f"{m.get('role')}:{m.get('content', '')}" for m in messages or [])
+        text = owner.reply_for(messages or [], kwargs.get("response_format"))
+        usage = SimpleNamespace(
+            prompt_tokens=_estimate_tokens(prompt),
+            completion_tokens=_estimate_tokens(text),
+            total_tokens=_estimate_tokens(prompt) + _estimate_tokens(text),
+            prompt_tokens_details=SimpleNamespace(cached_tokens=owner.cached_tokens(prompt))
+        )
+
+        if not stream:
+            _sleep(owner.latency + usage.completion_tokens * owner.token_latency, owner.jitter)
+            message = SimpleNamespace(content=text, role="assistant")
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage, model=model
+            )
+
+        def chunks():
+            # 첫 토큰까지의 지연 후 조각을 나눠 보냅니다
+            _sleep(owner.latency / 2, owner.jitter)
+            step = max(1, len(text) // 20)
+            for i in range(0, len(text), step):
+                time.sleep(owner.latency / 40 + _estimate_tokens(text[i:i + step]) * owner.token_latency)
+                delta = SimpleNamespace(content=text[i:i + step])
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+            yield SimpleNamespace(choices=[], usage=usage)
+        return chunks()
+
+class _FakeImages:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def generate(self, **kwargs):
+        _sleep(self._owner.image_latency, self._owner.jitter)
+        url = f"https://fake-images.local/{uuid.uuid4().hex}.png"
+        return SimpleNamespace(data=[SimpleNamespace(url=url)])
+
+class FakeOpenAI:
+    """openai.OpenAI 중 이 앱이 쓰는 부분(chat.completions, images)만 흉내 냅니다."""
+
+    def __init__(self, latency: float = 0.5, image_latency: float = 2.0, jitter: float = 0.2,
+                 token_latency: float = 0.0):
+        self.latency = latency
+        self.image_latency = image_latency
+        # 응답 토큰 하나를 만드는 데 걸리는 시간(초)
+        self.token_latency = token_latency
+        self.jitter = jitter
+        self.calls = 0
+        # 최근 프롬프트 (자동 프롬프트 캐시 흉내용)
+        self._prompts = deque(maxlen=PROMPT_CACHE_SIZE)
+        self._prompts_lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+        self.images = _FakeImages(self)
+
+    def cached_tokens(self, prompt: str) -> int:
+        """
+        OpenAI의 자동 프롬프트 캐시를 흉내 냅니다. 최근 프롬프트와 앞부분이 같은 만큼을
+        PROMPT_CACHE_MIN_TOKENS 이상일 때 PROMPT_CACHE_BLOCK 토큰 단위로 캐시된 것으로 봅니다.
+        """
+        with self._prompts_lock:
+            shared = max((len(os.path.commonprefix((prompt, seen))) for seen in self._prompts), default=0)
+            self._prompts.append(prompt)
+        tokens = _estimate_tokens(prompt[:shared]) if shared else 0
+        if tokens < PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        return tokens - tokens % PROMPT_CACHE_BLOCK
+
+    @staticmethod
+    def _profile() -> dict:
+        age = random.randint(20, 60)
+        return {
+            "name": random.choice(_SURNAMES) + random.choice(_GIVEN_NAMES),
+            "age": age,
+            "gender": random.choice(("남성", "여성")),
+            "occupation": random.choice(_OCCUPATIONS),
+            "personality": "차분하고 신중한 편입니다.",
+            "concern": f"{random.choice(_CONCERNS)} ({uuid.uuid4().hex[:4]})",
+            "birth_date": f"{datetime.now().year - age}-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
+            "birth_time": f"{random.randint(0, 23):02d}:{random.choice((0, 30)):02d}",
+            "speaking_style": "조심스러운 존댓말",
+        }
+
+    def reply_for(self, messages: list, response_format) -> str:
+        system = str(messages[0].get("content", "")) if messages else ""
+        if not response_format:
+            return random.choice((
+                "요즘 마음이 복잡해서 찾아왔어요.",
+                "네, 맞아요. 그 부분이 제일 걱정이에요.",
+                "그렇게 말씀해 주시니 조금 마음이 놓이네요.",
+            ))
+        single = re.search(r"다음 항목 하나만 작성하세요: (\w+)", str(messages[-1].get("content", "")))
+        if single:
+            # 항목별 동시 해석: 요청한 항목만 돌려줍니다
+            return json.dumps({single.group(1): self._fortune()[single.group(1)]}, ensure_ascii=False)
+        if "character designer" in system:
+            batch = re.search(r"서로 다른 인물 (\d+)명", str(messages[-1].get("content", "")))
+            if batch:
+                return json.dumps({"characters": [self._profile() for _ in range(int(batch.group(1)))]}, ensure_ascii=False)
+            return json.dumps(self._profile(), ensure_ascii=False)
+        return json.dumps(self._fortune(), ensure_ascii=False)
+
+    @staticmethod
+    def _fortune() -> dict:
+        return {
+            "fortune_analysis": "올해는 목(木)의 기운이 강해 새로운 시작에 유리합니다. " * 3,
+            "personality_analysis": "신중하고 배려심이 깊은 성향입니다. " * 2,
+            "advice": "서두르지 말고 가까운 사람과 충분히 상의해 보세요. " * 2,
+            "summary": "천천히, 그러나 꾸준히 나아가면 길이 열립니다.",
+        }
+
+class _Result:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+# 수정할 때 updated_at을 트리거로 바꾸는 테이블 (supabase/migrations)
+_TOUCHED_TABLES = {"fortune_results"}
+
+def _split_columns(columns: str) -> list:
+    parts, depth, current = [], 0, ""
+    for ch in columns:
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        depth += (ch == "(") - (ch == ")")
+        current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+class _FakeQuery:
+    def __init__(self, db, table: str):
+        self._db = db
+        self._table = table
+        self._action = "select"
+        self._columns = "*"
+        self._payload = None
+        self._filters = []
+        self._order = []
+        self._limit = None
+        self._on_conflict = None
+        self._ignore_duplicates = False
+        self._count = None
+
+    def select(self, columns: str = "*", count: str = None):
+        self._action, self._columns, self._count = "select", columns, count
+        return self
+
+    def delete(self):
+        self._action = "delete"
+        return self
+
+    def insert(self, data):
+        self._action, self._payload = "insert", data
+        return self
+
+    def update(self, data):
+        self._action, self._payload = "update", data
+        return self
+
+    def upsert(self, data, on_conflict: str = None, ignore_duplicates: bool = False):
+        self._action, self._payload = "upsert", data
+        self._on_conflict, self._ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def eq(self, column, value):
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def lt(self, column, value):
+        self._filters.append(lambda row: row.get(column) is not None and row.get(column) < value)
+        return self
+
+    def gt(self, column, value):
+        self._filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self._filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def order(self, column, desc: bool = False):
+        # 여러 번 부르면 앞의 컬럼이 우선인 다중 정렬입니다
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def execute(self):
+        _sleep(self._db.latency, self._db.jitter)
+        with self._db.lock:
+            count = len(self._matching()) if self._count else None
+            return _Result(getattr(self, f"_{self._action}")(), count)
+
+    def _rows(self) -> list:
+        return self._db.tables.setdefault(self._table, [])
+
+    def _matching(self) -> list:
+        return [row for row in self._rows() if all(check(row) for check in self._filters)]
+
+    def _select(self) -> list:
+        rows = self._matching()
+        for column, desc in reversed(self._order):
+            rows = sorted(rows, key=lambda row: str(row.get(column) or ""), reverse=desc)
+        if self._limit is not None:
+            rows = rows[:self._limit]
+
+        selected = []
+        for row in rows:
+            output = {}
+            for column in _split_columns(self._columns):
+                embed = re.fullmatch(r"(\w+)\((.*)\)", column)
+                if column == "*":
+                    output.update(row)
+                elif column == "count":
+                    output["count"] = len(rows)
+                elif embed:
+                    # characters(*) → character_id 로 연결된 행
+                    foreign = embed.group(1)
+                    key = foreign.rstrip("s") + "_id"
+                    match = next((r for r in self._db.tables.get(foreign, []) if r["id"] == row.get(key)), None)
+                    sub_columns = _split_columns(embed.group(2))
+                    if match is not None and "*" not in sub_columns:
+                        match = {c: match.get(c) for c in sub_columns}
+                    output[foreign] = deepcopy(match)
+                else:
+                    output[column] = row.get(column)
+            selected.append(deepcopy(output))
+        return selected
+
+    def _new_row(self, data: dict) -> dict:
+        now = datetime.now(timezone.utc).isoformat()
+        row = {"id": str(uuid.uuid4()), "created_at": now, "updated_at": now}
+        for column in ("started_at", "timestamp"):
+            row[column] = now
+        row.update(deepcopy(data))
+        self._rows().append(row)
+        return row
+
+    def _insert(self) -> list:
+        payload = self._payload if isinstance(self._payload, list) else [self._payload]
+        return [deepcopy(self._new_row(data)) for data in payload]
+
+    def _touch(self, row: dict) -> None:
+        if self._table in _TOUCHED_TABLES:
+            row["updated_at"] = datetime.now(timezone.utc).isoformat()
+
+    def _update(self) -> list:
+        rows = self._matching()
+        for row in rows:
+            row.update(deepcopy(self._payload))
+            self._touch(row)
+        return deepcopy(rows)
+
+    def _delete(self) -> list:
+        rows = self._matching()
+        removed = {id(row) for row in rows}
+        self._db.tables[self._table] = [row for row in self._rows() if id(row) not in removed]
+        return deepcopy(rows)
+
+    def _upsert(self) -> list:
+        payload = self._payload if isinstance(self._payload, list) else [self._payload]
+        key = self._on_conflict or "id"
+        written = []
+        for data in payload:
+            existing = next((row for row in self._rows() if row.get(key) == data.get(key)), None)
+            if existing is None:
+                written.append(self._new_row(data))
+            elif not self._ignore_duplicates:
+                existing.update(deepcopy(data))
+                self._touch(existing)
+                written.append(existing)
+        return deepcopy(written)
+
+class _FakeBucket:
+    def __init__(self, db, name: str):
+        self._db = db
+        self._name = name
+
+    def upload(self, path, file, file_options=None):
+        _sleep(self._db.latency, self._db.jitter)
+        with self._db.lock:
+            self._db.files[(self._name, path)] = bytes(file)
+            self._db.file_times[(self._name, path)] = datetime.now(timezone.utc).isoformat()
+        return SimpleNamespace(path=path)
+
+    def list(self, path: str = None, options: dict = None):
+        options = options or {}
+        prefix = f"{path.rstrip('/')}/" if path else ""
+        with self._db.lock:
+            names = sorted(
+                key[1] for key in self._db.files
+                if key[0] == self._name and key[1].startswith(prefix) and "/" not in key[1][len(prefix):]
+            )
+            offset = options.get("offset", 0)
+            return [
+                {
+                    "name": name[len(prefix):],
+                    "created_at": self._db.file_times.get((self._name, name)),
+                    "metadata": {"size": len(self._db.files[(self._name, name)])},
+                }
+                for name in names[offset:offset + options.get("limit", 100)]
+            ]
+
+    def remove(self, paths):
+        with self._db.lock:
+            removed = []
+            for path in paths:
+                if self._db.files.pop((self._name, path), None) is not None:
+                    self._db.file_times.pop((self._name, path), None)
+                    removed.append({"name": path})
+        return removed
+
+    def get_public_url(self, path):
+        return f"https://fake-storage.local/{self._name}/{path}"
+
+class FakeSupabase:
+    """supabase.Client 중 이 앱이 쓰는 부분(table 질의, storage)만 메모리에서 흉내 냅니다."""
+
+    def __init__(self, latency: float = 0.02, jitter: float = 0.2):
+        self.latency = latency
+        self.jitter = jitter
+        self.tables = {}
+        self.files = {}
+        self.file_times = {}
+        self.lock = threading.Lock()
+        self.storage = SimpleNamespace(from_=lambda name: _FakeBucket(self, name))
+
+    def table(self, name: str):
+        return _FakeQuery(self, name)
+
+    def rpc(self, name: str, params: dict = None):
+        return _FakeRpc(self, name, params or {})
+
+class _FakeRpc:
+    """데이터베이스 함수 호출 (supabase/migrations 의 함수를 같은 동작으로 흉내 냅니다)"""
+
+    def __init__(self, db, name: str, params: dict):
+        self._db = db
+        self._name = name
+        self._params = params
+
+    def execute(self):
+        _sleep(self._db.latency, self._db.jitter)
+        with self._db.lock:
+            return _Result(getattr(self, f"_{self._name}")(**self._params))
+
+    def _session_activity(self, p_session_ids):
+        wanted = set(p_session_ids)
+        activity = {}
+        for row in self._db.tables.get("conversations", []):
+            if row.get("session_id") not in wanted:
+                continue
+            entry = activity.setdefault(row["session_id"], {"session_id": row["session_id"], "last_message_at": None, "user_messages": 0})
+            if row.get("timestamp"):
+                entry["last_message_at"] = max(filter(None, (entry["last_message_at"], row["timestamp"])))
+            entry["user_messages"] += row.get("speaker") == "user"
+        return list(activity.values())
+
+    def _delete_idle_sessions(self, p_session_ids, p_idle_before):
+        tables = self._db.tables
+        idle_before = datetime.fromisoformat(p_idle_before)
+
+        def at(value):
+            return datetime.fromisoformat(value) if value else None
+
+        def busy(session_id):
+            return any(
+                c.get("session_id") == session_id and (c.get("speaker") == "user" or (c.get("timestamp") and at(c["timestamp"]) >= idle_before))
+                for c in tables.get("conversations", [])
+            )
+
+        doomed = {
+            s["id"] for s in tables.get("sessions", [])
+            if s["id"] in set(p_session_ids) and s.get("status") == "active"
+            and at(s.get("started_at")) and at(s["started_at"]) < idle_before and not busy(s["id"])
+        }
+        tables["conversations"] = [c for c in tables.get("conversations", []) if c.get("session_id") not in doomed]
+        tables["sessions"] = [s for s in tables.get("sessions", []) if s["id"] not in doomed]
+        return list(doomed)
+
+    def _start_returning_guest(self, p_user_id="anonymous", p_character_id=None, p_gender=None,
+                               p_min_age=None, p_max_age=None, p_idempotency_key=None):
+        tables = self._db.tables
+        sessions = tables.setdefault("sessions", [])
+        session = next((s for s in sessions if p_idempotency_key and s.get("idempotency_key") == p_idempotency_key), None)
+        if session is None:
+            def eligible(c):
+                if p_character_id:
+                    return c["id"] == p_character_id
+                return bool(c.get("image_url")) \
+                    and (p_gender is None or c.get("gender") == p_gender) \
+                    and (p_min_age is None or (c.get("age") or 0) >= p_min_age) \
+                    and (p_max_age is None or (c.get("age") or 0) <= p_max_age)
+
+            candidates = [c for c in tables.get("characters", []) if eligible(c)]
+            if not candidates:
+                return None
+            session = _FakeQuery(self._db, "sessions")._new_row({
+                "character_id": random.choice(candidates)["id"], "user_id": p_user_id,
+                "status": "active", "idempotency_key": p_idempotency_key,
+            })
+        character = next(c for c in tables["characters"] if c["id"] == session["character_id"])
+        results = {f["session_id"]: f for f in tables.get("fortune_results", [])}
+        earlier = sorted(
+            (s for s in sessions if s["character_id"] == character["id"] and s["id"] != session["id"] and s["id"] in results),
+            key=lambda s: s.get("started_at") or "", reverse=True,
+        )
+        previous = None
+        if earlier:
+            result = results[earlier[0]["id"]]
+            previous = {"session_id": earlier[0]["id"], "started_at": earlier[0].get("started_at"),
+                        "summary": result.get("summary"), "advice": result.get("advice")}
+        character = {k: v for k, v in character.items() if k != "idempotency_key"}
+        return deepcopy({"session": session, "character": character, "previous": previous})
+
+def fake_image_bytes(size: int = 512) -> bytes:
+    """다운로드한 것처럼 쓸 수 있는 PNG 이미지를 만듭니다."""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), (210, 180, 140)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def install(llm_latency: float = 0.5, image_latency: float = 2.0, db_latency: float = 0.02,
+            jitter: float = 0.2, token_latency: float = 0.0) -> tuple:
+    """
+    openai_helper / supabase_helper 가 가짜 클라이언트를 쓰도록 바꿉니다. (같은 프로세스 안에서만)
+    실제 클라이언트는 처음 사용할 때 만들어지므로, 그 전에 호출하면 openai/supabase 패키지를 불러오지 않습니다.
+
+    Args:
+        llm_latency: 채팅/해석 호출 1회당 지연(초)
+        image_latency: 이미지 생성 1회당 지연(초)
+        db_latency: Supabase 질의 1회당 지연(초)
+        jitter: 지연 시간의 상대 표준편차
+        token_latency: 응답 토큰 하나당 추가 지연(초)
+
+    Returns:
+        (FakeOpenAI, FakeSupabase)
+    """
+    from utils import openai_helper, supabase_helper
+
+    fake_openai = FakeOpenAI(latency=llm_latency, image_latency=image_latency, jitter=jitter,
+                             token_latency=token_latency)
+    fake_supabase = FakeSupabase(latency=db_latency, jitter=jitter)
+    image = fake_image_bytes()
+
+    def download_image(image_url: str) -> bytes:
+        _sleep(db_latency, jitter)
+        return image
+
+    openai_helper._client = fake_openai
+    openai_helper.download_image = download_image
+    supabase_helper._client = fake_supabase
+    return fake_openai, fake_supabase
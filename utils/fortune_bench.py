@@ -0,0 +1,124 @@
+"""
+사주 해석 벤치마크
+한 번의 요청으로 네 항목을 모두 쓰는 단일 경로(analyze_fortune_stream)와
+항목별 작은 요청을 동시에 보내는 분할 경로(analyze_fortune_fanout)를 비교합니다.
+첫 항목까지의 시간, 전체 소요 시간, 받은 항목 수, 토큰 수(캐시 포함)를 보고합니다.
+
+실행:
+    python -m utils.fortune_bench --fake --runs 5                    # 로컬 대체 클라이언트
+    python -m utils.fortune_bench --fake --section-timeout 1.2       # 항목별 제한 시간과 부분 결과 확인
+    python -m utils.fortune_bench --runs 3                           # 실제 OpenAI API (비용 발생)
+"""
+
+import json
+import time
+import argparse
+
+SAMPLE_CHARACTER = {
+    "name": "김서연", "age": 34, "gender": "여성", "occupation": "초등학교 교사",
+    "personality": "꼼꼼하고 책임감이 강하지만 걱정이 많음",
+    "concern": "이직을 해야 할지 지금 학교에 남아야 할지 고민",
+    "birth_date": "1992-03-14", "birth_time": "오전 7시",
+}
+
+def _conversation(turns: int) -> list:
+    """벤치마크용 대화 기록 (손님과 인물이 번갈아 말함)"""
+    lines = (
+        ("user", "요즘 가장 마음에 걸리는 일이 무엇인가요?"),
+        ("ai", "학교 일은 익숙해졌는데, 이대로 십 년을 더 보내도 될지 자꾸 생각하게 돼요."),
+        ("user", "옮기고 싶은 곳이 구체적으로 있으신가요?"),
+        ("ai", "교육 콘텐츠를 만드는 회사에서 제안을 받았어요. 연봉은 비슷하지만 안정성이 걱정돼요."),
+    )
+    return [{"speaker": speaker, "message": message} for speaker, message in (lines * turns)[:turns * 2]]
+
+def _measure(name: str, analyze, conversation: list, runs: int) -> dict:
+    from utils.openai_helper import get_last_usage
+
+    first, total, sections = [], [], []
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "requests": 0}
+    for _ in range(runs):
+        started = time.perf_counter()
+        first_at, result = None, {}
+        for key, value in analyze(SAMPLE_CHARACTER, conversation, user_id="fortune-bench"):
+            if first_at is None:
+                first_at = time.perf_counter() - started
+            result[key] = value
+        total.append(time.perf_counter() - started)
+        first.append(first_at if first_at is not None else total[-1])
+        sections.append(len(result))
+        last = get_last_usage() or {}
+        for key in usage:
+            usage[key] += last.get(key, 0)
+
+    return {
+        "path": name,
+        "runs": runs,
+        "first_section_seconds": round(sum(first) / runs, 3),
+        "total_seconds": round(sum(total) / runs, 3),
+        "max_seconds": round(max(total), 3),
+        "sections": round(sum(sections) / runs, 2),
+        "requests_per_run": round(usage["requests"] / runs, 1),
+        "prompt_tokens_per_run": round(usage["prompt_tokens"] / runs),
+        "cached_tokens_per_run": round(usage["cached_tokens"] / runs),
+        "completion_tokens_per_run": round(usage["completion_tokens"] / runs),
+    }
+
+def run(runs: int, turns: int, section_timeout: float = None) -> list:
+    """
+    같은 대화를 단일 경로와 분할 경로로 runs번씩 해석하고 결과를 비교합니다.
+
+    Returns:
+        경로별 결과 딕셔너리 리스트
+    """
+    from utils.openai_helper import analyze_fortune_stream, analyze_fortune_fanout
+
+    conversation = _conversation(turns)
+
+    def fanout(character, history, user_id):
+        return analyze_fortune_fanout(character, history, user_id=user_id, section_timeout=section_timeout)
+
+    return [
+        _measure("single", analyze_fortune_stream, conversation, runs),
+        _measure("fanout", fanout, conversation, runs),
+    ]
+
+def main(argv: list = None) -> list:
+    parser = argparse.ArgumentParser(description="사담 사주 해석 벤치마크 (단일 요청 vs 항목별 동시 요청)")
+    parser.add_argument("--runs", type=int, default=3, help="경로별 해석 횟수")
+    parser.add_argument("--turns", type=int, default=10, help="대화 기록의 턴 수 (손님+인물 한 쌍이 1턴)")
+    parser.add_argument("--section-timeout", type=float, default=None, help="분할 경로의 항목별 제한 시간(초)")
+    parser.add_argument("--fake", action="store_true", help="OpenAI/Supabase 대신 로컬 대체 클라이언트 사용")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="[--fake] 요청 1회당 고정 지연(초)")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="[--fake] 응답 토큰 하나당 지연(초)")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    args = parser.parse_args(argv)
+
+    from utils.admission import configure_admission
+
+    if args.fake:
+        from utils import fakes
+        fakes.install(llm_latency=args.llm_latency, token_latency=args.token_latency, db_latency=0.02, jitter=0.0)
+    # 벤치마크는 수락 제어 한도에 걸리지 않도록 충분히 큰 한도를 씁니다
+    configure_admission(rate_per_minute=100_000, burst=100_000)
+
+    results = run(args.runs, args.turns, args.section_timeout)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return results
+
+    print(f"\n{'경로':<8}{'첫 항목(s)':>12}{'전체(s)':>10}{'최대(s)':>10}{'항목':>6}{'요청':>6}{'입력(캐시)':>16}{'출력':>8}")
+    for r in results:
+        print(f"{r['path']:<8}{r['first_section_seconds']:>12.2f}{r['total_seconds']:>10.2f}{r['max_seconds']:>10.2f}"
+              f"{r['sections']:>6.1f}{r['requests_per_run']:>6.0f}"
+              f"{r['prompt_tokens_per_run']:>9}({r['cached_tokens_per_run']:>5})"
+              f"{r['completion_tokens_per_run']:>8}")
+    single, fanout = results
+    if fanout["sections"] < single["sections"]:
+        print(f"\n⚠️ 항목별 동시 요청: 제한 시간 안에 평균 {fanout['sections']:.1f}개 항목만 받았습니다 (부분 결과)")
+    elif fanout["total_seconds"]:
+        print(f"\n✅ 항목별 동시 요청: 전체 시간 {single['total_seconds'] / fanout['total_seconds']:.1f}배 빠름, "
+              f"입력 토큰 {fanout['prompt_tokens_per_run'] / max(single['prompt_tokens_per_run'], 1):.1f}배")
+    return results
+
+if __name__ == "__main__":
+    main()
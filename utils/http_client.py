@@ -0,0 +1,270 @@
+"""
+공유 HTTP 클라이언트 (keep-alive 연결 풀)
+OpenAI API 호출과 이미지 다운로드가 하나의 httpx 클라이언트와 연결 풀을 같이 씁니다.
+요청마다 TCP/TLS 연결을 새로 맺지 않고 열린 연결을 재사용하며, h2 패키지가 있으면 HTTP/2로 한 연결에 요청을 겹쳐 보냅니다.
+
+- 연결 풀 크기와 keep-alive 유지 시간은 HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_SECONDS 로 조정합니다.
+- 대기 시간(timeout)은 작업 종류별로 다릅니다 (timeout_for 참고).
+- 요청마다 새 연결인지 재사용인지와 연결 수립 시간을 http.* 지표로 남깁니다.
+
+사용법 (연결 재사용 전후 비교):
+    python -m utils.http_client --bench                 # 로컬 테스트 서버로 측정
+    python -m utils.http_client --bench --url https://api.openai.com/v1/models --requests 20
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from urllib.parse import urlsplit
+
+from utils import metrics
+from utils.config import load_env
+
+# Load environment variables
+load_env()
+
+# 연결 풀 설정
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+# HTTP/2 사용 여부 (h2 패키지가 없으면 HTTP/1.1 keep-alive만 사용)
+HTTP2 = os.getenv("HTTP2", "1") == "1"
+
+# 작업 종류별 대기 시간(초): (연결, 응답 읽기)
+# 연결은 어느 작업이든 짧게 끊고, 응답 읽기는 작업이 오래 걸리는 만큼 길게 잡습니다.
+TIMEOUTS = {
+    "default": (5.0, 60.0),
+    "chat": (5.0, 30.0),
+    "profile": (5.0, 60.0),
+    "analysis": (5.0, 90.0),
+    "stream": (5.0, 30.0),       # 스트리밍은 토큰 사이의 간격 기준
+    "image": (5.0, 120.0),
+    "download": (5.0, 30.0),
+}
+
+# httpx는 클라이언트를 처음 만들 때 import합니다 (앱 시작 시간에 넣지 않음)
+_client = None
+_client_lock = threading.Lock()
+
+def _http2_available() -> bool:
+    if not HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def timeout_for(kind: str, read: float = None) -> "httpx.Timeout":
+    """
+    작업 종류별 대기 시간을 반환합니다.
+
+    Args:
+        kind: 작업 종류 ("chat", "profile", "analysis", "stream", "image", "download")
+        read: 응답 읽기 대기 시간을 따로 정할 때 (초)
+
+    Returns:
+        httpx.Timeout (연결 풀 대기와 쓰기는 연결 대기 시간과 같게)
+    """
+    import httpx
+
+    connect, default_read = TIMEOUTS.get(kind, TIMEOUTS["default"])
+    read = default_read if read is None else read
+    return httpx.Timeout(read, connect=connect, pool=connect)
+
+def _target(host: str) -> str:
+    """지표 이름에 쓰는 대상 이름 (OpenAI API와 그 밖의 이미지 호스트를 구분)"""
+    return "openai" if host == "api.openai.com" else "download"
+
+class _ConnectionTrace:
+    """요청 하나의 연결 수립 과정을 지켜봅니다. (httpcore trace 확장)"""
+
+    def __init__(self):
+        self.started = {}
+        self.connect_seconds = 0.0
+        self.new_connection = False
+
+    def __call__(self, event: str, info: dict) -> None:
+        step = event.rsplit(".", 1)[0].split(".")[-1]
+        if step not in ("connect_tcp", "start_tls"):
+            return
+        if event.endswith(".started"):
+            self.new_connection = True
+            self.started[step] = time.perf_counter()
+        elif event.endswith(".complete") and step in self.started:
+            elapsed = time.perf_counter() - self.started.pop(step)
+            self.connect_seconds += elapsed
+            metrics.observe(f"http.{step}_seconds", elapsed)
+
+def _on_request(request) -> None:
+    request.extensions["trace"] = _ConnectionTrace()
+
+def _on_response(response) -> None:
+    trace = response.request.extensions.get("trace")
+    if not isinstance(trace, _ConnectionTrace):
+        return
+    target = _target(response.request.url.host)
+    if trace.new_connection:
+        metrics.incr(f"http.{target}.connections_new")
+        metrics.observe(f"http.{target}.connect_seconds", trace.connect_seconds)
+    else:
+        metrics.incr(f"http.{target}.connections_reused")
+    metrics.incr(f"http.{target}.{response.http_version.replace('/', '').lower()}")
+
+def build_client(http2: bool = None) -> "httpx.Client":
+    """
+    연결 풀 설정을 적용한 httpx 클라이언트를 만듭니다.
+
+    Args:
+        http2: HTTP/2 사용 여부 (기본값: HTTP2 설정과 h2 설치 여부에 따름)
+
+    Returns:
+        httpx.Client
+    """
+    import httpx
+
+    if http2 is None:
+        http2 = _http2_available()
+    return httpx.Client(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_SECONDS,
+        ),
+        timeout=timeout_for("default"),
+        follow_redirects=True,
+        event_hooks={"request": [_on_request], "response": [_on_response]},
+    )
+
+def get_http_client() -> "httpx.Client":
+    """공유 HTTP 클라이언트를 반환합니다. 프로세스당 한 번만 만들고 재사용합니다."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = build_client()
+                print(f"✅ 공유 HTTP 클라이언트 준비 (HTTP/2: {'사용' if _http2_available() else '미사용'}, "
+                      f"연결 {MAX_CONNECTIONS}개, keep-alive {MAX_KEEPALIVE}개/{KEEPALIVE_SECONDS:.0f}초)")
+    return _client
+
+def get_connection_stats() -> dict:
+    """
+    대상별 연결 재사용 현황을 반환합니다.
+
+    Returns:
+        {대상: {"new", "reused", "reuse_rate", "connect_ms_avg"}}
+    """
+    snapshot = metrics.snapshot("http.")
+    stats = {}
+    for target in ("openai", "download"):
+        new = int(snapshot["counters"].get(f"http.{target}.connections_new", 0))
+        reused = int(snapshot["counters"].get(f"http.{target}.connections_reused", 0))
+        if not new + reused:
+            continue
+        connect = snapshot["observations"].get(f"http.{target}.connect_seconds", {})
+        stats[target] = {
+            "new": new,
+            "reused": reused,
+            "reuse_rate": reused / (new + reused),
+            "connect_ms_avg": connect.get("avg", 0.0) * 1000,
+        }
+    return stats
+
+def _local_server():
+    """벤치마크용 로컬 HTTP/1.1 keep-alive 서버를 띄우고 (서버, URL)을 반환합니다."""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    body = b"x" * 1024
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+def _timed_requests(url: str, count: int, get) -> dict:
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        get(url)  # 응답 상태와 관계없이 연결과 왕복 시간만 봅니다
+        latencies.append(time.perf_counter() - started)
+    return {
+        "requests": count,
+        "p50_ms": metrics.percentile(latencies, 50) * 1000,
+        "p95_ms": metrics.percentile(latencies, 95) * 1000,
+        "total_seconds": sum(latencies),
+    }
+
+def bench(url: str = None, count: int = 20) -> dict:
+    """
+    요청마다 새 연결을 맺을 때(기존 requests.get 방식)와 공유 연결 풀을 쓸 때의 지연을 비교합니다.
+
+    Args:
+        url: 요청할 URL (기본값: 로컬 테스트 서버)
+        count: 방식별 요청 수
+
+    Returns:
+        {"url", "fresh", "shared", "connections"}
+    """
+    server = None
+    if not url:
+        server, url = _local_server()
+    try:
+        import requests
+
+        fresh = _timed_requests(url, count, lambda target: requests.get(target, timeout=30))
+        before = metrics.snapshot("http.")["counters"]
+        with build_client() as client:
+            shared = _timed_requests(url, count, client.get)
+        after = metrics.snapshot("http.")["counters"]
+        target = _target(urlsplit(url).hostname)
+        connections = {
+            key: int(after.get(f"http.{target}.connections_{key}", 0) - before.get(f"http.{target}.connections_{key}", 0))
+            for key in ("new", "reused")
+        }
+        return {"url": url, "fresh": fresh, "shared": shared, "connections": connections}
+    finally:
+        if server is not None:
+            server.shutdown()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="공유 HTTP 연결 풀 점검")
+    parser.add_argument("--bench", action="store_true", help="새 연결과 연결 재사용의 지연 비교")
+    parser.add_argument("--url", default=None, help="벤치마크 대상 URL (기본값: 로컬 테스트 서버)")
+    parser.add_argument("--requests", type=int, default=20, help="방식별 요청 수 (기본값: 20)")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    args = parser.parse_args(argv)
+
+    if not args.bench:
+        parser.print_help()
+        return 1
+
+    result = bench(args.url, args.requests)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"🔍 대상: {result['url']} (방식별 {args.requests}회)")
+    for label, key in (("요청마다 새 연결", "fresh"), ("공유 연결 풀", "shared")):
+        row = result[key]
+        print(f"  {label}: p50 {row['p50_ms']:.1f}ms · p95 {row['p95_ms']:.1f}ms · 합계 {row['total_seconds'] * 1000:.0f}ms")
+    print(f"  공유 연결 풀: 새 연결 {result['connections']['new']}개 · 재사용 {result['connections']['reused']}회")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+인물 이미지 처리 모듈
+업로드할 원본 이미지에서 여러 크기의 WebP 썸네일을 만들고, 화면 크기에 맞는 것을 고릅니다.
+
+벤치마크:
+    python -m utils.image_helper 이미지.png
+"""
+
+import io
+import os
+import sys
+import time
+
+# 생성할 썸네일 가로 크기(px)
+PORTRAIT_SIZES = (96, 192, 384)
+WEBP_QUALITY = int(os.getenv("PORTRAIT_WEBP_QUALITY", "80"))
+
+def make_portrait_derivatives(image_data: bytes, sizes: tuple = PORTRAIT_SIZES) -> dict:
+    """
+    원본 이미지에서 크기별 WebP 썸네일을 만듭니다.
+
+    Args:
+        image_data: 원본 이미지 바이트 데이터
+        sizes: 만들 썸네일의 가로 크기 목록
+
+    Returns:
+        {크기: WebP 바이트 데이터}
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_data)) as original:
+        original = original.convert("RGB")
+        derivatives = {}
+        for size in sorted(sizes):
+            if size >= original.width:
+                continue
+            image = original.copy()
+            image.thumbnail((size, size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+            derivatives[size] = buffer.getvalue()
+    return derivatives
+
+def image_width(image_data: bytes) -> int:
+    """이미지의 가로 크기(px)를 반환합니다."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_data)) as image:
+        return image.width
+
+def pick_variant(variants: dict, display_px: int, dpr: float = 1.0) -> dict:
+    """
+    화면에 표시할 크기(display_px × dpr)를 덮는 가장 작은 이미지를 고릅니다.
+
+    Args:
+        variants: characters.image_variants ({"96": {"url", "bytes", "width"}, ..., "original": {...}})
+        display_px: CSS 기준 표시 크기
+        dpr: 기기 픽셀 비율
+
+    Returns:
+        선택된 항목 딕셔너리 (variants가 비어 있으면 None)
+    """
+    if not variants:
+        return None
+    needed = display_px * dpr
+    candidates = sorted(
+        (v for v in variants.values() if v.get("url")),
+        key=lambda v: v.get("width") or sys.maxsize
+    )
+    for variant in candidates:
+        if (variant.get("width") or sys.maxsize) >= needed:
+            return variant
+    return candidates[-1] if candidates else None
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("사용법: python -m utils.image_helper 이미지.png")
+        sys.exit(1)
+
+    with open(sys.argv[1], "rb") as f:
+        data = f.read()
+
+    started = time.perf_counter()
+    derivatives = make_portrait_derivatives(data)
+    elapsed = time.perf_counter() - started
+
+    print(f"원본: {len(data):,} bytes")
+    for size, webp in derivatives.items():
+        print(f"  {size}px WebP: {len(webp):,} bytes ({len(webp) / len(data):.1%})")
+    print(f"썸네일 생성 시간: {elapsed * 1000:.1f} ms")
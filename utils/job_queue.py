@@ -0,0 +1,515 @@
+"""
+사주 해석 백그라운드 작업 큐
+상담 종료 시 해석 작업을 큐에 넣고, 별도 워커 프로세스가 처리합니다.
+
+작업은 session_id 당 하나만 존재하므로 같은 세션을 여러 번 요청해도 중복 해석되지 않습니다.
+
+워커 실행:
+    python -m utils.job_queue --workers 4
+"""
+
+import os
+import sys
+import json
+import atexit
+import time
+import uuid
+import sqlite3
+import argparse
+import threading
+import subprocess
+import multiprocessing
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from utils import metrics
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# 재시도 포함 최대 시도 횟수
+MAX_ATTEMPTS = int(os.getenv("ANALYSIS_JOB_MAX_ATTEMPTS", "3"))
+# 이 시간 동안 완료되지 않은 running 작업은 워커가 죽은 것으로 보고 다시 큐에 넣습니다
+# (가져갈 때마다 시도 횟수가 늘어나므로, MAX_ATTEMPTS 번 가져가고도 끝나지 않은 작업은 실패 처리합니다)
+LEASE_SECONDS = int(os.getenv("ANALYSIS_JOB_LEASE_SECONDS", "180"))
+# 1이면 전체 해석을 항목별 동시 요청으로 만듭니다 (제한 시간을 넘은 항목은 빼고 저장)
+FORTUNE_FANOUT = os.getenv("FORTUNE_FANOUT", "0") == "1"
+
+# 시도 횟수를 다 쓴 채 임대 시간이 지난 작업의 오류 메시지
+LEASE_EXPIRED_ERROR = "작업 시간 초과 (워커 응답 없음)"
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+class SQLiteJobStore:
+    """로컬 SQLite 파일을 사용하는 작업 저장소입니다. (개발/테스트용)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_jobs (
+                    id TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL UNIQUE,
+                    character_id TEXT,
+                    payload TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    worker_id TEXT,
+                    claimed_at TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS analysis_jobs_status_idx ON analysis_jobs (status, created_at)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ("payload", "result"):
+            if job.get(key):
+                job[key] = json.loads(job[key])
+        return job
+
+    def enqueue(self, session_id: str, character_id: str, payload: dict) -> dict:
+        now = _now().isoformat()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = conn.execute(
+                "SELECT * FROM analysis_jobs WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if existing is None:
+                conn.execute(
+                    "INSERT INTO analysis_jobs (id, session_id, character_id, payload, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (str(uuid.uuid4()), session_id, character_id, json.dumps(payload, ensure_ascii=False),
+                     JOB_QUEUED, now, now)
+                )
+            elif existing["status"] == JOB_FAILED:
+                # 실패한 작업을 다시 요청하면 시도 횟수를 초기화하고 다시 큐에 넣습니다
+                conn.execute(
+                    "UPDATE analysis_jobs SET status = ?, attempts = 0, error = NULL, payload = ?, updated_at = ? "
+                    "WHERE session_id = ?",
+                    (JOB_QUEUED, json.dumps(payload, ensure_ascii=False), now, session_id)
+                )
+            conn.execute("COMMIT")
+            row = conn.execute("SELECT * FROM analysis_jobs WHERE session_id = ?", (session_id,)).fetchone()
+        return self._to_dict(row)
+
+    def claim(self, worker_id: str) -> dict:
+        now = _now()
+        stale_before = (now - timedelta(seconds=LEASE_SECONDS)).isoformat()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # 시도 횟수를 다 쓴 채 멈춘 작업은 다시 가져가지 않고 실패 처리합니다
+            expired = conn.execute(
+                "UPDATE analysis_jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE status = ? AND claimed_at < ? AND attempts >= ?",
+                (JOB_FAILED, LEASE_EXPIRED_ERROR, now.isoformat(), JOB_RUNNING, stale_before, MAX_ATTEMPTS)
+            ).rowcount
+            row = conn.execute(
+                "SELECT id FROM analysis_jobs WHERE status = ? OR (status = ? AND claimed_at < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (JOB_QUEUED, JOB_RUNNING, stale_before)
+            ).fetchone()
+            if expired:
+                metrics.incr("jobs.failed", expired)
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE analysis_jobs SET status = ?, attempts = attempts + 1, worker_id = ?, "
+                "claimed_at = ?, updated_at = ? WHERE id = ?",
+                (JOB_RUNNING, worker_id, now.isoformat(), now.isoformat(), row["id"])
+            )
+            conn.execute("COMMIT")
+            job = conn.execute("SELECT * FROM analysis_jobs WHERE id = ?", (row["id"],)).fetchone()
+        return self._to_dict(job)
+
+    def progress(self, session_id: str, partial_result: dict) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE analysis_jobs SET result = ?, updated_at = ? WHERE session_id = ? AND status = ?",
+                (json.dumps(partial_result, ensure_ascii=False), _now().isoformat(), session_id, JOB_RUNNING)
+            )
+
+    def complete(self, session_id: str, result: dict) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE analysis_jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE session_id = ?",
+                (JOB_COMPLETED, json.dumps(result, ensure_ascii=False), _now().isoformat(), session_id)
+            )
+
+    def fail(self, session_id: str, error: str, retry: bool, count_attempt: bool = True) -> None:
+        # count_attempt=False: claim()에서 올린 시도 횟수를 되돌립니다 (속도 제한처럼 작업 실패가 아닌 경우)
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE analysis_jobs SET status = ?, error = ?, updated_at = ?, "
+                "attempts = CASE WHEN ? THEN attempts ELSE MAX(attempts - 1, 0) END WHERE session_id = ?",
+                (JOB_QUEUED if retry else JOB_FAILED, error, _now().isoformat(), count_attempt, session_id)
+            )
+
+    def get(self, session_id: str) -> dict:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM analysis_jobs WHERE session_id = ?", (session_id,)).fetchone()
+        return self._to_dict(row)
+
+class SupabaseJobStore:
+    """Supabase의 analysis_jobs 테이블을 사용하는 작업 저장소입니다."""
+
+    def __init__(self):
+        from utils.supabase_helper import get_supabase_client
+        self._get_client = get_supabase_client
+
+    def _table(self):
+        return self._get_client().table("analysis_jobs")
+
+    def enqueue(self, session_id: str, character_id: str, payload: dict) -> dict:
+        # session_id 유니크 제약으로 같은 세션의 작업은 하나만 생성됩니다
+        self._table().upsert(
+            {
+                "session_id": session_id,
+                "character_id": character_id,
+                "payload": payload,
+                "status": JOB_QUEUED,
+            },
+            on_conflict="session_id",
+            ignore_duplicates=True
+        ).execute()
+
+        # 실패한 작업을 다시 요청하면 시도 횟수를 초기화하고 다시 큐에 넣습니다
+        self._table()\
+            .update({"status": JOB_QUEUED, "attempts": 0, "error": None, "payload": payload,
+                     "updated_at": _now().isoformat()})\
+            .eq("session_id", session_id)\
+            .eq("status", JOB_FAILED)\
+            .execute()
+        return self.get(session_id)
+
+    def claim(self, worker_id: str) -> dict:
+        now = _now()
+        stale_before = (now - timedelta(seconds=LEASE_SECONDS)).isoformat()
+
+        # 오래된 running 작업(죽은 워커)을 먼저 큐로 되돌립니다
+        self._table()\
+            .update({"status": JOB_QUEUED, "updated_at": now.isoformat()})\
+            .eq("status", JOB_RUNNING)\
+            .lt("claimed_at", stale_before)\
+            .lt("attempts", MAX_ATTEMPTS)\
+            .execute()
+        # 남은 오래된 작업은 시도 횟수를 다 쓴 것이므로 실패 처리합니다
+        expired = self._table()\
+            .update({"status": JOB_FAILED, "error": LEASE_EXPIRED_ERROR, "updated_at": now.isoformat()})\
+            .eq("status", JOB_RUNNING)\
+            .lt("claimed_at", stale_before)\
+            .execute()
+        if expired.data:
+            metrics.incr("jobs.failed", len(expired.data))
+
+        candidates = self._table()\
+            .select("id, attempts")\
+            .eq("status", JOB_QUEUED)\
+            .order("created_at")\
+            .limit(5)\
+            .execute()
+
+        for candidate in candidates.data or []:
+            # status 조건부 업데이트로 다른 워커와 경쟁 시 한 워커만 작업을 가져갑니다
+            claimed = self._table()\
+                .update({"status": JOB_RUNNING, "attempts": candidate["attempts"] + 1,
+                         "worker_id": worker_id, "claimed_at": now.isoformat(),
+                         "updated_at": now.isoformat()})\
+                .eq("id", candidate["id"])\
+                .eq("status", JOB_QUEUED)\
+                .execute()
+            if claimed.data:
+                return claimed.data[0]
+        return None
+
+    def progress(self, session_id: str, partial_result: dict) -> None:
+        self._table()\
+            .update({"result": partial_result, "updated_at": _now().isoformat()})\
+            .eq("session_id", session_id)\
+            .eq("status", JOB_RUNNING)\
+            .execute()
+
+    def complete(self, session_id: str, result: dict) -> None:
+        self._table()\
+            .update({"status": JOB_COMPLETED, "result": result, "error": None,
+                     "updated_at": _now().isoformat()})\
+            .eq("session_id", session_id)\
+            .execute()
+
+    def fail(self, session_id: str, error: str, retry: bool, count_attempt: bool = True) -> None:
+        data = {"status": JOB_QUEUED if retry else JOB_FAILED, "error": error, "updated_at": _now().isoformat()}
+        query = self._table().update(data).eq("session_id", session_id)
+        if not count_attempt:
+            # claim()에서 올린 시도 횟수를 되돌립니다 (아직 이 워커가 잡고 있는 동안만)
+            job = self.get(session_id)
+            if job and job.get("status") == JOB_RUNNING:
+                data["attempts"] = max((job.get("attempts") or 0) - 1, 0)
+                query = self._table().update(data).eq("session_id", session_id)\
+                    .eq("status", JOB_RUNNING).eq("attempts", job.get("attempts") or 0)
+        query.execute()
+
+    def get(self, session_id: str) -> dict:
+        result = self._table().select("*").eq("session_id", session_id).execute()
+        return result.data[0] if result.data else None
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_job_store():
+    """
+    환경 변수 ANALYSIS_JOB_STORE 에 따라 작업 저장소를 반환합니다.
+
+    - "supabase" (기본값): Supabase analysis_jobs 테이블
+    - "sqlite:///경로": 로컬 SQLite 파일 (테스트용)
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                spec = os.getenv("ANALYSIS_JOB_STORE", "supabase")
+                if spec.startswith("sqlite:///"):
+                    _store = SQLiteJobStore(spec[len("sqlite:///"):])
+                else:
+                    _store = SupabaseJobStore()
+    return _store
+
+def enqueue_analysis(session_id: str, character_id: str, character_data: dict,
+                     conversation: list = None, draft: dict = None,
+                     user_id: str = "anonymous") -> dict:
+    """
+    사주 해석 작업을 큐에 넣습니다. 같은 세션에 대해 여러 번 호출해도 작업은 하나입니다.
+
+    Args:
+        session_id: 세션 UUID
+        character_id: 인물 UUID
+        character_data: 인물 프로필 딕셔너리
+        conversation: 대화 기록 ({"speaker", "message"} 목록). 없으면 워커가 DB에서 조회합니다.
+        draft: 대화 중 미리 만들어 둔 초안 해석 (SpeculativeAnalyzer.snapshot())
+        user_id: 요청 수락 제어에 사용할 사용자 식별자
+
+    Returns:
+        작업 딕셔너리 (실패 시 None)
+    """
+    try:
+        payload = {"character": character_data, "conversation": conversation,
+                   "draft": draft, "user_id": user_id}
+        job = get_job_store().enqueue(session_id, character_id, payload)
+        ensure_workers()
+        metrics.incr("jobs.enqueued")
+        print(f"✅ 사주 해석 작업 등록: {session_id}")
+        return job
+    except Exception as e:
+        print(f"❌ 사주 해석 작업 등록 실패: {str(e)}")
+        return None
+
+def get_analysis_job(session_id: str) -> dict:
+    """세션의 사주 해석 작업 상태를 조회합니다. (없거나 실패 시 None)"""
+    try:
+        return get_job_store().get(session_id)
+    except Exception as e:
+        print(f"❌ 사주 해석 작업 조회 실패: {str(e)}")
+        return None
+
+def _analyze_conversation(store, session_id: str, payload: dict, conversation: list) -> tuple:
+    """
+    대화를 해석합니다. 초안이 현재 대화와 맞으면 그대로 쓰거나 이후 대화만 반영하고,
+    없으면 전체 해석을 스트리밍으로 (FORTUNE_FANOUT=1이면 항목별 동시 요청으로) 받아 완성된 항목부터 작업에 기록합니다.
+
+    Returns:
+        (해석 결과 딕셔너리, 결과를 만든 요청의 사용량)
+    """
+    from utils.openai_helper import (
+        analyze_fortune_stream, analyze_fortune_fanout, refine_fortune_analysis, get_last_usage
+    )
+    from utils.speculative import draft_matches
+
+    user_id = payload.get("user_id", "anonymous")
+    draft = payload.get("draft")
+
+    if draft_matches(draft, conversation):
+        # 초안을 먼저 보여주고, 필요한 경우에만 갱신합니다
+        store.progress(session_id, draft["result"])
+        new_messages = conversation[draft["covered"]:]
+        if not new_messages:
+            metrics.incr("speculative.reused")
+            return draft["result"], draft.get("usage")
+
+        # 초안을 만든 요청과 같은 앞부분으로 보내 프롬프트 캐시를 씁니다
+        refined = refine_fortune_analysis(
+            payload["character"], draft["result"], new_messages, user_id=user_id,
+            earlier_messages=conversation[:draft["covered"]]
+        )
+        if refined:
+            metrics.incr("speculative.refined")
+            return refined, get_last_usage()
+        # 갱신에 실패하면 전체 해석으로 넘어갑니다
+    elif draft:
+        metrics.incr("speculative.stale")
+
+    analyze = analyze_fortune_fanout if FORTUNE_FANOUT else analyze_fortune_stream
+    result = {}
+    for key, value in analyze(payload["character"], conversation, user_id=user_id):
+        result[key] = value
+        store.progress(session_id, result)
+    return result, get_last_usage()
+
+def process_job(store, job: dict) -> bool:
+    """
+    작업 하나를 처리합니다: 세션 종료 → 사주 해석 → 결과 저장.
+
+    해석 결과는 완성된 항목부터 작업의 result에 기록합니다.
+    각 단계는 재실행해도 안전합니다. 이미 저장된 결과가 있으면 다시 해석하지 않습니다.
+
+    Returns:
+        처리 성공 여부
+    """
+    from utils.admission import AdmissionRejected
+    from utils.supabase_helper import (
+        end_session, get_conversation_history, get_fortune_result_by_session,
+        save_fortune_result
+    )
+
+    session_id = job["session_id"]
+    payload = job.get("payload") or {}
+    started = time.monotonic()
+
+    try:
+        end_session(session_id)
+
+        existing = get_fortune_result_by_session(session_id)
+        if existing:
+            result = {key: existing.get(key) for key in
+                      ("fortune_analysis", "personality_analysis", "advice", "summary")}
+        else:
+            conversation = payload.get("conversation")
+            if conversation is None:
+                conversation = [
+                    {"speaker": msg["speaker"], "message": msg["message"]}
+                    for msg in get_conversation_history(session_id)
+                ]
+
+            result, usage = _analyze_conversation(store, session_id, payload, conversation)
+            if not result:
+                raise RuntimeError("사주 해석 결과가 비어있습니다.")
+            if not save_fortune_result(session_id, job.get("character_id"), result, usage=usage):
+                raise RuntimeError("사주 결과 저장에 실패했습니다.")
+
+        store.complete(session_id, result)
+        metrics.incr("jobs.completed")
+        metrics.observe("jobs.duration_seconds", time.monotonic() - started)
+        return True
+
+    except AdmissionRejected as e:
+        # 속도 제한은 작업 실패가 아니므로 시도 횟수에 넣지 않고 잠시 후 다시 처리합니다
+        store.fail(session_id, str(e), retry=True, count_attempt=False)
+        time.sleep(e.retry_after or 1.0)
+        return False
+    except Exception as e:
+        retry = job.get("attempts", 1) < MAX_ATTEMPTS
+        store.fail(session_id, str(e), retry=retry)
+        metrics.incr("jobs.retried" if retry else "jobs.failed")
+        print(f"❌ 사주 해석 작업 실패 ({session_id}, 재시도: {retry}): {str(e)}")
+        return False
+
+def run_worker(worker_id: str = None, poll_interval: float = 1.0, stop_event=None) -> None:
+    """큐에서 작업을 가져와 처리하는 워커 루프입니다."""
+    worker_id = worker_id or f"{os.uname().nodename}-{os.getpid()}"
+    store = get_job_store()
+    print(f"🔄 사주 해석 워커 시작: {worker_id}")
+
+    while stop_event is None or not stop_event.is_set():
+        try:
+            job = store.claim(worker_id)
+        except Exception as e:
+            print(f"❌ 작업 가져오기 실패: {str(e)}")
+            job = None
+
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        process_job(store, job)
+
+def run_worker_pool(num_workers: int, poll_interval: float = 1.0) -> None:
+    """워커 프로세스 여러 개를 띄우고 종료될 때까지 기다립니다."""
+    processes = [
+        multiprocessing.Process(target=run_worker, kwargs={"poll_interval": poll_interval}, daemon=True)
+        for _ in range(num_workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+_spawned = None
+_spawn_lock = threading.Lock()
+
+def _terminate_spawned() -> None:
+    if _spawned is not None and _spawned.poll() is None:
+        _spawned.terminate()
+
+def ensure_workers() -> None:
+    """
+    ANALYSIS_WORKER_MODE 가 "spawn"(기본값)이면 앱 서버당 한 번 워커 풀 프로세스를 띄웁니다.
+    "external" 이면 운영자가 따로 실행한 워커를 사용합니다.
+
+    수락 제어기(utils.admission)는 프로세스마다 따로 있으므로, 워커가 쓸 몫(admission.worker_slots)을
+    앱의 상한에서 미리 빼 둡니다. 워커 프로세스는 작업 하나씩만 처리하므로 앱과 워커를 합친
+    동시 LLM 호출은 LLM_MAX_CONCURRENCY 를 넘지 않습니다.
+    """
+    global _spawned
+    if os.getenv("ANALYSIS_WORKER_MODE", "spawn") != "spawn":
+        return
+    with _spawn_lock:
+        if _spawned is not None and _spawned.poll() is None:
+            return
+        # 워커가 죽어 다시 띄울 때는 종료 처리를 또 등록하지 않습니다
+        first_spawn = _spawned is None
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        _spawned = subprocess.Popen(
+            [sys.executable, "-m", "utils.job_queue",
+             "--workers", os.getenv("ANALYSIS_WORKERS", "2")],
+            cwd=project_root
+        )
+        if first_spawn:
+            atexit.register(_terminate_spawned)
+        print(f"✅ 사주 해석 워커 풀 시작 (pid: {_spawned.pid})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="사주 해석 작업 워커")
+    parser.add_argument("--workers", type=int, default=2, help="워커 프로세스 수")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="빈 큐 확인 간격(초)")
+    args = parser.parse_args()
+
+    # 워커 프로세스의 수락 제어 상한은 작업 하나분입니다 (admission.process_concurrency)
+    os.environ["ANALYSIS_WORKER_PROCESS"] = "1"
+    if args.workers <= 1:
+        run_worker(poll_interval=args.poll_interval)
+    else:
+        run_worker_pool(args.workers, poll_interval=args.poll_interval)
@@ -0,0 +1,136 @@
+"""
+증분 JSON 파서
+스트리밍으로 조금씩 도착하는 JSON 객체에서, 최상위 필드의 값이 완성되는 즉시 꺼내 줍니다.
+"""
+
+import json
+
+# 파서 상태
+_BEFORE_OBJECT = 0
+_KEY = 1
+_COLON = 2
+_VALUE_START = 3
+_VALUE = 4
+_COMMA = 5
+_DONE = 6
+
+class IncrementalJSONParser:
+    """
+    최상위가 객체인 JSON 텍스트를 조각 단위로 받아 완성된 (키, 값) 쌍을 돌려줍니다.
+
+    올바른 JSON이 아닌 값은 건너뛰고(skipped에 키를 남김) 다음 필드부터 계속 읽습니다.
+
+    사용 예:
+        parser = IncrementalJSONParser()
+        for chunk in chunks:
+            for key, value in parser.feed(chunk):
+                ...
+
+    >>> parser = IncrementalJSONParser()
+    >>> parser.feed('{"fortune_analysis": "x" ')
+    [('fortune_analysis', 'x')]
+    >>> parser.feed(', "advice": tru, "summary": "hello"')
+    [('summary', 'hello')]
+    >>> parser.feed(', "personality_analysis": "p"}')
+    [('personality_analysis', 'p')]
+    >>> parser.skipped, parser.complete
+    (['advice'], True)
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._state = _BEFORE_OBJECT
+        self._in_string = False
+        self._escape = False
+        self._start = None
+        self._key = None
+        self.result = {}
+        # 값이 올바른 JSON이 아니어서 건너뛴 키
+        self.skipped = []
+
+    @property
+    def complete(self) -> bool:
+        """최상위 객체가 닫혔는지 여부"""
+        return self._state == _DONE
+
+    def feed(self, chunk: str) -> list:
+        """
+        텍스트 조각을 추가합니다.
+
+        Returns:
+            이번 조각으로 값이 완성된 (키, 값) 목록 (깨진 값은 빠짐)
+        """
+        self._text += chunk
+        completed = []
+        text = self._text
+
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+
+            if self._state == _DONE:
+                break
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._state == _KEY:
+                        self._key = json.loads(text[self._start:i + 1])
+                        self._state = _COLON
+                    elif self._depth == 1 and self._state == _VALUE:
+                        self._emit(text[self._start:i + 1], completed)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._state in (_KEY, _VALUE_START):
+                    self._start = i
+                    if self._state == _VALUE_START:
+                        self._state = _VALUE
+            elif ch in "{[":
+                if self._depth == 0:
+                    self._state = _KEY
+                elif self._depth == 1 and self._state == _VALUE_START:
+                    self._start = i
+                    self._state = _VALUE
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._state == _VALUE:
+                    self._emit(text[self._start:i + 1], completed)
+                elif self._depth == 0:
+                    if self._state == _VALUE:
+                        # 닫는 괄호 직전의 숫자/불리언/null 값
+                        self._emit(text[self._start:i], completed)
+                    self._state = _DONE
+            elif self._depth == 1:
+                if ch == ":" and self._state == _COLON:
+                    self._state = _VALUE_START
+                elif ch == ",":
+                    if self._state == _VALUE:
+                        self._emit(text[self._start:i], completed)
+                    self._state = _KEY
+                elif not ch.isspace() and self._state == _VALUE_START:
+                    self._start = i
+                    self._state = _VALUE
+
+        self._pos = len(text)
+        return completed
+
+    def _emit(self, raw: str, completed: list) -> None:
+        """완성된 값을 읽어 completed에 추가합니다. 깨진 값이면 건너뛰고 다음 필드로 넘어갑니다."""
+        try:
+            value = json.loads(raw.strip())
+        except json.JSONDecodeError:
+            self.skipped.append(self._key)
+        else:
+            self.result[self._key] = value
+            completed.append((self._key, value))
+        self._key = None
+        self._start = None
+        self._state = _COMMA
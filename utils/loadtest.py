@@ -0,0 +1,377 @@
+"""
+동시 사용자 부하 테스트
+가상 사용자 N명이 Streamlit AppTest로 전체 흐름(손님 맞이 → M턴 대화 → 상담 종료 및 해석 → 기록 보기)을
+사용자마다 별도 프로세스에서 동시에 진행하고, 단계별 p50/p95/p99 응답 시간, 처리량, 전체 프로세스 CPU/RSS를 보고합니다.
+OpenAI/Supabase 대신 utils.fakes 의 로컬 대체 클라이언트를 사용하므로 외부 요청이 없습니다.
+
+실행:
+    python -m utils.loadtest --users 1,4,8 --turns 3 --llm-latency 0.5
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import threading
+from collections import defaultdict
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+STEPS = ("load", "greet", "chat", "end", "analysis", "history")
+
+def _configure_environment(workdir: str) -> None:
+    # 앱 모듈을 불러오기 전에 설정해야 합니다
+    os.environ.setdefault("OPENAI_API_KEY", "loadtest")
+    os.environ["REALTIME_ENABLED"] = "0"
+    os.environ["ANALYSIS_WORKER_MODE"] = "external"
+    os.environ["ANALYSIS_JOB_STORE"] = f"sqlite:///{os.path.join(workdir, 'jobs.db')}"
+    os.environ["REPLICA_PATH"] = os.path.join(workdir, "replica.db")
+
+class ResourceSampler:
+    """이 프로세스와 가상 사용자 프로세스들의 CPU 사용률과 RSS(메모리) 합계를 주기적으로 기록합니다."""
+
+    def __init__(self, interval: float = 0.5, pids: list = ()):
+        self.interval = interval
+        self.pids = list(pids)
+        self.rss_samples = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self._cpu_started = None
+
+    @staticmethod
+    def _cpu_seconds() -> float:
+        # 끝나고 회수한(join) 자식 프로세스의 CPU 시간도 포함됩니다
+        times = os.times()
+        return times.user + times.system + times.children_user + times.children_system
+
+    @staticmethod
+    def rss_mb(pid="self") -> float:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            if pid != "self":
+                return 0.0
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def _total_rss_mb(self) -> float:
+        return self.rss_mb() + sum(self.rss_mb(pid) for pid in self.pids)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.rss_samples.append(self._total_rss_mb())
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._cpu_started = self._cpu_seconds()
+        self.rss_samples = [self._total_rss_mb()]
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.wall_seconds = time.perf_counter() - self._started
+        self.cpu_percent = (self._cpu_seconds() - self._cpu_started) / self.wall_seconds * 100
+
+class SimulatedUser:
+    """가상 사용자 한 명의 전체 상담 흐름"""
+
+    def __init__(self, index: int, turns: int, timeout: float, timings: dict, errors: dict, lock):
+        self.index = index
+        self.turns = turns
+        self.timeout = timeout
+        self.timings = timings
+        self.errors = errors
+        self.lock = lock
+        self.completed = False
+
+    def _step(self, name: str, action) -> bool:
+        started = time.perf_counter()
+        try:
+            ok = action()
+        except Exception as e:
+            print(f"❌ 사용자 {self.index} {name} 실패: {str(e)}")
+            ok = False
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.timings[name].append(elapsed)
+            if not ok:
+                self.errors[name] += 1
+        return ok
+
+    def _run(self, at) -> bool:
+        """
+        스크립트를 실행합니다. 드물게 AppTest가 빈 화면을 돌려주면 (사이드바 버튼조차 없는 경우)
+        한 번 더 실행하고 그 횟수를 harness_reruns 로 보고합니다.
+
+        Returns:
+            테스트 도구 쪽 재실행이 있었는지 여부 (재실행에서는 누른 버튼과 입력값이 사라집니다)
+        """
+        at.run()
+        if not at.exception and len(at.button) == 0:
+            with self.lock:
+                self.errors["harness_reruns"] += 1
+            at.run()
+            return True
+        return False
+
+    def _click(self, at, label: str, done) -> None:
+        """
+        버튼을 누릅니다. 테스트 도구 쪽 재실행으로 클릭이 사라졌으면 (done()이 아직 거짓이면) 한 번 더 누릅니다.
+        """
+        if len(at.button) == 0:
+            self._run(at)
+        for _ in range(2):
+            button = next((button for button in at.button if button.label == label), None)
+            if button is None:
+                raise RuntimeError(f"버튼을 찾을 수 없습니다: {label}")
+            button.click()
+            if not self._run(at) or at.exception or done():
+                return
+
+    def run(self) -> None:
+        from streamlit.testing.v1 import AppTest
+
+        at = AppTest.from_file(APP_PATH, default_timeout=self.timeout)
+
+        def load():
+            self._run(at)
+            return not at.exception
+
+        def greeted():
+            return at.session_state.character is not None
+
+        def greet():
+            self._click(at, "손님 맞이하기", greeted)
+            return not at.exception and greeted()
+
+        def chat(turn):
+            def answered():
+                return len(at.session_state.messages) > sent_before and at.session_state.messages[-1]["role"] == "assistant"
+
+            def send():
+                nonlocal sent_before
+                sent_before = len(at.session_state.messages)
+                for attempt in range(2):
+                    at.chat_input[0].set_value(f"요즘 어떠세요? ({turn + 1})")
+                    self._run(at)
+                    if at.exception or answered() or len(at.session_state.messages) > sent_before:
+                        break
+                    # 입력값이 앱에 닿기 전에 재실행(테스트 도구 또는 앱의 st.rerun)에 묻혔으면 다시 보냅니다
+                    if attempt == 0:
+                        with self.lock:
+                            self.errors["harness_reruns"] += 1
+                return not at.exception and answered()
+
+            sent_before = 0
+            return send
+
+        def ended():
+            return at.session_state.consultation_ended
+
+        def end():
+            self._click(at, "🔮 상담 종료 및 사주 결과 보기", ended)
+            return not at.exception and ended()
+
+        def analysis():
+            # 화면의 분석 진행 표시가 결과를 받을 때까지 다시 그립니다
+            deadline = time.perf_counter() + self.timeout
+            while time.perf_counter() < deadline:
+                if at.session_state.fortune_result:
+                    return True
+                time.sleep(0.2)
+                self._run(at)
+            return False
+
+        def in_history():
+            return at.session_state.view_mode == "history"
+
+        def history():
+            self._click(at, "📅 상담 기록 보기", in_history)
+            return not at.exception and in_history()
+
+        if not self._step("load", load) or not self._step("greet", greet):
+            return
+        for turn in range(self.turns):
+            if not self._step("chat", chat(turn)):
+                return
+        if not self._step("end", end) or not self._step("analysis", analysis):
+            return
+        self.completed = self._step("history", history)
+
+def _user_process(index: int, turns: int, timeout: float, fake_settings: dict, ready, go, results) -> None:
+    """
+    가상 사용자 한 명을 자기 프로세스에서 실행합니다. (AppTest는 프로세스 전역 Runtime을 쓰므로 사용자끼리 섞이지 않게)
+    준비(모듈 로드, 대체 클라이언트 설치)를 마치면 ready에 알리고, go가 켜지면 동시에 시작합니다.
+    """
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    from utils import fakes
+    from utils.admission import get_admission_stats
+    from streamlit.testing.v1 import AppTest  # noqa: F401 (시작 신호 전에 불러 둡니다)
+
+    fakes.install(**fake_settings)
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    user = SimulatedUser(index, turns, timeout, timings, errors, threading.Lock())
+    ready.put(index)
+    go.wait()
+    try:
+        user.run()
+    finally:
+        results.put({
+            "index": index,
+            "completed": user.completed,
+            "timings": dict(timings),
+            "errors": dict(errors),
+            "admission": get_admission_stats(),
+        })
+
+def _admission_delta(before: dict, after: dict) -> dict:
+    # 누적 카운터는 늘어난 만큼만, 현재 상태 값은 그대로 보고합니다
+    return {
+        key: value - before.get(key, 0) if key.endswith("_total") or key.startswith("rejected_") else value
+        for key, value in after.items()
+    }
+
+def run_level(users: int, turns: int, timeout: float, fake_settings: dict) -> dict:
+    """
+    가상 사용자 users명을 사용자마다 별도 프로세스로 동시에 실행합니다.
+    사용자 프로세스는 각자 대체 클라이언트와 수락 제어기를 갖고 (앱 서버 여러 대처럼),
+    사주 해석 작업 큐(SQLite)와 워커는 이 프로세스의 것을 함께 씁니다.
+
+    Returns:
+        {"users", "completed", "wall_seconds", "throughput", "cpu_percent", "rss_mb_max", "steps": {...}, "admission": {...}}
+    """
+    import multiprocessing
+    from queue import Empty
+    from utils import metrics
+    from utils.admission import get_admission_stats
+
+    context = multiprocessing.get_context("spawn")
+    ready, results, go = context.Queue(), context.Queue(), context.Event()
+    processes = [
+        context.Process(target=_user_process, args=(i, turns, timeout, fake_settings, ready, go, results),
+                        name=f"user-{i}", daemon=True)
+        for i in range(users)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get(timeout=timeout)
+
+    admission_before = get_admission_stats()
+    reports = []
+    with ResourceSampler(pids=[process.pid for process in processes]) as sampler:
+        go.set()
+        deadline = time.monotonic() + timeout * (turns + 5)
+        while len(reports) < users and time.monotonic() < deadline:
+            try:
+                reports.append(results.get(timeout=1.0))
+            except Empty:
+                if not any(process.is_alive() for process in processes) and results.empty():
+                    break
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    # 워커(이 프로세스)와 사용자 프로세스들의 수락 제어 통계를 합칩니다
+    admission = _admission_delta(admission_before, get_admission_stats())
+    for report in reports:
+        for step, values in report["timings"].items():
+            timings[step] += values
+        for step, count in report["errors"].items():
+            errors[step] += count
+        for key, value in _admission_delta({}, report["admission"]).items():
+            admission[key] = admission.get(key, 0) + value
+
+    completed = sum(report["completed"] for report in reports)
+    return {
+        "users": users,
+        "completed": completed,
+        "wall_seconds": sampler.wall_seconds,
+        "throughput": completed / sampler.wall_seconds if sampler.wall_seconds else 0.0,
+        "cpu_percent": sampler.cpu_percent,
+        "rss_mb_max": max(sampler.rss_samples),
+        "steps": {
+            step: {
+                "count": len(timings[step]),
+                "errors": errors[step],
+                "p50": metrics.percentile(timings[step], 50),
+                "p95": metrics.percentile(timings[step], 95),
+                "p99": metrics.percentile(timings[step], 99),
+            }
+            for step in STEPS if timings[step]
+        },
+        "harness_reruns": errors["harness_reruns"],
+        "admission": admission,
+    }
+
+def print_report(report: dict) -> None:
+    admission = report["admission"]
+    rejected = admission["rejected_rate_limited"] + admission["rejected_queue_full"] + admission["rejected_timeout"]
+    print(f"\n👥 동시 사용자 {report['users']}명: 완료 {report['completed']}/{report['users']}, "
+          f"소요 {report['wall_seconds']:.1f}s, 처리량 {report['throughput'] * 60:.1f} 상담/분")
+    print(f"   CPU {report['cpu_percent']:.0f}% · RSS 최대 {report['rss_mb_max']:.0f} MB · "
+          f"누적 LLM 대기 {admission['queued_total']}건 · 거절 {rejected}건 · 테스트 재실행 {report['harness_reruns']}회")
+    print(f"   {'단계':<10}{'횟수':>6}{'오류':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for step, stats in report["steps"].items():
+        print(f"   {step:<10}{stats['count']:>6}{stats['errors']:>6}"
+              f"{stats['p50'] * 1000:>10.0f}{stats['p95'] * 1000:>10.0f}{stats['p99'] * 1000:>10.0f}")
+
+def main(argv: list = None) -> list:
+    parser = argparse.ArgumentParser(description="사담 동시 사용자 부하 테스트")
+    parser.add_argument("--users", default="1,4,8", help="동시 사용자 수 목록 (쉼표 구분)")
+    parser.add_argument("--turns", type=int, default=3, help="사용자당 대화 턴 수")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="OpenAI 호출 1회당 지연(초)")
+    parser.add_argument("--image-latency", type=float, default=2.0, help="이미지 생성 1회당 지연(초)")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="Supabase 질의 1회당 지연(초)")
+    parser.add_argument("--workers", type=int, default=2, help="사주 해석 워커 스레드 수")
+    parser.add_argument("--timeout", type=float, default=120, help="단계별 제한 시간(초)")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="sadam-loadtest-")
+    _configure_environment(workdir)
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+
+    from utils import fakes
+    from utils.job_queue import run_worker
+
+    fake_settings = {"llm_latency": args.llm_latency, "image_latency": args.image_latency, "db_latency": args.db_latency}
+    fakes.install(**fake_settings)
+
+    stop = threading.Event()
+    for i in range(args.workers):
+        threading.Thread(
+            target=run_worker,
+            kwargs={"worker_id": f"loadtest-{i}", "poll_interval": 0.2, "stop_event": stop},
+            daemon=True
+        ).start()
+
+    reports = []
+    try:
+        for users in [int(n) for n in args.users.split(",") if n.strip()]:
+            report = run_level(users, args.turns, args.timeout, fake_settings)
+            reports.append(report)
+            if not args.json:
+                print_report(report)
+    finally:
+        stop.set()
+
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+    return reports
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+프로세스 단위 성능 지표 수집 모듈
+카운터와 소요 시간 관측값을 스레드 안전하게 모읍니다.
+"""
+
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_observations = defaultdict(list)
+
+# 관측값은 지표별로 최근 값만 유지합니다 (메모리 상한)
+MAX_OBSERVATIONS = 1000
+
+def incr(name: str, value: float = 1) -> None:
+    """카운터 값을 증가시킵니다."""
+    with _lock:
+        _counters[name] += value
+
+def observe(name: str, value: float) -> None:
+    """관측값(소요 시간, 바이트 수 등)을 기록합니다."""
+    with _lock:
+        values = _observations[name]
+        values.append(value)
+        if len(values) > MAX_OBSERVATIONS:
+            del values[:len(values) - MAX_OBSERVATIONS]
+
+def get_counter(name: str) -> float:
+    """카운터의 현재 값을 반환합니다."""
+    with _lock:
+        return _counters.get(name, 0)
+
+def percentile(values: list, pct: float) -> float:
+    """정렬되지 않은 값 목록에서 백분위 값을 계산합니다."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+def snapshot(prefix: str = "") -> dict:
+    """
+    현재 지표의 스냅샷을 반환합니다.
+
+    Args:
+        prefix: 이 접두사로 시작하는 지표만 포함 (기본값: 전체)
+
+    Returns:
+        {"counters": {...}, "observations": {이름: {count, avg, p50, p95, max}}}
+    """
+    with _lock:
+        counters = {k: v for k, v in _counters.items() if k.startswith(prefix)}
+        observations = {k: list(v) for k, v in _observations.items() if k.startswith(prefix)}
+
+    summary = {}
+    for name, values in observations.items():
+        summary[name] = {
+            "count": len(values),
+            "avg": sum(values) / len(values) if values else 0.0,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "max": max(values) if values else 0.0,
+        }
+    return {"counters": counters, "observations": summary}
+
+def reset() -> None:
+    """모든 지표를 초기화합니다."""
+    with _lock:
+        _counters.clear()
+        _observations.clear()
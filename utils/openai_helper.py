@@ -4,27 +4,189 @@ OpenAI API 연동 모듈
 
 import os
 import json
-import requests
-from openai import OpenAI
-from dotenv import load_dotenv
+import time
+import threading
+
+from utils import metrics, traffic
+from utils.http_client import get_http_client, timeout_for
+from utils.config import load_env
+from utils.json_stream import IncrementalJSONParser
+from utils.prompts import FORTUNE_SECTIONS, chat_messages, fortune_messages, refine_messages, section_messages
+from utils.admission import (
+    AdmissionRejected, get_admission_controller,
+    COST_CHAT, COST_ANALYSIS, COST_PROFILE, COST_IMAGE
+)
 
 # Load environment variables
-load_dotenv()
+load_env()
+
+# OpenAI 클라이언트는 처음 필요할 때 만듭니다 (openai 패키지 import 비용도 그때 냅니다)
+_client = None
+_client_lock = threading.Lock()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def get_openai_client():
+    """OpenAI 클라이언트를 반환합니다. 프로세스당 한 번만 만들고 재사용합니다."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                # 이미지 다운로드와 같은 연결 풀(keep-alive, HTTP/2)을 씁니다
+                _client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    http_client=get_http_client(),
+                    timeout=timeout_for("default"),
+                )
+    # 트래픽 기록 모드(TRAFFIC_RECORD)에서는 호출을 기록하는 대리 객체를 돌려줍니다
+    return traffic.wrap_openai(_client)
 
 # Get GPT model from environment variable
 GPT_MODEL = os.getenv("GPT_MODEL", "gpt-4o-mini")
 
+def _total_tokens(usage) -> int:
+    return getattr(usage, "total_tokens", 0) or 0
+
+# 스레드마다 마지막 helper 호출의 토큰 사용량과 지연 시간 (get_last_usage)
+_meter = threading.local()
+
+def _start_metering() -> None:
+    """helper 호출을 시작할 때 이 스레드의 사용량 기록을 비웁니다."""
+    _meter.usage = {
+        "model": GPT_MODEL, "prompt_tokens": 0, "completion_tokens": 0,
+        "cached_tokens": 0, "latency_ms": 0, "requests": 0,
+    }
+
+def _record_usage(kind: str, usage, started: float = None, model: str = None, finished: float = None) -> None:
+    """
+    요청 한 번의 토큰 사용량과 지연 시간을 지표와 이 스레드의 사용량 기록에 더합니다.
+
+    Args:
+        kind: 지표 이름에 쓰는 요청 종류 ("profile", "chat", "fortune", "refine")
+        usage: 응답의 usage 객체 (없으면 토큰 수는 0으로 봅니다)
+        started: 요청을 보낸 시각 (time.perf_counter 기준)
+        model: 응답에 적힌 모델 이름
+        finished: 응답을 받은 시각 (기본값: 지금. 다른 스레드에서 받은 응답을 나중에 기록할 때)
+    """
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+    latency = (finished or time.perf_counter()) - started if started is not None else 0.0
+
+    # 누적 토큰 사용량 (배치 작업의 비용 계산용)
+    metrics.incr(f"llm.{kind}.prompt_tokens", prompt_tokens)
+    metrics.incr(f"llm.{kind}.completion_tokens", completion_tokens)
+    metrics.incr(f"llm.{kind}.cached_tokens", cached_tokens)
+    if started is not None:
+        metrics.observe(f"llm.{kind}.latency_seconds", latency)
+
+    meter = getattr(_meter, "usage", None)
+    if meter is not None:
+        meter["model"] = model or meter["model"]
+        meter["prompt_tokens"] += prompt_tokens
+        meter["completion_tokens"] += completion_tokens
+        meter["cached_tokens"] += cached_tokens
+        meter["latency_ms"] += round(latency * 1000)
+        meter["requests"] += 1
+
+def get_last_usage() -> dict:
+    """
+    현재 스레드에서 마지막으로 호출한 helper의 토큰 사용량과 지연 시간을 반환합니다.
+    빠진 항목을 다시 요청한 경우 그 요청까지 합친 값입니다.
+
+    Returns:
+        {"model", "prompt_tokens", "completion_tokens", "cached_tokens", "latency_ms", "requests"}
+        (이 스레드에서 helper를 호출한 적이 없으면 None)
+    """
+    usage = getattr(_meter, "usage", None)
+    return dict(usage) if usage else None
+
+def _reask_missing(kind: str, messages: list, partial: dict, missing: list, max_tokens: int,
+                   user_id: str, on_wait=None):
+    """
+    빠졌거나 고칠 수 없었던 항목만 다시 요청합니다. (전체를 다시 생성하지 않습니다)
+    사용량은 kind 이름으로 기록합니다.
+
+    Returns:
+        OpenAI 응답 객체
+    """
+    reask = f"""앞서 작성한 JSON 응답에서 다음 항목이 빠졌거나 형식이 잘못되었습니다: {", ".join(missing)}
+
+<이미 작성된 항목>
+{json.dumps(partial, ensure_ascii=False)}
+
+이미 작성된 항목과 어울리도록 위 항목만 JSON 형식으로 작성하세요. 다른 항목은 넣지 마세요."""
+
+    with get_admission_controller().slot(user_id, cost=COST_CHAT, on_wait=on_wait):
+        started = time.perf_counter()
+        reply = get_openai_client().chat.completions.create(
+            model=GPT_MODEL,
+            timeout=timeout_for("chat"),
+            messages=messages + [{"role": "user", "content": reask}],
+            temperature=0.7,
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"}
+        )
+    _record_usage(kind, reply.usage, started, getattr(reply, "model", None))
+    return reply
+
+def _record_tokens_saved(kind: str, tokens: int) -> None:
+    metrics.observe(f"structured.{kind}.tokens_saved", tokens)
+    metrics.incr(f"structured.{kind}.tokens_saved_total", tokens)
+
+def _validated(kind: str, model_cls, text: str, full_tokens: int, reask) -> dict:
+    """
+    응답을 검증하고 고칩니다. 로컬에서 고칠 수 없는 항목은 reask(partial, missing)로 그 항목만 다시 받습니다.
+
+    Args:
+        kind: 지표 이름에 쓰는 응답 종류 ("profile", "fortune")
+        model_cls: 검증할 pydantic 모델
+        text: 응답 텍스트
+        full_tokens: 응답 전체를 다시 생성할 때 드는 토큰 수 (절약량 계산용)
+        reask: (이미 작성된 항목, 빠진 항목 목록) -> (응답 텍스트, 사용 토큰 수)
+
+    Returns:
+        검증된 딕셔너리 (빠진 항목을 끝내 채우지 못하면 None)
+    """
+    from utils.schemas import parse_structured
+
+    metrics.incr(f"structured.{kind}.responses")
+    instance, repaired = parse_structured(model_cls, text)
+    missing = instance.missing_fields()
+    
+    if not missing:
+        if repaired:
+            # 로컬 수리로 전체 재생성을 피했습니다
+            metrics.incr(f"structured.{kind}.repaired")
+            _record_tokens_saved(kind, full_tokens)
+        else:
+            metrics.incr(f"structured.{kind}.valid")
+        return instance.to_dict()
+    
+    print(f"⚠️ 응답 항목 누락, 해당 항목만 다시 요청합니다: {', '.join(missing)}")
+    metrics.incr(f"structured.{kind}.reask")
+    partial = instance.to_dict()
+    reask_text, reask_tokens = reask(partial, missing)
+    filled, _ = parse_structured(model_cls, reask_text)
+    instance = model_cls.model_validate({**filled.to_dict(), **partial})
+    
+    if instance.missing_fields():
+        # 사용자가 처음부터 다시 생성해야 하는 경우
+        metrics.incr(f"structured.{kind}.failed")
+        print(f"❌ 응답 항목을 채우지 못했습니다: {', '.join(instance.missing_fields())}")
+        return None
+    
+    _record_tokens_saved(kind, max(full_tokens - reask_tokens, 0))
+    return instance.to_dict()
+
 def test_openai_connection():
     """OpenAI API 연결을 테스트합니다."""
     try:
         print("🔄 OpenAI API 연결 테스트 중...")
         
         # Test with a simple completion
-        response = client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model=GPT_MODEL,
+            timeout=timeout_for("chat"),
             messages=[
                 {"role": "system", "content": "You are a helpful assistant."},
                 {"role": "user", "content": "안녕하세요. 간단히 인사해주세요."}
@@ -41,12 +203,9 @@ def test_openai_connection():
         print(f"❌ OpenAI API 연결 실패: {str(e)}")
         return False
 
-def generate_character_profile():
-    """가상 인물 프로필을 생성합니다. 딕셔너리 형태로 반환합니다."""
-    try:
-        prompt = """당신은 사주 상담소를 방문한 가상의 인물을 생성하는 전문가입니다.
-다음 요소를 포함한 인물을 생성해주세요:
-- name: 이름 (한국 이름)
+PROFILE_SYSTEM_PROMPT = "You are a creative character designer. Always respond with valid JSON only."
+
+PROFILE_FIELDS = """- name: 이름 (한국 이름)
 - age: 나이 (20-60세 사이의 숫자)
 - gender: 성별 ("남성" 또는 "여성")
 - occupation: 직업
@@ -54,73 +213,202 @@ def generate_character_profile():
 - concern: 현재 고민이나 상황 (구체적으로)
 - birth_date: 생년월일 (YYYY-MM-DD 형식)
 - birth_time: 출생 시간 (HH:MM 형식)
-- speaking_style: 말투 특징
+- speaking_style: 말투 특징"""
+
+# 한 번의 요청으로 만들 수 있는 최대 인물 수
+PROFILE_BATCH_MAX = 10
+# 인물 한 명에 배정하는 응답 토큰 수 (단건 요청은 500토큰이지만 실제 응답은 200토큰 안팎입니다)
+PROFILE_BATCH_TOKENS_PER_CHARACTER = 250
+# 검증을 통과하지 못한 인물을 채우기 위한 추가 요청 횟수
+PROFILE_BATCH_RETRIES = 1
+
+def generate_character_profile(user_id: str = "anonymous", on_wait=None):
+    """
+    가상 인물 프로필을 생성합니다. 딕셔너리 형태로 반환합니다.
+
+    Args:
+        user_id: 요청 수락 제어에 사용할 사용자 식별자
+        on_wait: 대기열에서 기다리는 동안 대기 순번을 받는 콜백
+
+    Raises:
+        AdmissionRejected: 요청이 수락되지 않은 경우
+    """
+    from utils.schemas import CharacterProfile
+
+    try:
+        prompt = f"""당신은 사주 상담소를 방문한 가상의 인물을 생성하는 전문가입니다.
+다음 요소를 포함한 인물을 생성해주세요:
+{PROFILE_FIELDS}
 
 반드시 유효한 JSON 형식으로만 응답하세요. 추가 설명 없이 JSON만 반환하세요."""
 
-        response = client.chat.completions.create(
-            model=GPT_MODEL,
-            messages=[
-                {"role": "system", "content": "You are a creative character designer. Always respond with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.8,
-            max_tokens=500,
-            response_format={"type": "json_object"}
-        )
-        
-        result_text = response.choices[0].message.content
+        messages = [
+            {"role": "system", "content": PROFILE_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+        _start_metering()
+        with get_admission_controller().slot(user_id, cost=COST_PROFILE, on_wait=on_wait):
+            started = time.perf_counter()
+            response = get_openai_client().chat.completions.create(
+                model=GPT_MODEL,
+                timeout=timeout_for("profile"),
+                messages=messages,
+                temperature=0.8,
+                max_tokens=500,
+                response_format={"type": "json_object"}
+            )
+        _record_usage("profile", response.usage, started, getattr(response, "model", None))
         
-        # JSON 파싱
-        character_data = json.loads(result_text)
+        def reask(partial, missing):
+            reply = _reask_missing("profile", messages, partial, missing, 200, user_id, on_wait)
+            return reply.choices[0].message.content, _total_tokens(reply.usage)
         
-        return character_data
+        # JSON 검증 (빠진 항목만 다시 요청)
+        return _validated(
+            "profile", CharacterProfile, response.choices[0].message.content,
+            _total_tokens(response.usage), reask
+        )
         
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON 파싱 실패: {str(e)}")
-        return None
+    except AdmissionRejected:
+        raise
     except Exception as e:
         print(f"❌ 인물 프로필 생성 실패: {str(e)}")
         return None
 
-def chat_with_character(character_context: str, user_message: str, conversation_history: list = None):
-    """인물과 대화를 진행합니다."""
+def _profile_key(profile: dict) -> tuple:
+    return (profile["name"].replace(" ", ""), profile["concern"].replace(" ", ""))
+
+def generate_character_profiles(n: int, user_id: str = "anonymous", on_wait=None) -> list:
+    """
+    서로 다른 가상 인물 프로필 n개를 한 번의 요청(JSON 배열 응답)으로 생성합니다.
+    검증을 통과하지 못했거나 앞의 인물과 이름/고민이 겹치는 인물은 버리고, 모자란 만큼만 다시 요청합니다.
+
+    Args:
+        n: 생성할 인물 수 (최대 PROFILE_BATCH_MAX)
+        user_id: 요청 수락 제어에 사용할 사용자 식별자
+        on_wait: 대기열에서 기다리는 동안 대기 순번을 받는 콜백
+
+    Returns:
+        인물 프로필 딕셔너리 리스트 (실패하면 n개보다 적을 수 있음)
+
+    Raises:
+        AdmissionRejected: 요청이 수락되지 않은 경우
+    """
+    from utils.schemas import CharacterProfile, parse_structured_list
+
+    n = max(1, min(n, PROFILE_BATCH_MAX))
+    profiles = []
+    seen_names, seen_concerns = set(), set()
+
+    _start_metering()
     try:
-        if conversation_history is None:
-            conversation_history = []
-        
-        messages = [
-            {"role": "system", "content": f"당신은 다음과 같은 인물입니다:\n{character_context}\n\n사주를 보러 온 손님으로서 자연스럽게 대화하세요."}
-        ]
-        
-        # Add conversation history
-        messages.extend(conversation_history)
-        
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
+        for _ in range(1 + PROFILE_BATCH_RETRIES):
+            remaining = n - len(profiles)
+            if remaining <= 0:
+                break
+            avoid = f"\n다음 이름은 이미 사용했으니 피해주세요: {', '.join(p['name'] for p in profiles)}\n" if profiles else ""
+            prompt = f"""당신은 사주 상담소를 방문한 가상의 인물을 생성하는 전문가입니다.
+서로 다른 인물 {remaining}명을 생성해주세요. 각 인물은 다음 요소를 포함합니다:
+{PROFILE_FIELDS}
+
+인물끼리 이름, 나이대, 성별, 직업, 고민이 겹치지 않도록 다양하게 만들어주세요.{avoid}
+반드시 {{"characters": [인물, ...]}} 형식의 유효한 JSON으로만 응답하세요. 추가 설명 없이 JSON만 반환하세요."""
+
+            with get_admission_controller().slot(user_id, cost=COST_PROFILE, on_wait=on_wait):
+                started = time.perf_counter()
+                response = get_openai_client().chat.completions.create(
+                    model=GPT_MODEL,
+                    timeout=timeout_for("profile"),
+                    messages=[
+                        {"role": "system", "content": PROFILE_SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.9,
+                    max_tokens=100 + PROFILE_BATCH_TOKENS_PER_CHARACTER * remaining,
+                    response_format={"type": "json_object"}
+                )
+            _record_usage("profile", response.usage, started, getattr(response, "model", None))
+
+            instances, received = parse_structured_list(CharacterProfile, response.choices[0].message.content, "characters")
+            metrics.incr("structured.profile_batch.requests")
+            metrics.incr("structured.profile_batch.received", received)
+            for instance in instances:
+                profile = instance.to_dict()
+                name, concern = _profile_key(profile)
+                if name in seen_names or concern in seen_concerns:
+                    metrics.incr("structured.profile_batch.duplicates")
+                    continue
+                seen_names.add(name)
+                seen_concerns.add(concern)
+                profiles.append(profile)
+                if len(profiles) == n:
+                    break
+
+        metrics.incr("structured.profile_batch.characters", len(profiles))
+        if len(profiles) < n:
+            print(f"⚠️ 인물 {n}명 중 {len(profiles)}명만 생성했습니다")
+        else:
+            print(f"✅ 인물 {n}명 일괄 생성 완료")
+        return profiles
+
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        print(f"❌ 인물 일괄 생성 실패: {str(e)}")
+        return profiles
+
+def chat_with_character(character_data: dict, user_message: str, conversation_history: list = None,
+                        user_id: str = "anonymous", on_wait=None):
+    """
+    인물과 대화를 진행합니다.
+
+    Args:
+        character_data: 인물 프로필 딕셔너리
+        user_message: 이번에 보낸 메시지
+        conversation_history: 이전 대화 (prompts.chat_history() 형식)
+
+    Raises:
+        AdmissionRejected: 요청이 수락되지 않은 경우
+    """
+    try:
+        # 지시문 → 인물 정보 → 대화 순으로 조립해 같은 상담의 요청끼리 앞부분이 같게 합니다
+        messages = chat_messages(character_data, conversation_history or [], user_message)
         
-        response = client.chat.completions.create(
-            model=GPT_MODEL,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=200
-        )
+        _start_metering()
+        with get_admission_controller().slot(user_id, cost=COST_CHAT, on_wait=on_wait):
+            started = time.perf_counter()
+            response = get_openai_client().chat.completions.create(
+                model=GPT_MODEL,
+                timeout=timeout_for("chat"),
+                messages=messages,
+                temperature=0.7,
+                max_tokens=200
+            )
+        _record_usage("chat", response.usage, started, getattr(response, "model", None))
         
         return response.choices[0].message.content
         
+    except AdmissionRejected:
+        raise
     except Exception as e:
         print(f"❌ 대화 생성 실패: {str(e)}")
         return None
 
-def generate_character_image(character_data: dict) -> str:
+def generate_character_image(character_data: dict, user_id: str = "anonymous", on_wait=None) -> str:
     """
     DALL-E를 사용하여 인물 이미지를 생성합니다.
     
     Args:
         character_data: 인물 프로필 딕셔너리
+        user_id: 요청 수락 제어에 사용할 사용자 식별자
+        on_wait: 대기열에서 기다리는 동안 대기 순번을 받는 콜백
         
     Returns:
         생성된 이미지 URL (또는 None)
+
+    Raises:
+        AdmissionRejected: 요청이 수락되지 않은 경우
     """
     try:
         if not character_data:
@@ -138,13 +426,15 @@ dignified and calm expression, high quality, detailed facial features"""
         
         print(f"🎨 이미지 생성 중... (프롬프트: {prompt[:50]}...)")
         
-        response = client.images.generate(
-            model="dall-e-3",
-            prompt=prompt,
-            size="1024x1024",
-            quality="standard",
-            n=1
-        )
+        with get_admission_controller().slot(user_id, cost=COST_IMAGE, on_wait=on_wait):
+            response = get_openai_client().images.generate(
+                model="dall-e-3",
+                timeout=timeout_for("image"),
+                prompt=prompt,
+                size="1024x1024",
+                quality="standard",
+                n=1
+            )
         
         if response and response.data and len(response.data) > 0:
             image_url = response.data[0].url
@@ -154,6 +444,8 @@ dignified and calm expression, high quality, detailed facial features"""
             print("❌ 이미지 생성 응답이 비어있습니다.")
             return None
         
+    except AdmissionRejected:
+        raise
     except Exception as e:
         print(f"❌ 이미지 생성 실패: {str(e)}")
         import traceback
@@ -176,7 +468,7 @@ def download_image(image_url: str) -> bytes:
             return None
             
         print(f"🔄 이미지 다운로드 중: {image_url[:50]}...")
-        response = requests.get(image_url, timeout=30)
+        response = get_http_client().get(image_url, timeout=timeout_for("download"))
         response.raise_for_status()
         print(f"✅ 이미지 다운로드 완료 ({len(response.content)} bytes)")
         return response.content
@@ -186,74 +478,359 @@ def download_image(image_url: str) -> bytes:
         traceback.print_exc()
         return None
 
-def analyze_fortune(character_data: dict, conversation_history: list):
+# 사주 해석에서 빠진 항목만 다시 요청할 때의 최대 토큰 수
+FORTUNE_REASK_MAX_TOKENS = 600
+
+def analyze_fortune(character_data: dict, conversation_history: list, user_id: str = "anonymous", on_wait=None):
     """
     대화 내용을 분석하여 사주를 해석합니다.
     
     Args:
         character_data: 인물 프로필 딕셔너리
         conversation_history: 대화 기록 리스트 (각 항목은 {"speaker": "user"/"ai", "message": "..."} 형식)
+        user_id: 요청 수락 제어에 사용할 사용자 식별자
+        on_wait: 대기열에서 기다리는 동안 대기 순번을 받는 콜백
     
     Returns:
         사주 해석 결과 딕셔너리 (fortune_analysis, personality_analysis, advice, summary)
+
+    Raises:
+        AdmissionRejected: 요청이 수락되지 않은 경우
     """
+    from utils.schemas import FortuneResult
+
     try:
-        # 대화 내용을 문자열로 변환
-        conversation_text = "\n".join([
-            f"{'손님' if msg['speaker'] == 'user' else character_data['name']}: {msg['message']}"
-            for msg in conversation_history
-        ])
+        messages = fortune_messages(character_data, conversation_history)
+
+        _start_metering()
+        with get_admission_controller().slot(user_id, cost=COST_ANALYSIS, on_wait=on_wait):
+            started = time.perf_counter()
+            response = get_openai_client().chat.completions.create(
+                model=GPT_MODEL,
+                timeout=timeout_for("analysis"),
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000,
+                response_format={"type": "json_object"}
+            )
+        _record_usage("fortune", response.usage, started, getattr(response, "model", None))
+        
+        def reask(partial, missing):
+            reply = _reask_missing("fortune", messages, partial, missing, FORTUNE_REASK_MAX_TOKENS, user_id, on_wait)
+            return reply.choices[0].message.content, _total_tokens(reply.usage)
+        
+        result_data = _validated(
+            "fortune", FortuneResult, response.choices[0].message.content,
+            _total_tokens(response.usage), reask
+        )
+        
+        if result_data:
+            print(f"✅ 사주 해석 완료")
+        return result_data
         
-        prompt = f"""당신은 전문 사주 해석가입니다.
-다음은 사주를 보러 온 손님과 나눈 대화입니다:
-
-<인물 정보>
-이름: {character_data['name']}
-나이: {character_data['age']}세
-성별: {character_data['gender']}
-직업: {character_data['occupation']}
-성격: {character_data['personality']}
-현재 고민: {character_data['concern']}
-생년월일: {character_data['birth_date']}
-출생 시간: {character_data['birth_time']}
-
-<대화 내용>
-{conversation_text}
-
-위 대화와 인물 정보를 바탕으로 사주를 해석해주세요.
-다음 내용을 포함하여 JSON 형식으로 응답하세요:
-- fortune_analysis: 전체적인 운세 (4-5문장)
-- personality_analysis: 성격 및 성향 분석 (3-4문장)
-- advice: 현재 고민에 대한 조언 (3-4문장)
-- summary: 한 줄 요약
-
-공감적이고 따뜻한 어조로, 구체적인 조언을 포함해주세요.
-전통적인 사주 해석 용어(오행, 천간지지 등)를 적절히 사용하되, 이해하기 쉽게 설명해주세요."""
-
-        response = client.chat.completions.create(
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        print(f"❌ 사주 해석 실패: {str(e)}")
+        return None
+
+def analyze_fortune_stream(character_data: dict, conversation_history: list, user_id: str = "anonymous", on_wait=None):
+    """
+    analyze_fortune 의 스트리밍 버전입니다. 응답을 스트리밍으로 받으며 항목이 완성될 때마다 돌려줍니다.
+    
+    Args:
+        character_data: 인물 프로필 딕셔너리
+        conversation_history: 대화 기록 리스트 (각 항목은 {"speaker": "user"/"ai", "message": "..."} 형식)
+        user_id: 요청 수락 제어에 사용할 사용자 식별자
+        on_wait: 대기열에서 기다리는 동안 대기 순번을 받는 콜백
+    
+    Yields:
+        (항목 이름, 내용) - 예: ("summary", "...")
+
+    Raises:
+        AdmissionRejected: 요청이 수락되지 않은 경우
+        ValueError: 빠진 항목을 다시 요청해도 채우지 못한 경우
+    """
+    from utils.schemas import FortuneResult
+
+    messages = fortune_messages(character_data, conversation_history)
+    parser = IncrementalJSONParser()
+    usage, model = None, None
+    emitted = {}
+
+    _start_metering()
+    with get_admission_controller().slot(user_id, cost=COST_ANALYSIS, on_wait=on_wait):
+        started = time.perf_counter()
+        stream = get_openai_client().chat.completions.create(
             model=GPT_MODEL,
-            messages=[
-                {"role": "system", "content": "You are a professional fortune teller specializing in Korean Saju (Four Pillars of Destiny). Always respond with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
+            timeout=timeout_for("stream"),
+            messages=messages,
             temperature=0.7,
             max_tokens=1000,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            stream=True,
+            stream_options={"include_usage": True}
         )
         
-        result_text = response.choices[0].message.content
-        result_data = json.loads(result_text)
+        for chunk in stream:
+            model = getattr(chunk, "model", None) or model
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                # 깨진 값은 파서가 건너뛰고, 끝에서 빠진 항목으로 다시 요청합니다
+                for key, value in parser.feed(delta):
+                    value = FortuneResult.model_validate({key: value}).to_dict().get(key)
+                    if key in FortuneResult.model_fields and value:
+                        emitted[key] = value
+                        yield key, value
+    # 지연 시간은 소비자가 조각을 처리하는 시간까지 포함한 스트림 전체 시간입니다
+    _record_usage("fortune", usage, started, model)
+
+    def reask(partial, missing):
+        reply = _reask_missing("fortune", messages, partial, missing, FORTUNE_REASK_MAX_TOKENS, user_id, on_wait)
+        return reply.choices[0].message.content, _total_tokens(reply.usage)
+
+    result = _validated("fortune", FortuneResult, json.dumps(emitted, ensure_ascii=False), _total_tokens(usage), reask)
+    if result is None:
+        raise ValueError("사주 해석 응답에서 빠진 항목을 채우지 못했습니다.")
+    for key, value in result.items():
+        if key not in emitted:
+            yield key, value
+    print(f"✅ 사주 해석 완료 (스트리밍)")
+
+# 항목별 동시 해석 (analyze_fortune_fanout)
+# 항목마다 따로 요청하므로 최대 토큰도 항목 분량에 맞춰 작게 잡습니다
+FANOUT_SECTION_TOKENS = {"fortune_analysis": 400, "personality_analysis": 300, "advice": 300, "summary": 100}
+# 항목 요청 하나를 기다리는 최대 시간(초). 요청이 실제로 시작된 때부터 잽니다. 넘은 항목은 빼고 나머지만 돌려줍니다.
+FANOUT_SECTION_TIMEOUT = float(os.getenv("FORTUNE_SECTION_TIMEOUT_SECONDS", "30"))
+# 수락 제어 슬롯(LLM_MAX_CONCURRENCY)마다 항목 요청 네 개가 기다리지 않고 시작할 수 있는 크기
+FANOUT_WORKERS = int(os.getenv("FORTUNE_FANOUT_WORKERS", str(4 * int(os.getenv("LLM_MAX_CONCURRENCY", "8")))))
+
+_fanout_executor = None
+_fanout_lock = threading.Lock()
+
+def _get_fanout_executor():
+    """항목별 요청을 보내는 스레드 풀을 반환합니다. (처음 필요할 때 만듦)"""
+    global _fanout_executor
+    if _fanout_executor is None:
+        with _fanout_lock:
+            if _fanout_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fortune-fanout")
+    return _fanout_executor
+
+def _request_section(messages: list, section: str, timeout, starts: dict):
+    """
+    항목 하나를 요청합니다. 시작 시각을 starts에 남기고 (스레드 풀에서 기다린 시간은 제한 시간에 넣지 않음),
+    사용량은 호출한 스레드에서 기록하도록 (응답, 보낸 시각, 받은 시각)을 돌려줍니다.
+    """
+    started = starts[section] = time.perf_counter()
+    response = get_openai_client().chat.completions.create(
+        model=GPT_MODEL,
+        timeout=timeout,
+        messages=messages,
+        temperature=0.7,
+        max_tokens=FANOUT_SECTION_TOKENS[section],
+        response_format={"type": "json_object"}
+    )
+    return response, started, time.perf_counter()
+
+def _release_after(futures: dict, pending: list, release) -> None:
+    """
+    제한 시간이 지나 기다리지 않기로 한 요청이 끝나면 사용량을 지표에 남기고, 마지막 요청이 끝날 때 슬롯을 반납합니다.
+    아직 시작하지 않은 요청은 취소합니다.
+    """
+    remaining = [len(pending)]
+    lock = threading.Lock()
+
+    def on_done(future):
+        section = futures[future]
+        if not future.cancelled():
+            try:
+                response, sent, finished = future.result()
+                # 작업자 스레드에서 호출되므로 helper 사용량(get_last_usage)이 아니라 지표에만 더해집니다
+                _record_usage("fortune", response.usage, sent, getattr(response, "model", None), finished=finished)
+                metrics.incr(f"fortune.fanout.{section}.late")
+                metrics.incr("fortune.fanout.late_tokens", _total_tokens(response.usage))
+            except Exception:
+                metrics.incr(f"fortune.fanout.{section}.failed")
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            release()
+
+    for future in pending:
+        future.cancel()
+    for future in pending:
+        future.add_done_callback(on_done)
+
+def analyze_fortune_fanout(character_data: dict, conversation_history: list, user_id: str = "anonymous",
+                           on_wait=None, section_timeout: float = None):
+    """
+    사주 해석의 네 항목을 항목별 작은 요청으로 나눠 동시에 생성하고, 완성되는 순서대로 돌려줍니다.
+    모든 요청이 같은 앞부분(fortune_messages)을 쓰고 마지막 지시만 다르므로 앞부분은 프롬프트 캐시를 씁니다.
+    
+    제한 시간은 항목 요청마다 실제로 시작된 때부터 잽니다. 시간 안에 오지 않았거나 실패한 항목은
+    다시 요청하지 않고 뺍니다 (부분 결과). 모아진 (항목 이름, 내용)을 dict로 합치면 analyze_fortune 과 같은 형식입니다.
+    기다리지 않기로 한 요청이 아직 진행 중이면 수락 제어 슬롯은 그 요청이 끝날 때 반납하고, 늦게 온 사용량은 지표에 남깁니다.
+    
+    Args:
+        character_data: 인물 프로필 딕셔너리
+        conversation_history: 대화 기록 리스트 (각 항목은 {"speaker": "user"/"ai", "message": "..."} 형식)
+        user_id: 요청 수락 제어에 사용할 사용자 식별자
+        on_wait: 대기열에서 기다리는 동안 대기 순번을 받는 콜백
+        section_timeout: 항목 요청 하나를 기다리는 최대 시간(초) (기본값: FORTUNE_SECTION_TIMEOUT_SECONDS)
+    
+    Yields:
+        (항목 이름, 내용) - 예: ("summary", "...")
+
+    Raises:
+        AdmissionRejected: 요청이 수락되지 않은 경우
+    """
+    from concurrent.futures import wait, FIRST_COMPLETED
+    from utils.schemas import FortuneResult
+
+    if section_timeout is None:
+        section_timeout = FANOUT_SECTION_TIMEOUT
+    timeout = timeout_for("analysis", read=section_timeout)
+    emitted = {}
+    starts = {}
+
+    _start_metering()
+    controller = get_admission_controller()
+    # 네 요청을 합쳐도 생성하는 양은 한 번에 해석할 때와 같으므로 해석 한 건의 비용으로 수락합니다
+    controller.acquire(user_id, cost=COST_ANALYSIS, on_wait=on_wait)
+    started = time.perf_counter()
+    futures, pending = {}, set()
+    try:
+        executor = _get_fanout_executor()
+        futures = {
+            executor.submit(_request_section, section_messages(character_data, conversation_history, section),
+                            section, timeout, starts): section
+            for section in FORTUNE_SECTIONS
+        }
+        pending = set(futures)
+        while pending:
+            # 시작한 요청 중 가장 먼저 제한 시간이 끝나는 때까지 기다립니다 (아직 시작 전이면 잠시 뒤 다시 확인)
+            deadlines = [starts[futures[f]] + section_timeout for f in pending if futures[f] in starts]
+            wait_for = max(0.0, min(deadlines) - time.perf_counter()) if deadlines else 0.5
+            done, _ = wait(pending, timeout=min(wait_for, 0.5), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                pending.discard(future)
+                section = futures[future]
+                try:
+                    response, sent, finished = future.result()
+                except Exception as e:
+                    print(f"⚠️ 사주 해석 항목 생성 실패 ({section}): {str(e)}")
+                    metrics.incr(f"fortune.fanout.{section}.failed")
+                    continue
+                _record_usage("fortune", response.usage, sent, getattr(response, "model", None), finished=finished)
+                metrics.observe(f"fortune.fanout.{section}.seconds", finished - sent)
+                try:
+                    value = json.loads(response.choices[0].message.content or "{}").get(section)
+                    value = FortuneResult.model_validate({section: value}).to_dict().get(section)
+                except Exception:
+                    value = None
+                if not value:
+                    print(f"⚠️ 사주 해석 항목이 비어 있거나 형식이 잘못되었습니다 ({section})")
+                    metrics.incr(f"fortune.fanout.{section}.invalid")
+                    continue
+                emitted[section] = value
+                yield section, value
+
+            now = time.perf_counter()
+            for future in [f for f in pending if not f.done() and futures[f] in starts]:
+                if now - starts[futures[future]] > section_timeout:
+                    # 진행 중인 요청은 멈출 수 없으므로 기다리지만 않습니다 (끝나면 _release_after가 기록)
+                    pending.discard(future)
+                    metrics.incr(f"fortune.fanout.{futures[future]}.timeout")
+                    print(f"⚠️ 사주 해석 항목 제한 시간 초과 ({futures[future]}, {section_timeout:.1f}초)")
+    finally:
+        # 기다리지 않기로 했거나 (소비자가 중간에 멈춰) 남은 요청이 있으면 그 요청들이 끝날 때 슬롯을 반납합니다
+        unfinished = [f for f in futures if not f.done() or f in pending]
+        if unfinished:
+            _release_after(futures, unfinished, controller.release)
+        else:
+            controller.release()
+
+    wall = time.perf_counter() - started
+    # 요청이 동시에 진행되므로 지연 시간은 요청별 합계가 아니라 전체 경과 시간으로 남깁니다
+    meter = getattr(_meter, "usage", None)
+    if meter is not None:
+        meter["latency_ms"] = round(wall * 1000)
+    metrics.observe("fortune.fanout.wall_seconds", wall)
+
+    missing = [section for section in FORTUNE_SECTIONS if section not in emitted]
+    if missing:
+        metrics.incr("fortune.fanout.partial")
+        print(f"⚠️ 사주 해석 일부 항목 없이 완료: {', '.join(missing)}")
+    else:
+        print(f"✅ 사주 해석 완료 (항목별 동시 생성, {wall:.1f}초)")
+
+def refine_fortune_analysis(character_data: dict, draft_result: dict, new_messages: list,
+                            user_id: str = "anonymous", on_wait=None, earlier_messages: list = None):
+    """
+    미리 만들어 둔 초안 해석에 초안 이후의 대화만 반영합니다.
+    전체 대화 대신 새 대화만 보내고, 달라져야 하는 항목만 돌려받아 합칩니다.
+    
+    Args:
+        character_data: 인물 프로필 딕셔너리
+        draft_result: 초안 해석 결과 딕셔너리
+        new_messages: 초안 이후의 대화 ({"speaker", "message"} 목록)
+        user_id: 요청 수락 제어에 사용할 사용자 식별자
+        on_wait: 대기열에서 기다리는 동안 대기 순번을 받는 콜백
+        earlier_messages: 초안이 반영한 대화. 주면 초안 요청과 같은 앞부분으로 보내 캐시를 씁니다.
+    
+    Returns:
+        갱신된 해석 결과 딕셔너리 (실패 시 None)
+
+    Raises:
+        AdmissionRejected: 요청이 수락되지 않은 경우
+    """
+    try:
+        messages = refine_messages(character_data, draft_result, earlier_messages or [], new_messages)
+
+        _start_metering()
+        with get_admission_controller().slot(user_id, cost=COST_ANALYSIS, on_wait=on_wait):
+            started = time.perf_counter()
+            response = get_openai_client().chat.completions.create(
+                model=GPT_MODEL,
+                timeout=timeout_for("analysis"),
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000,
+                response_format={"type": "json_object"}
+            )
+        _record_usage("refine", response.usage, started, getattr(response, "model", None))
         
-        print(f"✅ 사주 해석 완료")
-        return result_data
+        from utils.schemas import FortuneResult, parse_structured
+
+        # 고칠 항목만 오므로 빠진 항목은 초안을 그대로 씁니다
+        delta, _ = parse_structured(FortuneResult, response.choices[0].message.content)
+        changes = delta.to_dict()
+        result = {**draft_result, **changes}
         
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON 파싱 실패: {str(e)}")
-        return None
+        print(f"✅ 사주 해석 갱신 완료 (변경 항목: {len(changes)}개)")
+        return result
+        
+    except AdmissionRejected:
+        raise
     except Exception as e:
-        print(f"❌ 사주 해석 실패: {str(e)}")
+        print(f"❌ 사주 해석 갱신 실패: {str(e)}")
         return None
 
+# 트래픽 기록 모드에서는 helper 호출을 기록합니다 (utils/traffic.py)
+traffic.instrument(globals(), (
+    "generate_character_profile", "generate_character_profiles", "chat_with_character",
+    "generate_character_image", "analyze_fortune", "analyze_fortune_stream", "analyze_fortune_fanout",
+    "refine_fortune_analysis",
+))
+
 if __name__ == "__main__":
     # Test OpenAI connection
     test_openai_connection()
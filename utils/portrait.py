@@ -0,0 +1,89 @@
+"""
+인물 초상화 백그라운드 생성 모듈
+DALL-E 이미지 생성 → 다운로드 → 썸네일 업로드 → DB 갱신을 백그라운드에서 처리합니다.
+화면은 마감 시간(PORTRAIT_DEADLINE_SECONDS)까지만 기다리고, 그 뒤에는 로컬 아바타를 먼저 보여줍니다.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from utils import metrics
+from utils.admission import AdmissionRejected
+
+# 실제 초상화를 기다리는 최대 시간(초). 넘기면 로컬 아바타로 먼저 진행합니다.
+PORTRAIT_DEADLINE_SECONDS = float(os.getenv("PORTRAIT_DEADLINE_SECONDS", "3"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PORTRAIT_WORKERS", "4")),
+    thread_name_prefix="portrait"
+)
+
+def _generate_portrait(character_data: dict, character_id: str, user_id: str) -> dict:
+    from utils.openai_helper import generate_character_image, download_image
+    from utils.supabase_helper import upload_portrait, update_character_image
+
+    started = time.perf_counter()
+    try:
+        image_url = generate_character_image(character_data, user_id=user_id)
+    except AdmissionRejected:
+        metrics.incr("portrait.generate.rejected")
+        return None
+    if not image_url:
+        metrics.incr("portrait.generate.failed")
+        return None
+
+    image_data = download_image(image_url)
+    if not image_data:
+        metrics.incr("portrait.generate.failed")
+        return None
+
+    # 원본 + WebP 썸네일을 Supabase Storage에 올립니다
+    image_variants = upload_portrait(image_data, character_id)
+    if not image_variants:
+        # 업로드에 실패하면 임시 URL이라도 사용합니다
+        metrics.incr("portrait.generate.upload_failed")
+        return {"image_url": image_url, "image_variants": None}
+
+    storage_url = image_variants['original']['url']
+    update_character_image(character_id, storage_url, image_variants)
+    metrics.observe("portrait.generate_seconds", time.perf_counter() - started)
+    return {"image_url": storage_url, "image_variants": image_variants}
+
+def start_portrait(character_data: dict, character_id: str, user_id: str = "anonymous"):
+    """
+    초상화 생성을 백그라운드에서 시작합니다.
+
+    Args:
+        character_data: 인물 프로필 딕셔너리
+        character_id: 인물 UUID
+        user_id: 요청 수락 제어에 사용할 사용자 식별자
+
+    Returns:
+        Future (결과: {"image_url", "image_variants"} 또는 실패 시 None)
+    """
+    return _executor.submit(_generate_portrait, dict(character_data), character_id, user_id)
+
+def wait_for_portrait(future, timeout: float = None) -> dict:
+    """
+    초상화를 마감 시간까지만 기다립니다.
+
+    Args:
+        future: start_portrait()가 반환한 Future
+        timeout: 기다릴 시간(초), 기본값은 PORTRAIT_DEADLINE_SECONDS
+
+    Returns:
+        완성된 결과 딕셔너리, 아직 진행 중이거나 실패했으면 None
+    """
+    if timeout is None:
+        timeout = PORTRAIT_DEADLINE_SECONDS
+    try:
+        result = future.result(timeout=timeout)
+    except FutureTimeout:
+        metrics.incr("portrait.deadline_missed")
+        return None
+    except Exception as e:
+        print(f"⚠️ 이미지 생성 실패 (아바타로 계속 진행): {str(e)}")
+        return None
+    metrics.incr("portrait.deadline_met")
+    return result
@@ -0,0 +1,113 @@
+"""
+인물 생성 벤치마크
+손님 한 명마다 요청하는 단건 경로(generate_character_profile)와
+한 번의 요청으로 여러 명을 만드는 일괄 경로(generate_character_profiles)를 비교합니다.
+초당 생성 인물 수와 인물당 토큰 수를 보고합니다.
+
+실행:
+    python -m utils.profile_bench --fake --count 20 --batch-size 5   # 로컬 대체 클라이언트
+    python -m utils.profile_bench --count 10 --batch-size 5          # 실제 OpenAI API (비용 발생)
+"""
+
+import json
+import time
+import argparse
+
+def _usage() -> tuple:
+    from utils import metrics
+    return (
+        int(metrics.get_counter("llm.profile.prompt_tokens")),
+        int(metrics.get_counter("llm.profile.completion_tokens")),
+    )
+
+def _measure(name: str, produce, count: int, save: bool) -> dict:
+    from utils.supabase_helper import create_character, create_characters
+
+    usage_before = _usage()
+    started = time.perf_counter()
+    profiles, requests = [], 0
+    while len(profiles) < count:
+        batch = produce(count - len(profiles))
+        requests += 1
+        if not batch:
+            break
+        if save:
+            if len(batch) == 1:
+                create_character(batch[0])
+            else:
+                create_characters(batch)
+        profiles.extend(batch)
+    seconds = time.perf_counter() - started
+    prompt_tokens, completion_tokens = (now - then for now, then in zip(_usage(), usage_before))
+
+    generated = len(profiles)
+    return {
+        "path": name,
+        "characters": generated,
+        "distinct_names": len({p["name"] for p in profiles}),
+        "calls": requests,
+        "seconds": round(seconds, 3),
+        "characters_per_second": round(generated / seconds, 3) if seconds else 0.0,
+        "prompt_tokens_per_character": round(prompt_tokens / generated, 1) if generated else 0.0,
+        "completion_tokens_per_character": round(completion_tokens / generated, 1) if generated else 0.0,
+        "tokens_per_character": round((prompt_tokens + completion_tokens) / generated, 1) if generated else 0.0,
+    }
+
+def run(count: int, batch_size: int, save: bool = False) -> list:
+    """
+    단건 경로와 일괄 경로로 각각 count명을 만들고 결과를 비교합니다.
+
+    Returns:
+        경로별 결과 딕셔너리 리스트
+    """
+    from utils.openai_helper import generate_character_profile, generate_character_profiles
+
+    def single(remaining):
+        profile = generate_character_profile(user_id="profile-bench")
+        return [profile] if profile else []
+
+    def batch(remaining):
+        return generate_character_profiles(min(batch_size, remaining), user_id="profile-bench")
+
+    return [
+        _measure("single", single, count, save),
+        _measure(f"batch({batch_size})", batch, count, save),
+    ]
+
+def main(argv: list = None) -> list:
+    parser = argparse.ArgumentParser(description="사담 인물 생성 벤치마크 (단건 vs 일괄)")
+    parser.add_argument("--count", type=int, default=20, help="경로별로 만들 인물 수")
+    parser.add_argument("--batch-size", type=int, default=5, help="일괄 경로의 요청당 인물 수")
+    parser.add_argument("--save", action="store_true", help="생성한 인물을 데이터베이스에도 저장")
+    parser.add_argument("--fake", action="store_true", help="OpenAI/Supabase 대신 로컬 대체 클라이언트 사용")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="[--fake] 요청 1회당 고정 지연(초)")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="[--fake] 응답 토큰 하나당 지연(초)")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    args = parser.parse_args(argv)
+
+    from utils.admission import configure_admission
+
+    if args.fake:
+        from utils import fakes
+        fakes.install(llm_latency=args.llm_latency, token_latency=args.token_latency, db_latency=0.02, jitter=0.0)
+    # 벤치마크는 수락 제어 한도에 걸리지 않도록 충분히 큰 한도를 씁니다
+    configure_admission(rate_per_minute=100_000, burst=100_000)
+
+    results = run(args.count, args.batch_size, args.save)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return results
+
+    print(f"\n{'경로':<12}{'인물':>6}{'요청':>6}{'소요(s)':>10}{'인물/초':>10}{'토큰/인물':>10}{'(입력/출력)':>14}")
+    for r in results:
+        print(f"{r['path']:<12}{r['characters']:>6}{r['calls']:>6}{r['seconds']:>10.2f}"
+              f"{r['characters_per_second']:>10.2f}{r['tokens_per_character']:>10.0f}"
+              f"{r['prompt_tokens_per_character']:>8.0f}/{r['completion_tokens_per_character']:.0f}")
+    single, batch = results
+    if single["characters_per_second"] and single["tokens_per_character"]:
+        print(f"\n✅ 일괄 경로: 처리량 {batch['characters_per_second'] / single['characters_per_second']:.1f}배, "
+              f"인물당 토큰 {batch['tokens_per_character'] / single['tokens_per_character']:.0%}")
+    return results
+
+if __name__ == "__main__":
+    main()
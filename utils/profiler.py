@@ -0,0 +1,224 @@
+"""
+스크립트 재실행(rerun) 프로파일러
+Streamlit은 상호작용마다 app.py 전체를 다시 실행합니다. 이 모듈은 재실행 1회의 총 소요 시간,
+구간(checkpoint)별 소요 시간, 주요 helper 호출 시간을 재고, 선택적으로 cProfile 또는 스택 샘플링 결과를 남깁니다.
+
+켜는 방법 (기본값은 꺼짐):
+    PROFILE_RERUNS=timing   구간/호출 시간만 측정
+    PROFILE_RERUNS=cprofile cProfile 상위 함수까지 기록
+    PROFILE_RERUNS=sample   스택 샘플링 상위 경로까지 기록
+결과는 PROFILE_LOG_PATH(기본값 logs/rerun_profile.jsonl)에 한 줄씩 쌓이며, 파일은 크기에 따라 순환됩니다.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+import functools
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from utils import metrics
+
+PROFILE_MODE = os.getenv("PROFILE_RERUNS", "").strip().lower()
+PROFILE_LOG_PATH = os.getenv("PROFILE_LOG_PATH", os.path.join("logs", "rerun_profile.jsonl"))
+# 스택 샘플링 간격(초)
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+# 세션별로 보관할 최근 재실행 기록 수
+HISTORY_SIZE = 20
+# cProfile / 샘플링 결과에서 남길 상위 항목 수
+TOP_N = 15
+
+_ACTIVE_KEY = "_rerun_profile_active"
+_HISTORY_KEY = "_rerun_profile_history"
+
+_local = threading.local()
+_logger = None
+_logger_lock = threading.Lock()
+
+def is_enabled() -> bool:
+    """프로파일링 모드가 켜져 있는지 여부"""
+    return PROFILE_MODE in ("1", "timing", "cprofile", "sample")
+
+def _get_logger() -> logging.Logger:
+    global _logger
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                directory = os.path.dirname(PROFILE_LOG_PATH)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                logger = logging.getLogger("sadam.rerun_profile")
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                handler = RotatingFileHandler(PROFILE_LOG_PATH, maxBytes=1_000_000, backupCount=3, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+                _logger = logger
+    return _logger
+
+class _StackSampler:
+    """대상 스레드의 호출 스택을 주기적으로 샘플링합니다."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.total = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rerun-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < 6:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}")
+                frame = frame.f_back
+            self.samples[" ← ".join(stack)] += 1
+            self.total += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> list:
+        self._stop.set()
+        self._thread.join()
+        return [
+            f"{count / self.total:6.1%}  {stack}"
+            for stack, count in self.samples.most_common(TOP_N)
+        ] if self.total else []
+
+class RerunProfile:
+    """재실행 1회의 측정 기록"""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.started = time.perf_counter()
+        self.sections = []
+        self.calls = {}
+        self._section = None
+        self._section_started = None
+        self._cprofile = None
+        self._sampler = None
+
+        if mode == "cprofile":
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif mode == "sample":
+            self._sampler = _StackSampler(threading.get_ident(), SAMPLE_INTERVAL)
+            self._sampler.start()
+
+    def checkpoint(self, name: str) -> None:
+        now = time.perf_counter()
+        if self._section is not None:
+            self.sections.append((self._section, now - self._section_started))
+        self._section = name
+        self._section_started = now
+
+    def record_call(self, name: str, seconds: float) -> None:
+        count, total = self.calls.get(name, (0, 0.0))
+        self.calls[name] = (count + 1, total + seconds)
+
+    def finish(self, status: str) -> dict:
+        self.checkpoint(None)
+        total = time.perf_counter() - self.started
+        record = {
+            "started_at": self.started_at,
+            "status": status,
+            "total_ms": round(total * 1000, 1),
+            "sections": [[name, round(seconds * 1000, 1)] for name, seconds in self.sections],
+            "calls": {name: [count, round(seconds * 1000, 1)] for name, (count, seconds) in self.calls.items()},
+        }
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            output = io.StringIO()
+            pstats.Stats(self._cprofile, stream=output).sort_stats("cumulative").print_stats(TOP_N)
+            record["cprofile"] = output.getvalue().strip().splitlines()
+        if self._sampler is not None:
+            record["samples"] = self._sampler.stop()
+
+        metrics.observe("rerun.total_seconds", total)
+        return record
+
+def _finish(store, status: str) -> dict:
+    profile = store.get(_ACTIVE_KEY)
+    if profile is None:
+        return None
+    store[_ACTIVE_KEY] = None
+    if getattr(_local, "profile", None) is profile:
+        _local.profile = None
+
+    record = profile.finish(status)
+    history = store.get(_HISTORY_KEY)
+    if history is None:
+        history = deque(maxlen=HISTORY_SIZE)
+        store[_HISTORY_KEY] = history
+    history.append(record)
+    try:
+        _get_logger().info(json.dumps(record, ensure_ascii=False))
+    except Exception as e:
+        print(f"⚠️ 프로파일 기록 실패: {str(e)}")
+    return record
+
+def start_rerun(store) -> None:
+    """
+    재실행 측정을 시작합니다. 스크립트 맨 위에서 호출합니다.
+    st.rerun()/st.stop()으로 끝까지 가지 못한 이전 재실행은 "interrupted"로 마감합니다.
+
+    Args:
+        store: 세션별 저장소 (st.session_state)
+    """
+    if not is_enabled():
+        return
+    _finish(store, "interrupted")
+    profile = RerunProfile(PROFILE_MODE)
+    store[_ACTIVE_KEY] = profile
+    _local.profile = profile
+    profile.checkpoint("startup")
+
+def checkpoint(name: str) -> None:
+    """지금부터 다음 checkpoint까지를 name 구간으로 기록합니다."""
+    profile = getattr(_local, "profile", None)
+    if profile is not None:
+        profile.checkpoint(name)
+
+def finish_rerun(store) -> dict:
+    """재실행 측정을 마치고 기록을 반환합니다. (꺼져 있으면 None)"""
+    if not is_enabled():
+        return None
+    return _finish(store, "completed")
+
+def get_history(store) -> list:
+    """이 세션의 최근 재실행 기록 (오래된 것부터)"""
+    return list(store.get(_HISTORY_KEY) or [])
+
+def timed(func):
+    """
+    함수 호출 시간을 현재 재실행 기록에 더하는 데코레이터입니다.
+    프로파일링 모드가 꺼져 있으면 원래 함수를 그대로 돌려줍니다.
+    """
+    if not is_enabled():
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile = getattr(_local, "profile", None)
+            if profile is not None:
+                profile.record_call(func.__name__, time.perf_counter() - started)
+    return wrapper
@@ -0,0 +1,191 @@
+"""
+프롬프트 조립 모듈
+OpenAI는 앞부분이 같은 요청의 프롬프트를 자동으로 캐시합니다 (1024토큰 이상, 앞에서부터 일치하는 부분만).
+같은 인물, 같은 상담의 요청이 바이트 단위로 같은 앞부분을 갖도록 항상 같은 순서로 조립합니다.
+
+    고정 지시문 → 인물 정보(정해진 항목 순서) → 대화 기록(뒤에만 덧붙임) → 이번 요청
+
+- 지시문에는 요청마다 바뀌는 값(시각, 난수, 인물 정보)을 넣지 않습니다.
+- 대화는 한 턴씩 뒤에 붙기만 하므로 앞선 요청의 프롬프트 전체가 다음 요청의 앞부분이 됩니다.
+- 대화 문맥이 길어져 앞부분을 잘라야 할 때도 CHAT_HISTORY_STEP 턴 단위로만 잘라 앞부분이 매 턴 바뀌지 않게 합니다.
+
+캐시된 토큰 수는 응답의 usage.prompt_tokens_details.cached_tokens로 기록됩니다 (llm.<종류>.cached_tokens).
+"""
+
+import os
+import json
+
+# 대화 문맥의 시작 위치를 옮기는 단위(턴). 메모리에 두는 턴 수(SESSION_MEMORY_TURNS)보다 작아야 합니다.
+CHAT_HISTORY_STEP = int(os.getenv("CHAT_HISTORY_STEP", "20"))
+
+CHAT_INSTRUCTIONS = """당신은 사주를 보러 온 손님입니다. 아래 <인물 정보>의 인물로서 자연스럽고 진솔하게 대화하세요.
+너무 많이 말하지 말고, 간결하게 답변하세요."""
+
+FORTUNE_SYSTEM_PROMPT = "You are a professional fortune teller specializing in Korean Saju (Four Pillars of Destiny). Always respond with valid JSON only."
+
+FORTUNE_INSTRUCTIONS = """당신은 전문 사주 해석가입니다.
+사용자 메시지로 사주를 보러 온 손님의 <인물 정보>와 손님과 나눈 <대화 내용>이 주어집니다.
+
+위 대화와 인물 정보를 바탕으로 사주를 해석해주세요.
+다음 내용을 포함하여 JSON 형식으로 응답하세요:
+- fortune_analysis: 전체적인 운세 (4-5문장)
+- personality_analysis: 성격 및 성향 분석 (3-4문장)
+- advice: 현재 고민에 대한 조언 (3-4문장)
+- summary: 한 줄 요약
+
+공감적이고 따뜻한 어조로, 구체적인 조언을 포함해주세요.
+전통적인 사주 해석 용어(오행, 천간지지 등)를 적절히 사용하되, 이해하기 쉽게 설명해주세요."""
+
+# 항목별 동시 해석(fan-out)에서 각 요청이 맡는 항목과 분량
+FORTUNE_SECTIONS = {
+    "fortune_analysis": "전체적인 운세 (4-5문장)",
+    "personality_analysis": "성격 및 성향 분석 (3-4문장)",
+    "advice": "현재 고민에 대한 조언 (3-4문장)",
+    "summary": "한 줄 요약",
+}
+
+SECTION_INSTRUCTIONS = """이번 응답에서는 다음 항목 하나만 작성하세요: {section} - {description}
+{{"{section}": "..."}} 형식의 JSON으로만 응답하고 다른 항목은 넣지 마세요."""
+
+REFINE_INSTRUCTIONS = """대화 중간까지를 바탕으로 위 해석을 작성해 두었습니다. 아래는 그 이후에 이어진 대화입니다.
+
+<이후에 이어진 대화>
+{conversation}
+
+이후 대화에서 새로 드러난 내용을 반영해야 하는 항목만 고쳐서 JSON 형식으로 응답하세요.
+항목 이름은 fortune_analysis, personality_analysis, advice, summary 중에서만 사용하고,
+고칠 필요가 없는 항목은 응답에 넣지 마세요. 고칠 항목이 없으면 빈 객체 {{}}로 응답하세요."""
+
+# 인물 정보 항목 (표시 이름, 키, 단위) - 순서가 바뀌면 캐시가 모두 무효가 되므로 뒤에만 추가합니다
+CHAT_PROFILE_FIELDS = (
+    ("이름", "name", ""), ("나이", "age", "세"), ("성별", "gender", ""), ("직업", "occupation", ""),
+    ("성격", "personality", ""), ("현재 고민", "concern", ""), ("말투", "speaking_style", ""),
+    ("지난 상담", "previous_consultation", ""),
+)
+FORTUNE_PROFILE_FIELDS = (
+    ("이름", "name", ""), ("나이", "age", "세"), ("성별", "gender", ""), ("직업", "occupation", ""),
+    ("성격", "personality", ""), ("현재 고민", "concern", ""),
+    ("생년월일", "birth_date", ""), ("출생 시간", "birth_time", ""),
+    ("지난 상담", "previous_consultation", ""),
+)
+
+def _canonical(value) -> str:
+    """값을 항상 같은 문자열로 바꿉니다. (앞뒤 공백과 줄바꿈 차이를 없앰)"""
+    if value is None:
+        return ""
+    return " ".join(str(value).split())
+
+def character_profile(character: dict, fields: tuple = CHAT_PROFILE_FIELDS) -> str:
+    """
+    인물 정보를 정해진 항목 순서와 형식으로 씁니다. 같은 인물이면 항상 같은 문자열입니다.
+    값이 없는 항목(예: 처음 온 손님의 지난 상담)은 그 줄을 넣지 않습니다.
+
+    Args:
+        character: 인물 프로필 딕셔너리
+        fields: (표시 이름, 키, 단위) 목록
+
+    Returns:
+        "이름: ...\\n나이: ..세\\n..." 형식의 문자열
+    """
+    return "\n".join(
+        f"{label}: {_canonical(character.get(key))}{unit}"
+        for label, key, unit in fields
+        if _canonical(character.get(key))
+    )
+
+def chat_history(turns: list, offset: int = 0) -> list:
+    """
+    대화 기록을 OpenAI 메시지 목록으로 바꿉니다. 앞부분은 CHAT_HISTORY_STEP 턴 단위로만 잘라냅니다.
+
+    Args:
+        turns: 메모리에 있는 최근 턴 ({"role", "content"} 형식)
+        offset: turns 앞에 있었지만 메모리에서 내려놓은 턴 수
+
+    Returns:
+        [{"role", "content"}, ...]
+    """
+    # 시작 위치를 STEP의 배수로 맞추면 그 사이의 턴 동안은 같은 위치에서 시작합니다
+    start = -(-offset // CHAT_HISTORY_STEP) * CHAT_HISTORY_STEP - offset
+    if start >= len(turns):
+        start = 0
+    return [
+        {"role": "assistant" if turn["role"] == "assistant" else "user", "content": turn["content"]}
+        for turn in turns[start:]
+    ]
+
+def chat_messages(character: dict, history: list, user_message: str) -> list:
+    """
+    인물과의 대화 요청 메시지를 조립합니다.
+
+    Args:
+        character: 인물 프로필 딕셔너리
+        history: chat_history()가 만든 대화 기록
+        user_message: 이번에 보낸 메시지
+
+    Returns:
+        [system(지시문 + 인물 정보), 대화 기록..., user(이번 메시지)]
+    """
+    system = f"{CHAT_INSTRUCTIONS}\n\n<인물 정보>\n{character_profile(character)}"
+    return [{"role": "system", "content": system}, *history, {"role": "user", "content": user_message}]
+
+def conversation_text(character: dict, conversation: list) -> str:
+    """대화 기록({"speaker", "message"} 목록)을 한 줄에 한 턴씩 씁니다."""
+    name = _canonical(character.get("name"))
+    return "\n".join(
+        f"{'손님' if msg['speaker'] == 'user' else name}: {msg['message']}"
+        for msg in conversation
+    )
+
+def fortune_messages(character: dict, conversation: list) -> list:
+    """
+    사주 해석 요청 메시지를 조립합니다. 대화가 맨 뒤에 오므로 초안 해석과 최종 해석이 앞부분을 공유합니다.
+
+    Args:
+        character: 인물 프로필 딕셔너리
+        conversation: 대화 기록 ({"speaker", "message"} 목록)
+
+    Returns:
+        [system(고정 지시문), user(인물 정보 + 대화 내용)]
+    """
+    profile = character_profile(character, FORTUNE_PROFILE_FIELDS)
+    return [
+        {"role": "system", "content": f"{FORTUNE_SYSTEM_PROMPT}\n\n{FORTUNE_INSTRUCTIONS}"},
+        {"role": "user", "content": f"<인물 정보>\n{profile}\n\n<대화 내용>\n{conversation_text(character, conversation)}"},
+    ]
+
+def section_messages(character: dict, conversation: list, section: str) -> list:
+    """
+    사주 해석의 한 항목만 요청하는 메시지를 조립합니다.
+    fortune_messages()를 그대로 앞에 두므로 항목별 요청끼리, 그리고 초안 해석과 앞부분을 공유합니다.
+
+    Args:
+        character: 인물 프로필 딕셔너리
+        conversation: 대화 기록 ({"speaker", "message"} 목록)
+        section: FORTUNE_SECTIONS의 항목 이름
+
+    Returns:
+        메시지 목록
+    """
+    instructions = SECTION_INSTRUCTIONS.format(section=section, description=FORTUNE_SECTIONS[section])
+    return [*fortune_messages(character, conversation), {"role": "user", "content": instructions}]
+
+def refine_messages(character: dict, draft_result: dict, earlier: list, new_messages: list) -> list:
+    """
+    초안 해석 갱신 요청 메시지를 조립합니다.
+    초안을 만든 요청(fortune_messages(earlier))을 그대로 앞에 두고 초안을 그 응답으로 이어 붙이므로,
+    초안 요청의 프롬프트 전체가 캐시 대상이 됩니다.
+
+    Args:
+        character: 인물 프로필 딕셔너리
+        draft_result: 초안 해석 결과
+        earlier: 초안이 반영한 대화
+        new_messages: 초안 이후의 대화
+
+    Returns:
+        메시지 목록
+    """
+    return [
+        *fortune_messages(character, earlier),
+        {"role": "assistant", "content": json.dumps(draft_result, ensure_ascii=False)},
+        {"role": "user", "content": REFINE_INSTRUCTIONS.format(conversation=conversation_text(character, new_messages))},
+    ]
@@ -0,0 +1,232 @@
+"""
+Supabase Realtime 구독 모듈
+fortune_results 추가와 sessions, analysis_job_events 변경을 구독하여 열려 있는 Streamlit 세션에 전달합니다.
+
+Realtime 연결은 프로세스당 하나이며, 백그라운드 스레드의 이벤트 루프에서 동작합니다.
+각 Streamlit 세션은 Inbox를 하나씩 등록하고, 화면 갱신 시 DB를 다시 조회하는 대신
+Inbox에 쌓인 변경 이벤트를 반영합니다.
+이벤트는 Inbox가 지켜보는 세션의 것만 전달되며, 해석 작업은 대화 전문(payload)과 결과가 빠진
+analysis_job_events로만 알립니다.
+"""
+
+import os
+import asyncio
+import threading
+import weakref
+from collections import deque
+
+from utils import metrics
+from utils.config import load_env
+
+# Load environment variables
+load_env()
+
+# 구독 대상: (테이블, 이벤트)
+# 사주 결과는 upsert로 저장되고(재해석 포함), 작업 알림은 트리거가 첫 행을 INSERT 하므로 둘 다 받습니다
+SUBSCRIPTIONS = [
+    ("fortune_results", "INSERT"),
+    ("fortune_results", "UPDATE"),
+    ("sessions", "UPDATE"),
+    ("analysis_job_events", "INSERT"),
+    ("analysis_job_events", "UPDATE"),
+]
+
+# 세션 id가 담긴 열 (sessions 는 id)
+SESSION_COLUMNS = {
+    "fortune_results": "session_id",
+    "analysis_job_events": "session_id",
+    "sessions": "id",
+}
+
+class Inbox:
+    """한 Streamlit 세션이 받을 변경 이벤트를 모아두는 스레드 안전 큐입니다."""
+
+    def __init__(self, maxlen: int = 256):
+        self._events = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._session_ids = frozenset()
+        self._history = False
+
+    def watch(self, session_ids, history: bool = False) -> None:
+        """
+        받을 이벤트의 범위를 정합니다.
+
+        Args:
+            session_ids: 이벤트를 받을 세션 id들 (진행 중인 세션, 상세 보기 중인 세션)
+            history: 기록 목록을 보고 있는지 여부 (모든 sessions 변경을 받음)
+        """
+        with self._lock:
+            self._session_ids = frozenset(sid for sid in session_ids if sid)
+            self._history = history
+
+    def wants(self, event: dict) -> bool:
+        """이 Inbox가 지켜보는 세션의 이벤트인지 반환합니다."""
+        column = SESSION_COLUMNS.get(event.get("table"))
+        if column is None:
+            return False
+        with self._lock:
+            if event["table"] == "sessions" and self._history:
+                return True
+            return event.get("record", {}).get(column) in self._session_ids
+
+    def put(self, event: dict) -> None:
+        with self._lock:
+            self._events.append(event)
+
+    def drain(self) -> list:
+        """쌓인 이벤트를 모두 꺼내 반환합니다."""
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._events)
+
+class RealtimeHub:
+    """Realtime 연결을 유지하고 받은 변경 이벤트를 Inbox와 리스너에 전달합니다."""
+
+    def __init__(self, url: str, key: str):
+        self.url = url
+        self.key = key
+        self.connected = False
+        self._inboxes = weakref.WeakSet()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self) -> None:
+        """백그라운드 스레드에서 연결을 시작합니다. 여러 번 호출해도 한 번만 시작됩니다."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="realtime-hub", daemon=True)
+            self._thread.start()
+
+    def register(self, inbox: Inbox) -> None:
+        with self._lock:
+            self._inboxes.add(inbox)
+
+    def add_listener(self, callback) -> None:
+        """모든 변경 이벤트를 받을 콜백을 등록합니다. (Streamlit 세션 외부 용도)"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def dispatch(self, event: dict) -> None:
+        """변경 이벤트를 그 세션을 지켜보는 Inbox와 모든 리스너에 전달합니다."""
+        metrics.incr(f"realtime.events.{event['table']}")
+        with self._lock:
+            inboxes = list(self._inboxes)
+            listeners = list(self._listeners)
+        for inbox in inboxes:
+            if inbox.wants(event):
+                inbox.put(event)
+            else:
+                metrics.incr("realtime.events.filtered")
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"❌ Realtime 리스너 처리 실패: {str(e)}")
+
+    def _on_change(self, payload: dict) -> None:
+        data = payload.get("data", {})
+        self.dispatch({
+            "table": data.get("table"),
+            "type": str(getattr(data.get("type"), "value", data.get("type"))),
+            "record": data.get("record") or {},
+        })
+
+    def _run(self) -> None:
+        asyncio.run(self._main())
+
+    async def _main(self) -> None:
+        from realtime import AsyncRealtimeClient, RealtimeSubscribeStates
+
+        backoff = 1.0
+        while True:
+            client = None
+            try:
+                client = AsyncRealtimeClient(self.url, self.key, auto_reconnect=True)
+                await client.connect()
+
+                channel = client.channel("fortune-dialogue")
+                for table, event in SUBSCRIPTIONS:
+                    channel.on_postgres_changes(event, self._on_change, table=table, schema="public")
+
+                subscribed = asyncio.Event()
+                states = []
+
+                def on_subscribe(state, error):
+                    states.append((state, error))
+                    subscribed.set()
+
+                await channel.subscribe(on_subscribe)
+                await asyncio.wait_for(subscribed.wait(), timeout=10)
+                state, error = states[-1]
+                if state != RealtimeSubscribeStates.SUBSCRIBED:
+                    raise RuntimeError(f"구독 실패 ({state}): {error}")
+
+                self.connected = True
+                backoff = 1.0
+                print("✅ Realtime 구독 시작")
+
+                # 연결이 끊어지면 처음부터 다시 연결합니다
+                while client.is_connected:
+                    await asyncio.sleep(1)
+            except Exception as e:
+                print(f"❌ Realtime 연결 실패: {str(e)}")
+            finally:
+                self.connected = False
+                if client is not None:
+                    try:
+                        await client.close()
+                    except Exception:
+                        pass
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+_hub = None
+_hub_lock = threading.Lock()
+
+def get_realtime_hub() -> RealtimeHub:
+    """
+    프로세스 공용 Realtime 허브를 반환합니다. (비활성화되었거나 설정이 없으면 None)
+
+    REALTIME_URL 이 있으면 그 주소(로컬 대체 서버 등)에, 없으면 SUPABASE_URL의 Realtime 엔드포인트에 연결합니다.
+    REALTIME_ENABLED=0 이면 사용하지 않습니다.
+    """
+    global _hub
+    if os.getenv("REALTIME_ENABLED", "1") == "0":
+        return None
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                supabase_url = os.getenv("SUPABASE_URL")
+                url = os.getenv("REALTIME_URL") or (f"{supabase_url}/realtime/v1" if supabase_url else None)
+                key = os.getenv("SUPABASE_KEY")
+                if not url or not key:
+                    return None
+                _hub = RealtimeHub(url, key)
+                _hub.start()
+    return _hub
+
+def create_inbox() -> Inbox:
+    """
+    새 Inbox를 만들어 허브에 등록합니다.
+
+    Returns:
+        Inbox (Realtime을 사용할 수 없어도 빈 Inbox를 반환합니다)
+    """
+    inbox = Inbox()
+    hub = get_realtime_hub()
+    if hub is not None:
+        hub.register(inbox)
+    return inbox
+
+def is_realtime_connected() -> bool:
+    """Realtime 구독이 현재 동작 중인지 반환합니다."""
+    hub = get_realtime_hub()
+    return bool(hub and hub.connected)
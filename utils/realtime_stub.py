@@ -0,0 +1,132 @@
+"""
+로컬 Realtime 대체 서버 (테스트용)
+Supabase Realtime의 Phoenix 채널 프로토콜 중 postgres_changes 구독에 필요한 부분만 구현합니다.
+
+사용 예:
+    server = LocalRealtimeServer().start()
+    os.environ["REALTIME_URL"] = server.url
+    server.emit("fortune_results", "INSERT", {"session_id": "...", ...})
+"""
+
+import json
+import asyncio
+import threading
+from datetime import datetime, timezone
+
+class LocalRealtimeServer:
+    """백그라운드 스레드에서 동작하는 최소한의 Realtime 웹소켓 서버입니다."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+        # 연결별로 가입한 채널 토픽과 바인딩 목록
+        self._subscriptions = {}
+        self._next_binding_id = 1
+
+    @property
+    def url(self) -> str:
+        """AsyncRealtimeClient 에 넘길 주소 (클라이언트가 /websocket 을 덧붙입니다)"""
+        return f"ws://{self.host}:{self.port}"
+
+    def start(self) -> "LocalRealtimeServer":
+        thread = threading.Thread(target=self._run, name="realtime-stub", daemon=True)
+        thread.start()
+        self._ready.wait(timeout=10)
+        return self
+
+    def stop(self) -> None:
+        if self._loop and self._server:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._serve())
+        self._loop.run_forever()
+
+    async def _serve(self) -> None:
+        from websockets.asyncio.server import serve
+
+        self._server = await serve(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+
+    async def _handle(self, connection) -> None:
+        self._subscriptions[connection] = {}
+        try:
+            async for raw in connection:
+                message = json.loads(raw)
+                event = message.get("event")
+                topic = message.get("topic")
+                ref = message.get("ref")
+
+                if event == "phx_join":
+                    config = message.get("payload", {}).get("config", {})
+                    bindings = []
+                    for binding in config.get("postgres_changes", []):
+                        bindings.append({
+                            "id": self._next_binding_id,
+                            "events": binding.get("events"),
+                            "schema": binding.get("schema", "public"),
+                            "table": binding.get("table"),
+                            "filter": binding.get("filter"),
+                        })
+                        self._next_binding_id += 1
+                    self._subscriptions[connection][topic] = bindings
+                    await self._reply(connection, topic, ref, {"postgres_changes": bindings})
+                elif event == "phx_leave":
+                    self._subscriptions[connection].pop(topic, None)
+                    await self._reply(connection, topic, ref, {})
+                else:
+                    # heartbeat, access_token 등은 성공 응답만 보냅니다
+                    await self._reply(connection, topic, ref, {})
+        except Exception:
+            pass
+        finally:
+            self._subscriptions.pop(connection, None)
+
+    @staticmethod
+    async def _reply(connection, topic: str, ref: str, response: dict) -> None:
+        await connection.send(json.dumps({
+            "event": "phx_reply",
+            "topic": topic,
+            "ref": ref,
+            "payload": {"status": "ok", "response": response},
+        }))
+
+    def emit(self, table: str, event_type: str, record: dict, schema: str = "public") -> None:
+        """구독 중인 모든 클라이언트에 변경 이벤트를 보냅니다. (어느 스레드에서나 호출 가능)"""
+        future = asyncio.run_coroutine_threadsafe(
+            self._emit(table, event_type, record, schema), self._loop
+        )
+        future.result(timeout=5)
+
+    async def _emit(self, table: str, event_type: str, record: dict, schema: str) -> None:
+        for connection, topics in list(self._subscriptions.items()):
+            for topic, bindings in topics.items():
+                ids = [
+                    b["id"] for b in bindings
+                    if b["table"] == table and b["schema"] == schema and b["events"] in (event_type, "*")
+                ]
+                if not ids:
+                    continue
+                await connection.send(json.dumps({
+                    "event": "postgres_changes",
+                    "topic": topic,
+                    "ref": None,
+                    "payload": {
+                        "ids": ids,
+                        "data": {
+                            "schema": schema,
+                            "table": table,
+                            "commit_timestamp": datetime.now(timezone.utc).isoformat(),
+                            "type": event_type,
+                            "errors": None,
+                            "columns": [],
+                            "record": record,
+                        },
+                    },
+                }, ensure_ascii=False))
@@ -0,0 +1,291 @@
+"""
+저장된 세션 일괄 재해석
+해석 프롬프트나 모델을 바꾼 뒤, 완료된 세션의 fortune_results를 새로 만듭니다.
+세션을 id 순서로 페이지 단위로 가져와 analyze_fortune을 동시에 실행하고, 결과는 session_id 기준 upsert로 저장합니다.
+진행 상황은 체크포인트 파일에 계속 기록하므로 중간에 멈춰도 같은 명령으로 이어서 실행할 수 있습니다.
+
+실행:
+    python -m utils.reanalyze --concurrency 4 --rate-per-minute 60
+    python -m utils.reanalyze --retry-failed      # 실패한 세션만 다시
+    python -m utils.reanalyze --restart           # 체크포인트를 버리고 처음부터
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils import metrics
+
+CHECKPOINT_PATH = os.path.join("data", "reanalyze_checkpoint.json")
+# 이 배치가 수락 제어에서 쓰는 사용자 식별자
+BATCH_USER_ID = "batch-reanalyze"
+# 실패 목록에 남기는 오류 메시지 길이
+ERROR_MAX_LENGTH = 200
+
+class Checkpoint:
+    """
+    진행 상황 파일. 저장할 때마다 임시 파일에 쓴 뒤 교체하므로 중간에 죽어도 파일이 깨지지 않습니다.
+
+    - until: 이 시각 이전에 끝난 세션만 대상 (재개해도 대상이 바뀌지 않도록 처음 실행 시각으로 고정)
+    - cursor: 끝까지 처리한 마지막 페이지의 마지막 세션 id
+    - done: 현재 페이지에서 이미 처리한 세션 id
+    - failed: {세션 id: 오류 메시지}
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # 이번 실행에서 실패한 세션 수
+        self.run_failed = 0
+        self.data = {
+            "until": datetime.now().isoformat(),
+            "cursor": None,
+            "done": [],
+            "failed": {},
+            "finished": False,
+            "processed": 0,
+            "skipped": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "elapsed_seconds": 0.0,
+        }
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data.update(json.load(f))
+
+    def save(self) -> None:
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+
+    def record(self, session_id: str, outcome: str, error: str = None) -> None:
+        """세션 하나의 처리 결과를 기록하고 바로 저장합니다. outcome: processed / skipped / failed"""
+        with self._lock:
+            self.data["done"].append(session_id)
+            if outcome == "failed":
+                self.data["failed"][session_id] = (error or "")[:ERROR_MAX_LENGTH]
+                self.run_failed += 1
+            else:
+                self.data["failed"].pop(session_id, None)
+                self.data[outcome] += 1
+        self.save()
+
+    def next_page(self, cursor: str) -> None:
+        with self._lock:
+            self.data["cursor"] = cursor
+            self.data["done"] = []
+        self.save()
+
+def _limit_rate(concurrency: int, rate_per_minute: float) -> None:
+    """이 프로세스의 수락 제어기를 배치 설정(동시 실행 수, 분당 해석 수)으로 바꿉니다."""
+    from utils.admission import COST_ANALYSIS, configure_admission
+
+    configure_admission(
+        rate_per_minute=rate_per_minute * COST_ANALYSIS,
+        burst=concurrency * COST_ANALYSIS,
+        max_concurrency=concurrency,
+        max_queue=concurrency * 2,
+        queue_timeout=600,
+    )
+
+def fetch_page(client, until: str, cursor: str, page_size: int) -> list:
+    """cursor 다음부터 완료된 세션 page_size개를 id 순서로 가져옵니다. (인물 정보 포함)"""
+    query = client.table("sessions")\
+        .select("id, character_id, ended_at, characters(*)")\
+        .eq("status", "completed")\
+        .lt("ended_at", until)
+    if cursor:
+        query = query.gt("id", cursor)
+    return query.order("id").limit(page_size).execute().data or []
+
+def fetch_sessions(client, session_ids: list) -> list:
+    """지정한 세션들을 가져옵니다. (실패한 세션 재시도용)"""
+    if not session_ids:
+        return []
+    return client.table("sessions")\
+        .select("id, character_id, ended_at, characters(*)")\
+        .in_("id", session_ids)\
+        .order("id")\
+        .execute().data or []
+
+def fetch_conversations(client, session_ids: list) -> dict:
+    """{세션 id: [{"speaker", "message"}, ...]} (시간 순서, 보관된 대화 포함)"""
+    from utils.archive import load_conversations
+
+    return {
+        session_id: [{"speaker": row["speaker"], "message": row["message"]} for row in rows]
+        for session_id, rows in load_conversations(client, session_ids).items()
+    }
+
+def _character_data(character: dict) -> dict:
+    # DB에는 고민이 background_story 컬럼에 저장됩니다
+    return {**character, "concern": character.get("background_story")}
+
+def reanalyze_session(session: dict, conversation: list) -> str:
+    """
+    세션 하나를 다시 해석하고 결과를 저장합니다.
+
+    Returns:
+        "processed" 또는 "skipped" (인물 정보나 대화가 없는 세션)
+
+    Raises:
+        RuntimeError: 해석 또는 저장에 실패한 경우
+    """
+    from utils.admission import AdmissionRejected
+    from utils.openai_helper import analyze_fortune, get_last_usage
+    from utils.supabase_helper import save_fortune_result
+
+    if not session.get("characters") or not conversation:
+        return "skipped"
+
+    while True:
+        try:
+            result = analyze_fortune(_character_data(session["characters"]), conversation, user_id=BATCH_USER_ID)
+            break
+        except AdmissionRejected as e:
+            # 속도 제한은 실패가 아니므로 기다렸다가 다시 요청합니다
+            time.sleep(e.retry_after or 1.0)
+
+    if not result:
+        raise RuntimeError("사주 해석 결과가 비어있습니다.")
+    if not save_fortune_result(session["id"], session.get("character_id"), result, usage=get_last_usage()):
+        raise RuntimeError("사주 결과 저장에 실패했습니다.")
+    return "processed"
+
+def _usage() -> tuple:
+    return (
+        int(metrics.get_counter("llm.fortune.prompt_tokens")),
+        int(metrics.get_counter("llm.fortune.completion_tokens")),
+    )
+
+def _process(client, checkpoint: Checkpoint, sessions: list, executor, skip_done: bool = True) -> None:
+    done = set(checkpoint.data["done"]) if skip_done else set()
+    pending = [session for session in sessions if session["id"] not in done]
+    if not pending:
+        return
+    conversations = fetch_conversations(client, [session["id"] for session in pending])
+
+    futures = {
+        executor.submit(reanalyze_session, session, conversations.get(session["id"], [])): session["id"]
+        for session in pending
+    }
+    for future in as_completed(futures):
+        session_id = futures[future]
+        try:
+            checkpoint.record(session_id, future.result())
+        except Exception as e:
+            checkpoint.record(session_id, "failed", str(e))
+            print(f"❌ 재해석 실패 ({session_id}): {str(e)}")
+
+def run(checkpoint: Checkpoint, concurrency: int = 4, page_size: int = 100, limit: int = None,
+        retry_failed: bool = False) -> dict:
+    """
+    완료된 세션을 다시 해석합니다. 체크포인트에 이미 처리한 부분은 건너뜁니다.
+
+    Args:
+        checkpoint: 진행 상황 파일
+        concurrency: 동시에 해석할 세션 수
+        page_size: 한 번에 가져올 세션 수
+        limit: 이번 실행에서 처리할 최대 세션 수 (시험 실행용)
+        retry_failed: 새 세션 대신 체크포인트의 실패한 세션만 다시 처리
+
+    Returns:
+        이번 실행의 {"processed", "skipped", "failed", "seconds", "prompt_tokens", "completion_tokens"}
+    """
+    from utils.supabase_helper import get_supabase_client
+
+    client = get_supabase_client()
+    data = checkpoint.data
+    before = {key: data[key] for key in ("processed", "skipped")}
+    usage_before = _usage()
+    started = time.perf_counter()
+    handled = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="reanalyze") as executor:
+        try:
+            if retry_failed:
+                session_ids = sorted(data["failed"])[:limit]
+                for offset in range(0, len(session_ids), page_size):
+                    sessions = fetch_sessions(client, session_ids[offset:offset + page_size])
+                    _process(client, checkpoint, sessions, executor, skip_done=False)
+            else:
+                while not data["finished"] and (limit is None or handled < limit):
+                    size = page_size if limit is None else min(page_size, limit - handled)
+                    sessions = fetch_page(client, data["until"], data["cursor"], size)
+                    if not sessions:
+                        data["finished"] = True
+                        break
+                    _process(client, checkpoint, sessions, executor)
+                    handled += len(sessions)
+                    checkpoint.next_page(sessions[-1]["id"])
+                    print(f"🔄 재해석 진행: 누적 {data['processed']}개 완료, 실패 {len(data['failed'])}개")
+        finally:
+            elapsed = time.perf_counter() - started
+            prompt_tokens, completion_tokens = (now - then for now, then in zip(_usage(), usage_before))
+            data["elapsed_seconds"] += elapsed
+            data["prompt_tokens"] += prompt_tokens
+            data["completion_tokens"] += completion_tokens
+            checkpoint.save()
+
+    return {
+        "processed": data["processed"] - before["processed"],
+        "skipped": data["skipped"] - before["skipped"],
+        "failed": checkpoint.run_failed,
+        "seconds": elapsed,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+    }
+
+def estimate_cost(prompt_tokens: int, completion_tokens: int, input_price: float, output_price: float) -> float:
+    """토큰 수와 100만 토큰당 가격(USD)으로 비용을 계산합니다."""
+    return prompt_tokens / 1_000_000 * input_price + completion_tokens / 1_000_000 * output_price
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="저장된 세션 사주 결과 일괄 재해석")
+    parser.add_argument("--concurrency", type=int, default=4, help="동시에 해석할 세션 수")
+    parser.add_argument("--rate-per-minute", type=float, default=60, help="분당 최대 해석 요청 수")
+    parser.add_argument("--page-size", type=int, default=100, help="한 번에 가져올 세션 수")
+    parser.add_argument("--limit", type=int, help="이번 실행에서 처리할 최대 세션 수")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="진행 상황 파일")
+    parser.add_argument("--restart", action="store_true", help="체크포인트를 지우고 처음부터 시작")
+    parser.add_argument("--retry-failed", action="store_true", help="체크포인트의 실패한 세션만 다시 처리")
+    parser.add_argument("--input-price", type=float, default=0.15, help="입력 100만 토큰당 가격(USD)")
+    parser.add_argument("--output-price", type=float, default=0.60, help="출력 100만 토큰당 가격(USD)")
+    args = parser.parse_args(argv)
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    checkpoint = Checkpoint(args.checkpoint)
+    if checkpoint.data["cursor"] or checkpoint.data["processed"]:
+        print(f"🔄 체크포인트에서 이어서 실행합니다: {args.checkpoint} (누적 {checkpoint.data['processed']}개 완료)")
+    _limit_rate(args.concurrency, args.rate_per_minute)
+
+    report = run(checkpoint, args.concurrency, args.page_size, args.limit, args.retry_failed)
+    data = checkpoint.data
+    cost = estimate_cost(report["prompt_tokens"], report["completion_tokens"], args.input_price, args.output_price)
+    total_cost = estimate_cost(data["prompt_tokens"], data["completion_tokens"], args.input_price, args.output_price)
+    throughput = report["processed"] / report["seconds"] * 60 if report["seconds"] else 0.0
+
+    print(f"\n✅ 이번 실행: 완료 {report['processed']}개 · 건너뜀 {report['skipped']}개 · 실패 {report['failed']}개 · "
+          f"{report['seconds']:.1f}s ({throughput:.1f}개/분)")
+    print(f"   토큰 입력 {report['prompt_tokens']:,} · 출력 {report['completion_tokens']:,} · 예상 비용 ${cost:.4f}")
+    print(f"   누적: 완료 {data['processed']}개 · 실패 {len(data['failed'])}개 · 예상 비용 ${total_cost:.4f}"
+          f"{' · 전체 완료' if data['finished'] else ''}")
+    for session_id, error in list(data["failed"].items())[:10]:
+        print(f"   ❌ {session_id}: {error}")
+    if data["failed"]:
+        print("   실패한 세션은 --retry-failed 로 다시 처리할 수 있습니다.")
+    return 1 if data["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
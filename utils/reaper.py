@@ -0,0 +1,320 @@
+"""
+버려진 세션 정리
+탭을 닫거나 "새로운 상담 시작"을 눌러 끝나지 않은 세션은 계속 active로 남고,
+세션을 만들지 못한 인물 행과 그 이미지도 쌓입니다. 이 모듈은 주기적으로 다음을 정리합니다.
+
+- 마지막 메시지(없으면 시작 시각) 이후 TTL이 지난 active 세션을 한 번에 expired로 바꿉니다.
+  --delete-empty 를 주면 손님이 한 마디도 하지 않은 세션은 만료 대신 대화와 함께 지웁니다.
+- --collect-orphans: 어떤 세션에서도 쓰지 않는 인물 행과 그 Storage 이미지를 지웁니다.
+- --storage-scan: 인물 행이 없는 Storage 이미지(업로드 후 인물이 지워진 경우 등)를 지웁니다.
+
+실행:
+    python -m utils.reaper --dry-run                           # 정리 대상만 세어 봅니다
+    python -m utils.reaper --idle-minutes 120 --collect-orphans
+    python -m utils.reaper --interval 15 --collect-orphans     # 15분마다 계속 실행 (cron 대신)
+"""
+
+import os
+import json
+import time
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from utils import metrics
+
+# 마지막 활동 이후 이 시간이 지나면 버려진 세션으로 봅니다
+SESSION_TTL_MINUTES = float(os.getenv("SESSION_TTL_MINUTES", "120"))
+# 한 번에 살펴볼 행 수
+REAP_BATCH = 200
+# 만든 지 이 시간이 안 된 인물/이미지는 세션 생성 중일 수 있으므로 건드리지 않습니다
+ORPHAN_GRACE = timedelta(hours=1)
+# 이 기간 안에 만든 인물만 살펴봅니다 (인물은 만들 때만 고아가 되므로 매번 전체를 훑지 않습니다, 0이면 전체)
+ORPHAN_WINDOW_HOURS = 48
+IMAGE_BUCKET = "character-images"
+IMAGE_FOLDER = "characters"
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.astimezone(timezone.utc)
+
+def _rate(count: int, seconds: float) -> float:
+    return round(count / seconds, 1) if seconds else 0.0
+
+def _activity(client, session_ids: list) -> dict:
+    """
+    세션별 마지막 메시지 시각과 손님 메시지 수를 읽습니다.
+    대화 행을 모두 읽으면 PostgREST 행 수 제한에 잘리므로 서버에서 세션별로 집계합니다 (session_activity 함수).
+
+    Returns:
+        {세션 id: {"last": datetime, "user_messages": int}} (메시지가 없는 세션은 빠짐)
+    """
+    rows = client.rpc("session_activity", {"p_session_ids": session_ids}).execute().data or []
+    return {
+        row["session_id"]: {
+            "last": _parse_time(row["last_message_at"]) if row.get("last_message_at") else None,
+            "user_messages": int(row.get("user_messages") or 0),
+        }
+        for row in rows
+    }
+
+def reap_sessions(client, ttl: timedelta, batch: int = REAP_BATCH, limit: int = None,
+                  dry_run: bool = False, delete_empty: bool = False) -> dict:
+    """
+    마지막 활동 이후 ttl이 지난 active 세션을 id 순서로 훑으며 만료 처리합니다.
+
+    Args:
+        client: Supabase 클라이언트
+        ttl: 버려진 세션으로 보는 유휴 시간
+        batch: 한 번에 살펴볼 세션 수
+        limit: 이번 실행에서 살펴볼 최대 세션 수
+        dry_run: True면 세기만 하고 바꾸지 않습니다
+        delete_empty: True면 손님 메시지가 없는 세션은 만료 대신 지웁니다
+
+    Returns:
+        {"scanned", "expired", "deleted", "seconds", "per_second", "character_ids": 지운 세션의 인물 id 리스트}
+    """
+    from utils.supabase_helper import expire_sessions, delete_sessions
+
+    cutoff = datetime.now(timezone.utc) - ttl
+    totals = {"scanned": 0, "expired": 0, "deleted": 0, "character_ids": []}
+    cursor = None
+    started = time.perf_counter()
+
+    while limit is None or totals["scanned"] < limit:
+        # 시작한 지 ttl이 안 된 세션은 유휴 시간이 ttl을 넘을 수 없습니다
+        query = client.table("sessions").select("id, character_id, started_at")\
+            .eq("status", "active").lt("started_at", cutoff.isoformat())
+        if cursor:
+            query = query.gt("id", cursor)
+        size = batch if limit is None else min(batch, limit - totals["scanned"])
+        sessions = query.order("id").limit(size).execute().data or []
+        if not sessions:
+            break
+        totals["scanned"] += len(sessions)
+        cursor = sessions[-1]["id"]
+
+        activity = _activity(client, [session["id"] for session in sessions])
+        idle, empty = [], []
+        for session in sessions:
+            entry = activity.get(session["id"], {"last": None, "user_messages": 0})
+            last = max(filter(None, (entry["last"], _parse_time(session["started_at"]))))
+            if last >= cutoff:
+                continue
+            if delete_empty and not entry["user_messages"]:
+                empty.append(session)
+            else:
+                idle.append(session)
+
+        if dry_run:
+            totals["expired"] += len(idle)
+            totals["deleted"] += len(empty)
+        else:
+            totals["expired"] += expire_sessions([session["id"] for session in idle])
+            # 지울 때 조건을 다시 확인하므로, 그 사이 대화가 시작된 세션은 남습니다
+            deleted = delete_sessions([session["id"] for session in empty], idle_before=cutoff.isoformat())
+            totals["deleted"] += deleted
+            if deleted:
+                totals["character_ids"] += [session["character_id"] for session in empty if session.get("character_id")]
+
+    totals["seconds"] = time.perf_counter() - started
+    totals["per_second"] = _rate(totals["scanned"], totals["seconds"])
+    if not dry_run:
+        metrics.incr("reaper.sessions.scanned", totals["scanned"])
+        metrics.incr("reaper.sessions.expired", totals["expired"])
+        metrics.incr("reaper.sessions.deleted", totals["deleted"])
+        metrics.observe("reaper.sessions.seconds", totals["seconds"])
+    return totals
+
+def _orphans(client, characters: list) -> list:
+    """characters 중 어떤 세션에서도 쓰지 않는 인물만 남깁니다."""
+    if not characters:
+        return []
+    used = {
+        row["character_id"]
+        for row in client.table("sessions").select("character_id")
+            .in_("character_id", [character["id"] for character in characters]).execute().data or []
+    }
+    return [character for character in characters if character["id"] not in used]
+
+def _delete_orphans(client, characters: list, dry_run: bool, totals: dict) -> None:
+    from utils.supabase_helper import character_image_paths, delete_characters
+
+    orphans = _orphans(client, characters)
+    if dry_run:
+        totals["characters"] += len(orphans)
+        totals["images"] += sum(len(character_image_paths(character)) for character in orphans)
+        return
+    deleted = delete_characters(orphans)
+    totals["characters"] += deleted["characters"]
+    totals["images"] += deleted["images"]
+
+def collect_orphans(client, batch: int = REAP_BATCH, limit: int = None, dry_run: bool = False,
+                    window_hours: float = ORPHAN_WINDOW_HOURS, character_ids: list = None) -> dict:
+    """
+    세션에서 쓰지 않는 인물 행과 그 이미지를 지웁니다.
+
+    Args:
+        client: Supabase 클라이언트
+        batch: 한 번에 살펴볼 인물 수
+        limit: 이번 실행에서 살펴볼 최대 인물 수
+        dry_run: True면 세기만 하고 지우지 않습니다
+        window_hours: 이 시간 안에 만든 인물만 훑습니다 (0이면 전체)
+        character_ids: 기간과 상관없이 함께 확인할 인물 id (이번 실행에서 지운 세션의 인물)
+
+    Returns:
+        {"scanned", "characters", "images", "seconds", "per_second"}
+    """
+    columns = "id, image_url, image_variants"
+    now = datetime.now(timezone.utc)
+    totals = {"scanned": 0, "characters": 0, "images": 0}
+    started = time.perf_counter()
+
+    if character_ids:
+        for offset in range(0, len(character_ids), batch):
+            characters = client.table("characters").select(columns)\
+                .in_("id", character_ids[offset:offset + batch]).execute().data or []
+            totals["scanned"] += len(characters)
+            _delete_orphans(client, characters, dry_run, totals)
+
+    cursor = None
+    while limit is None or totals["scanned"] < limit:
+        query = client.table("characters").select(columns)\
+            .lt("created_at", (now - ORPHAN_GRACE).isoformat())
+        if window_hours:
+            query = query.gt("created_at", (now - timedelta(hours=window_hours)).isoformat())
+        if cursor:
+            query = query.gt("id", cursor)
+        size = batch if limit is None else min(batch, limit - totals["scanned"])
+        characters = query.order("id").limit(size).execute().data or []
+        if not characters:
+            break
+        totals["scanned"] += len(characters)
+        cursor = characters[-1]["id"]
+        _delete_orphans(client, characters, dry_run, totals)
+
+    totals["seconds"] = time.perf_counter() - started
+    totals["per_second"] = _rate(totals["scanned"], totals["seconds"])
+    if not dry_run:
+        metrics.incr("reaper.characters.scanned", totals["scanned"])
+        metrics.incr("reaper.characters.deleted", totals["characters"])
+        metrics.incr("reaper.images.deleted", totals["images"])
+        metrics.observe("reaper.characters.seconds", totals["seconds"])
+    return totals
+
+def scan_storage(client, batch: int = REAP_BATCH, dry_run: bool = False) -> dict:
+    """
+    인물 행이 없는 Storage 이미지를 지웁니다. 파일 이름은 "<인물 id>_<시각>[_<크기>].<확장자>" 형식입니다.
+
+    Returns:
+        {"scanned", "images", "seconds", "per_second"}
+    """
+    bucket = client.storage.from_(IMAGE_BUCKET)
+    cutoff = datetime.now(timezone.utc) - ORPHAN_GRACE
+    totals = {"scanned": 0, "images": 0}
+    started = time.perf_counter()
+
+    # 목록을 다 읽은 뒤 지웁니다 (읽는 도중에 지우면 offset이 밀립니다)
+    files, offset = [], 0
+    while True:
+        page = bucket.list(IMAGE_FOLDER, {"limit": batch, "offset": offset, "sortBy": {"column": "name", "order": "asc"}})
+        if not page:
+            break
+        files += page
+        offset += len(page)
+        if len(page) < batch:
+            break
+    totals["scanned"] = len(files)
+
+    by_character = {}
+    for entry in files:
+        created_at = entry.get("created_at")
+        if "_" not in entry["name"] or (created_at and _parse_time(created_at) >= cutoff):
+            continue
+        by_character.setdefault(entry["name"].split("_", 1)[0], []).append(f"{IMAGE_FOLDER}/{entry['name']}")
+
+    character_ids = list(by_character)
+    for start in range(0, len(character_ids), batch):
+        chunk = character_ids[start:start + batch]
+        existing = {
+            row["id"] for row in client.table("characters").select("id").in_("id", chunk).execute().data or []
+        }
+        paths = [path for character_id in chunk if character_id not in existing for path in by_character[character_id]]
+        if paths and not dry_run:
+            bucket.remove(paths)
+        totals["images"] += len(paths)
+
+    totals["seconds"] = time.perf_counter() - started
+    totals["per_second"] = _rate(totals["scanned"], totals["seconds"])
+    if not dry_run:
+        metrics.incr("reaper.storage.deleted", totals["images"])
+        metrics.observe("reaper.storage.seconds", totals["seconds"])
+    return totals
+
+def run(client, ttl: timedelta, batch: int = REAP_BATCH, limit: int = None, dry_run: bool = False,
+        delete_empty: bool = False, orphans: bool = False, window_hours: float = ORPHAN_WINDOW_HOURS,
+        storage: bool = False) -> dict:
+    """
+    세션 만료 → (선택) 고아 인물 정리 → (선택) Storage 정리를 한 번 실행합니다.
+
+    Returns:
+        단계별 결과 딕셔너리 {"sessions", "orphans", "storage"}
+    """
+    report = {"sessions": reap_sessions(client, ttl, batch, limit, dry_run, delete_empty)}
+    character_ids = report["sessions"].pop("character_ids")
+    if orphans:
+        report["orphans"] = collect_orphans(client, batch, limit, dry_run, window_hours, character_ids)
+    if storage:
+        report["storage"] = scan_storage(client, batch, dry_run)
+    return report
+
+def _print_report(report: dict, dry_run: bool) -> None:
+    verb = "대상" if dry_run else "처리"
+    sessions = report["sessions"]
+    print(f"{'🔍' if dry_run else '✅'} 세션 {sessions['scanned']}개 확인 · 만료 {verb} {sessions['expired']}개 · "
+          f"삭제 {verb} {sessions['deleted']}개 ({sessions['seconds']:.1f}s, {sessions['per_second']:.0f}개/s)")
+    if "orphans" in report:
+        orphans = report["orphans"]
+        print(f"{'🔍' if dry_run else '✅'} 인물 {orphans['scanned']}개 확인 · 고아 인물 {verb} {orphans['characters']}개, "
+              f"이미지 {orphans['images']}개 ({orphans['seconds']:.1f}s, {orphans['per_second']:.0f}개/s)")
+    if "storage" in report:
+        storage = report["storage"]
+        print(f"{'🔍' if dry_run else '✅'} 이미지 파일 {storage['scanned']}개 확인 · 인물 없는 이미지 {verb} "
+              f"{storage['images']}개 ({storage['seconds']:.1f}s, {storage['per_second']:.0f}개/s)")
+
+def main(argv: list = None) -> dict:
+    parser = argparse.ArgumentParser(description="버려진 세션과 고아 인물/이미지 정리")
+    parser.add_argument("--idle-minutes", type=float, default=SESSION_TTL_MINUTES,
+                        help="마지막 활동 이후 이 시간이 지난 active 세션을 만료 처리")
+    parser.add_argument("--batch", type=int, default=REAP_BATCH, help="한 번에 살펴볼 행 수")
+    parser.add_argument("--limit", type=int, help="단계별로 이번 실행에서 살펴볼 최대 행 수")
+    parser.add_argument("--dry-run", action="store_true", help="바꾸지 않고 정리 대상만 셉니다")
+    parser.add_argument("--delete-empty", action="store_true", help="손님 메시지가 없는 세션은 만료 대신 삭제")
+    parser.add_argument("--collect-orphans", action="store_true", help="세션에서 쓰지 않는 인물과 이미지 삭제")
+    parser.add_argument("--orphan-window-hours", type=float, default=ORPHAN_WINDOW_HOURS,
+                        help="이 시간 안에 만든 인물만 확인 (0이면 전체)")
+    parser.add_argument("--storage-scan", action="store_true", help="인물 행이 없는 Storage 이미지 삭제 (버킷 전체 목록 조회)")
+    parser.add_argument("--interval", type=float, help="이 간격(분)마다 계속 실행")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    args = parser.parse_args(argv)
+
+    from utils.supabase_helper import get_supabase_client
+
+    client = get_supabase_client()
+    while True:
+        report = run(
+            client, timedelta(minutes=args.idle_minutes), args.batch, args.limit, args.dry_run,
+            args.delete_empty, args.collect_orphans, args.orphan_window_hours, args.storage_scan
+        )
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            _print_report(report, args.dry_run)
+        if not args.interval:
+            return report
+        try:
+            time.sleep(args.interval * 60)
+        except KeyboardInterrupt:
+            return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+로컬 SQLite 읽기 복제본
+세션(인물, 끝난 세션은 대화와 사주 결과 포함)을 로컬 SQLite 파일에 복제해 두고
+상담 기록 목록/상세 화면을 Supabase 왕복 없이 바로 보여줍니다.
+
+- 백그라운드 스레드가 started_at / ended_at 기준 high-water mark 이후에 시작했거나 끝난 세션을
+  상태와 관계없이 주기적으로 가져옵니다. (목록은 get_all_sessions 처럼 진행 중/만료 세션도 보여 줌)
+- 다시 저장된 사주 결과(fortune_results.updated_at)도 가져와 저장된 상세 정보의 결과를 바꿉니다.
+- 이 프로세스가 쓰는 세션/인물/결과는 supabase_helper 가 바로 복제본에도 반영합니다. (write-through)
+- 복제본에 없는 상세 정보는 Supabase에서 읽어 온 뒤 저장합니다. (read-through)
+
+설정:
+    REPLICA_PATH           복제본 파일 경로 (기본값 data/replica.db, 빈 값이면 사용 안 함)
+    REPLICA_SYNC_INTERVAL  동기화 주기(초, 기본값 30)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+from utils import metrics
+from utils.archive import load_conversations
+
+REPLICA_PATH = os.getenv("REPLICA_PATH", os.path.join("data", "replica.db"))
+SYNC_INTERVAL = float(os.getenv("REPLICA_SYNC_INTERVAL", "30"))
+# 한 번에 가져올 세션 수
+SYNC_BATCH = 200
+# 서버마다 시계가 조금씩 다를 수 있으므로 high-water mark보다 이만큼 앞에서부터 다시 가져옵니다 (upsert라 중복은 무해)
+SYNC_OVERLAP = timedelta(minutes=5)
+# 첫 동기화의 시작 위치
+SYNC_EPOCH = "1970-01-01T00:00:00+00:00"
+# 완료 직후에는 사주 결과가 아직 저장 중일 수 있으므로, 이 시간 안의 결과 없는 세션은 상세 정보 없이 저장합니다
+# (상세는 조회할 때 Supabase에서 읽고, 나중에 저장된 결과는 fortune_results.updated_at 동기화가 반영)
+RESULT_GRACE = timedelta(minutes=10)
+
+# 목록 화면에 필요한 인물 컬럼 (supabase_helper.get_all_sessions 와 동일)
+SUMMARY_CHARACTER_COLUMNS = ("name", "age", "gender", "occupation")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    character_id TEXT,
+    status TEXT,
+    started_at TEXT,
+    ended_at TEXT,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_replica_sessions_user ON sessions (user_id, started_at DESC);
+CREATE INDEX IF NOT EXISTS idx_replica_sessions_character ON sessions (character_id);
+CREATE TABLE IF NOT EXISTS characters (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def _parse_time(value: str) -> datetime:
+    """Supabase 시각 문자열을 시간대가 있는 datetime으로 바꿉니다. (시간대 없는 값은 UTC로 봄)"""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+_SESSION_COLUMNS = ("id", "user_id", "character_id", "status", "started_at", "ended_at")
+
+class SQLiteReplica:
+    """세션의 로컬 읽기 복제본. 스레드마다 연결을 하나씩 열어 재사용합니다."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            # 복제본은 언제든 Supabase에서 다시 만들 수 있으므로 fsync를 줄입니다
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---- 메타 정보 ----
+
+    def _get_meta(self, key: str) -> str:
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_meta(self, conn, key: str, value: str) -> None:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+    def is_warm(self) -> bool:
+        """첫 전체 동기화가 끝났는지 여부 (끝나기 전에는 목록을 Supabase에서 읽습니다)"""
+        return self._get_meta("warm") == "1"
+
+    # ---- 읽기 ----
+
+    def list_sessions(self, user_id: str, limit: int) -> list:
+        """
+        사용자의 최근 세션 목록을 반환합니다.
+
+        Returns:
+            get_all_sessions 와 같은 형태의 리스트, 복제본이 아직 준비되지 않았으면 None
+        """
+        if not self.is_warm():
+            return None
+        rows = self._connect().execute(
+            """
+            SELECT s.id, s.user_id, s.character_id, s.status, s.started_at, s.ended_at, c.data AS character
+            FROM sessions s LEFT JOIN characters c ON c.id = s.character_id
+            WHERE s.user_id = ?
+            ORDER BY s.started_at DESC
+            LIMIT ?
+            """,
+            (user_id, limit)
+        ).fetchall()
+
+        sessions = []
+        for row in rows:
+            session = {column: row[column] for column in _SESSION_COLUMNS}
+            character = json.loads(row["character"]) if row["character"] else None
+            session["characters"] = {c: character.get(c) for c in SUMMARY_CHARACTER_COLUMNS} if character else None
+            sessions.append(session)
+        return sessions
+
+    def get_detail(self, session_id: str) -> dict:
+        """저장된 세션 상세 정보 (없으면 None)"""
+        row = self._connect().execute("SELECT detail FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None or row["detail"] is None:
+            return None
+        return json.loads(row["detail"])
+
+    # ---- 쓰기 ----
+
+    def _upsert_session(self, conn, session: dict, detail: dict = None) -> None:
+        conn.execute(
+            """
+            INSERT INTO sessions (id, user_id, character_id, status, started_at, ended_at, detail)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                user_id = excluded.user_id, character_id = excluded.character_id, status = excluded.status,
+                started_at = excluded.started_at, ended_at = excluded.ended_at,
+                detail = COALESCE(excluded.detail, sessions.detail)
+            """,
+            tuple(session.get(column) for column in _SESSION_COLUMNS)
+            + (json.dumps(detail, ensure_ascii=False) if detail is not None else None,)
+        )
+
+    def _upsert_character(self, conn, character: dict) -> None:
+        conn.execute(
+            "INSERT INTO characters (id, data) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET data = excluded.data",
+            (character["id"], json.dumps(character, ensure_ascii=False))
+        )
+
+    def put_character(self, character: dict) -> None:
+        """인물 정보를 저장합니다. (id 필수)"""
+        with self._connect() as conn:
+            self._upsert_character(conn, character)
+
+    def update_character(self, character_id: str, fields: dict) -> None:
+        """저장된 인물 정보 일부를 바꾸고, 그 인물이 들어 있는 상세 정보를 비웁니다."""
+        conn = self._connect()
+        row = conn.execute("SELECT data FROM characters WHERE id = ?", (character_id,)).fetchone()
+        with conn:
+            if row is not None:
+                self._upsert_character(conn, {**json.loads(row["data"]), **fields})
+            conn.execute("UPDATE sessions SET detail = NULL WHERE character_id = ?", (character_id,))
+
+    def put_session(self, session: dict) -> None:
+        """세션 행을 저장합니다. (저장된 상세 정보는 유지)"""
+        with self._connect() as conn:
+            self._upsert_session(conn, session)
+
+    def mark_session(self, session_id: str, status: str, ended_at: str = None) -> None:
+        """세션 상태를 바꾸고 상세 정보를 비웁니다. (복제본에 없는 세션이면 아무것도 하지 않음)"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE sessions SET status = ?, ended_at = COALESCE(?, ended_at), detail = NULL WHERE id = ?",
+                (status, ended_at, session_id)
+            )
+
+    def delete_sessions(self, session_ids: list) -> None:
+        """세션 행을 지웁니다."""
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM sessions WHERE id = ?", [(session_id,) for session_id in session_ids])
+
+    def delete_characters(self, character_ids: list) -> None:
+        """인물 행을 지웁니다."""
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM characters WHERE id = ?", [(character_id,) for character_id in character_ids])
+
+    def put_detail(self, detail: dict) -> None:
+        """get_session_detail 결과를 세션/인물 행과 함께 저장합니다."""
+        with self._connect() as conn:
+            if detail.get("characters") and detail["characters"].get("id"):
+                self._upsert_character(conn, detail["characters"])
+            self._upsert_session(conn, detail, detail)
+
+    def invalidate_detail(self, session_id: str) -> None:
+        """세션의 상세 정보를 비웁니다. 다음 조회 때 Supabase에서 다시 읽습니다."""
+        with self._connect() as conn:
+            conn.execute("UPDATE sessions SET detail = NULL WHERE id = ? AND detail IS NOT NULL", (session_id,))
+
+    def _patch_result(self, conn, result: dict) -> None:
+        """저장된 상세 정보의 사주 결과를 바꿉니다. (상세가 없으면 조회할 때 Supabase에서 읽으므로 그대로 둠)"""
+        row = conn.execute("SELECT detail FROM sessions WHERE id = ?", (result["session_id"],)).fetchone()
+        if row is None or row["detail"] is None:
+            return
+        detail = json.loads(row["detail"])
+        if detail.get("fortune_result") == result:
+            return
+        detail["fortune_result"] = result
+        conn.execute(
+            "UPDATE sessions SET detail = ? WHERE id = ?",
+            (json.dumps(detail, ensure_ascii=False), result["session_id"])
+        )
+
+    # ---- 동기화 ----
+
+    def _pages(self, client, column: str, since: str, select: str, table: str = "sessions"):
+        """
+        column 값이 since 이후인 행을 (column, id) 순서의 키셋 페이지로 차례로 돌려줍니다.
+        같은 시각의 행이 한 페이지보다 많아도 (만료 처리는 한 번에 같은 ended_at을 씁니다) id로 이어서 읽습니다.
+        """
+        at, last_id = since, None
+        while True:
+            if last_id is not None:
+                # 직전 페이지의 마지막 시각과 같은 나머지 행
+                rows = client.table(table).select(select).eq(column, at).gt("id", last_id)\
+                    .order("id").limit(SYNC_BATCH).execute().data or []
+                if len(rows) < SYNC_BATCH:
+                    rows += client.table(table).select(select).gt(column, at)\
+                        .order(column).order("id").limit(SYNC_BATCH - len(rows)).execute().data or []
+            else:
+                rows = client.table(table).select(select).gt(column, at)\
+                    .order(column).order("id").limit(SYNC_BATCH).execute().data or []
+            if not rows:
+                return
+            yield rows
+            if len(rows) < SYNC_BATCH:
+                return
+            at, last_id = rows[-1][column], rows[-1]["id"]
+
+    def _since(self, key: str) -> str:
+        """동기화 시작 위치: 저장된 mark보다 SYNC_OVERLAP 앞 (서버 간 시계 차이 대비, upsert라 중복은 무해)"""
+        mark = self._get_meta(key)
+        if not mark:
+            return SYNC_EPOCH
+        return (_parse_time(mark) - SYNC_OVERLAP).isoformat()
+
+    def sync_once(self, client) -> int:
+        """
+        high-water mark 이후에 시작했거나 끝난 세션을 가져와 복제본에 반영합니다. (상태와 관계없이)
+
+        - started_at 기준: 새로 시작한 세션 행 (다른 서버에서 연 진행 중 세션 포함)
+        - ended_at 기준: 완료되었거나 만료된 세션의 상태와 상세 정보 (대화, 사주 결과)
+        - fortune_results.updated_at 기준: 나중에 저장되었거나 다시 해석된 사주 결과
+
+        Args:
+            client: Supabase 클라이언트
+
+        Returns:
+            반영한 세션 수
+        """
+        synced = 0
+
+        mark = None
+        for sessions in self._pages(client, "started_at", self._since("started_mark"), "*, characters(*)"):
+            with self._connect() as conn:
+                for session in sessions:
+                    if session.get("characters"):
+                        self._upsert_character(conn, session["characters"])
+                    self._upsert_session(conn, session)
+                    mark = max(mark or "", session.get("started_at") or "")
+                    synced += 1
+                if mark:
+                    self._set_meta(conn, "started_mark", mark)
+
+        mark = None
+        recent = datetime.now(timezone.utc) - RESULT_GRACE
+        for sessions in self._pages(client, "ended_at", self._since("high_water_mark"), "*, characters(*)"):
+            ids = [session["id"] for session in sessions]
+            by_session = load_conversations(client, ids)
+            results = client.table("fortune_results").select("*").in_("session_id", ids).execute().data or []
+            result_by_session = {result["session_id"]: result for result in results}
+
+            with self._connect() as conn:
+                for session in sessions:
+                    result = result_by_session.get(session["id"])
+                    detail = {**session, "conversations": by_session.get(session["id"], []), "fortune_result": result}
+                    if result is None and session.get("status") == "completed" and _parse_time(session["ended_at"]) > recent:
+                        # 결과가 아직 저장되지 않았을 수 있습니다: 상세 없이 행만 저장하고 계속합니다
+                        # (결과가 저장되면 아래 fortune_results 동기화가 가져옵니다)
+                        detail = None
+                        metrics.incr("replica.result_pending")
+                    if session.get("characters"):
+                        self._upsert_character(conn, session["characters"])
+                    self._upsert_session(conn, session, detail)
+                    mark = max(mark or "", session.get("ended_at") or "")
+                    synced += 1
+                if mark:
+                    self._set_meta(conn, "high_water_mark", mark)
+
+        mark = None
+        for results in self._pages(client, "updated_at", self._since("result_mark"), "*", table="fortune_results"):
+            with self._connect() as conn:
+                for result in results:
+                    self._patch_result(conn, result)
+                    mark = max(mark or "", result.get("updated_at") or "")
+                if mark:
+                    self._set_meta(conn, "result_mark", mark)
+
+        with self._connect() as conn:
+            self._set_meta(conn, "synced_at", datetime.now(timezone.utc).isoformat())
+            self._set_meta(conn, "warm", "1")
+        return synced
+
+_replica = None
+_replica_lock = threading.Lock()
+_sync_thread = None
+
+def get_replica() -> SQLiteReplica:
+    """프로세스 공용 복제본을 반환합니다. REPLICA_PATH가 비어 있거나 열 수 없으면 None"""
+    global _replica
+    if not REPLICA_PATH:
+        return None
+    if _replica is None:
+        with _replica_lock:
+            if _replica is None:
+                try:
+                    _replica = SQLiteReplica(REPLICA_PATH)
+                except Exception as e:
+                    print(f"⚠️ 로컬 복제본을 열 수 없습니다: {str(e)}")
+                    return None
+    return _replica
+
+def _sync_loop(client_factory) -> None:
+    while True:
+        replica = get_replica()
+        started = time.perf_counter()
+        try:
+            synced = replica.sync_once(client_factory())
+            metrics.observe("replica.sync_seconds", time.perf_counter() - started)
+            if synced:
+                metrics.incr("replica.synced_sessions", synced)
+                print(f"✅ 로컬 복제본 동기화: 세션 {synced}개")
+        except Exception as e:
+            metrics.incr("replica.sync_failed")
+            print(f"⚠️ 로컬 복제본 동기화 실패: {str(e)}")
+        time.sleep(SYNC_INTERVAL)
+
+def start_sync(client_factory) -> None:
+    """
+    백그라운드 동기화 스레드를 시작합니다. 프로세스당 한 번만 시작하며, 이미 돌고 있으면 아무것도 하지 않습니다.
+
+    Args:
+        client_factory: Supabase 클라이언트를 돌려주는 함수 (supabase_helper.get_supabase_client)
+    """
+    global _sync_thread
+    if _sync_thread is not None or get_replica() is None:
+        return
+    with _replica_lock:
+        if _sync_thread is None:
+            _sync_thread = threading.Thread(target=_sync_loop, args=(client_factory,), name="replica-sync", daemon=True)
+            _sync_thread.start()
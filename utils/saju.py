@@ -0,0 +1,149 @@
+"""
+사주 기초 계산 모듈
+생년월일시에서 천간/지지와 오행을 구합니다.
+"""
+
+from datetime import date
+
+# 천간(天干)과 지지(地支)
+HEAVENLY_STEMS = ("갑", "을", "병", "정", "무", "기", "경", "신", "임", "계")
+EARTHLY_BRANCHES = ("자", "축", "인", "묘", "진", "사", "오", "미", "신", "유", "술", "해")
+
+# 오행(五行)
+ELEMENTS = ("목", "화", "토", "금", "수")
+
+# 천간의 오행: 갑을=목, 병정=화, 무기=토, 경신=금, 임계=수
+STEM_ELEMENTS = tuple(ELEMENTS[i // 2] for i in range(10))
+# 지지의 오행: 자=수, 축=토, 인묘=목, 진=토, 사오=화, 미=토, 신유=금, 술=토, 해=수
+BRANCH_ELEMENTS = ("수", "토", "목", "목", "토", "화", "화", "토", "금", "금", "토", "수")
+
+# 오행별 대표 색 (기본색, 밝은 색)
+ELEMENT_COLORS = {
+    "목": ("#4E8B57", "#CFE8C8"),
+    "화": ("#C8553D", "#F6D2C4"),
+    "토": ("#B8862B", "#F1E2B8"),
+    "금": ("#8C8C8C", "#ECECEC"),
+    "수": ("#2E4A7D", "#C9D6EC"),
+}
+
+def _parse_year(birth_date) -> int:
+    try:
+        return int(str(birth_date)[:4])
+    except (TypeError, ValueError):
+        return None
+
+def _parse_hour(birth_time) -> int:
+    try:
+        return int(str(birth_time).split(":")[0]) % 24
+    except (TypeError, ValueError):
+        return None
+
+def year_pillar(year: int) -> tuple:
+    """연주(年柱)의 (천간 인덱스, 지지 인덱스)를 반환합니다. 입춘 기준은 고려하지 않습니다."""
+    return (year - 4) % 10, (year - 4) % 12
+
+def hour_branch(hour: int) -> int:
+    """출생 시각(0-23시)의 지지 인덱스를 반환합니다. 자시는 23시-1시입니다."""
+    return ((hour + 1) // 2) % 12
+
+def birth_elements(birth_date, birth_time=None) -> dict:
+    """
+    생년월일시에서 대표 오행을 구합니다.
+
+    Args:
+        birth_date: 생년월일 (YYYY-MM-DD)
+        birth_time: 출생 시간 (HH:MM)
+
+    Returns:
+        {"primary": 연간의 오행, "secondary": 시지의 오행 (없으면 연지의 오행)}
+        생년을 알 수 없으면 "토"를 기본값으로 사용합니다.
+    """
+    year = _parse_year(birth_date)
+    if year is None:
+        return {"primary": "토", "secondary": "토"}
+
+    stem, branch = year_pillar(year)
+    hour = _parse_hour(birth_time)
+    secondary_branch = hour_branch(hour) if hour is not None else branch
+    return {
+        "primary": STEM_ELEMENTS[stem],
+        "secondary": BRANCH_ELEMENTS[secondary_branch],
+    }
+
+# 일주 계산 기준일: 1900-01-01은 갑술(甲戌)일입니다
+_DAY_PILLAR_EPOCH = date(1900, 1, 1)
+_DAY_PILLAR_EPOCH_STEM, _DAY_PILLAR_EPOCH_BRANCH = 0, 10
+# 절기(월의 경계)는 해마다 조금씩 다르지만 대개 매달 4-8일 사이입니다. 6일을 경계로 근사합니다.
+SOLAR_TERM_DAY = 6
+# 입춘(2월 4일경)부터 새해로 봅니다
+_NEW_YEAR = (2, 4)
+
+def _parse_date(birth_date) -> date:
+    try:
+        return date.fromisoformat(str(birth_date)[:10])
+    except (TypeError, ValueError):
+        return None
+
+def day_pillar(day: date) -> tuple:
+    """일주(日柱)의 (천간 인덱스, 지지 인덱스)를 반환합니다."""
+    offset = (day - _DAY_PILLAR_EPOCH).days
+    return (_DAY_PILLAR_EPOCH_STEM + offset) % 10, (_DAY_PILLAR_EPOCH_BRANCH + offset) % 12
+
+def month_pillar(year_stem: int, month: int, day: int) -> tuple:
+    """
+    월주(月柱)의 (천간 인덱스, 지지 인덱스)를 반환합니다. 절기 경계는 SOLAR_TERM_DAY로 근사합니다.
+
+    Args:
+        year_stem: 연간 인덱스 (입춘 기준 연도의 연간)
+        month: 양력 월
+        day: 양력 일
+    """
+    if day < SOLAR_TERM_DAY:
+        month = month - 1 or 12
+    branch = month % 12  # 2월(입춘 이후) = 인월
+    # 갑기년은 병인월, 을경년은 무인월 ... 로 시작합니다
+    first_stem = (year_stem % 5) * 2 + 2
+    return (first_stem + (branch - 2) % 12) % 10, branch
+
+def hour_pillar(day_stem: int, hour: int) -> tuple:
+    """시주(時柱)의 (천간 인덱스, 지지 인덱스)를 반환합니다. 갑기일은 갑자시부터 시작합니다."""
+    branch = hour_branch(hour)
+    return ((day_stem % 5) * 2 + branch) % 10, branch
+
+def birth_chart(birth_date, birth_time=None) -> dict:
+    """
+    생년월일시에서 사주팔자(연주, 월주, 일주, 시주)를 구합니다.
+
+    Args:
+        birth_date: 생년월일 (YYYY-MM-DD)
+        birth_time: 출생 시간 (HH:MM, 모르면 None)
+
+    Returns:
+        {"year", "month", "day", "hour"}: 각각 (천간 인덱스, 지지 인덱스), 시간을 모르면 "hour"는 None
+        생년월일을 알 수 없으면 None
+    """
+    birth = _parse_date(birth_date)
+    if birth is None:
+        return None
+
+    year = birth.year - ((birth.month, birth.day) < _NEW_YEAR)
+    year_stem, year_branch = year_pillar(year)
+    day_stem, day_branch = day_pillar(birth)
+    hour = _parse_hour(birth_time)
+    return {
+        "year": (year_stem, year_branch),
+        "month": month_pillar(year_stem, birth.month, birth.day),
+        "day": (day_stem, day_branch),
+        "hour": hour_pillar(day_stem, hour) if hour is not None else None,
+    }
+
+def element_counts(chart: dict) -> list:
+    """사주팔자의 천간/지지 오행 개수를 ELEMENTS 순서의 리스트로 반환합니다."""
+    counts = [0] * len(ELEMENTS)
+    for pillar in chart.values():
+        if pillar is None:
+            continue
+        stem, branch = pillar
+        counts[ELEMENTS.index(STEM_ELEMENTS[stem])] += 1
+        counts[ELEMENTS.index(BRANCH_ELEMENTS[branch])] += 1
+    return counts
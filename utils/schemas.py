@@ -0,0 +1,255 @@
+"""
+구조화 응답 검증 모듈
+OpenAI가 돌려준 인물 프로필과 사주 해석 JSON을 pydantic 모델로 검증합니다.
+흔한 결함(잘린 JSON, 잘못된 자료형, 범위를 벗어난 나이, 형식이 다른 날짜/시간)은 로컬에서 고치고,
+고칠 수 없는 항목만 빠진 항목(missing_fields)으로 남겨 다시 요청하게 합니다.
+"""
+
+import re
+import json
+import calendar
+from datetime import date
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, field_validator, model_validator
+
+from utils.json_stream import IncrementalJSONParser
+
+AGE_MIN = 20
+AGE_MAX = 60
+
+_GENDER_ALIASES = {
+    "남성": ("남성", "남", "남자", "male", "m", "man"),
+    "여성": ("여성", "여", "여자", "female", "f", "woman"),
+}
+
+def _coerce_text(value) -> Optional[str]:
+    """문자열 항목: 목록/객체로 온 값은 이어 붙이고, 빈 값은 None으로 바꿉니다."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (list, tuple)):
+        value = " ".join(str(item).strip() for item in value if item is not None)
+    elif isinstance(value, dict):
+        value = " ".join(str(item).strip() for item in value.values() if item is not None)
+    text = str(value).strip()
+    return text or None
+
+def _coerce_age(value) -> Optional[int]:
+    """나이: "35세" 같은 문자열도 숫자로 읽고, 허용 범위로 맞춥니다."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        age = round(value)
+    else:
+        match = re.search(r"\d+", str(value))
+        if not match:
+            return None
+        age = int(match.group())
+    return min(max(age, AGE_MIN), AGE_MAX)
+
+def _coerce_gender(value) -> Optional[str]:
+    text = str(value or "").strip().lower()
+    for gender, aliases in _GENDER_ALIASES.items():
+        if text in aliases:
+            return gender
+    return None
+
+def _coerce_birth_date(value) -> Optional[str]:
+    """생년월일: "1990.3.5", "19900305", "1990년 3월 5일" 등을 YYYY-MM-DD로 맞춥니다."""
+    text = str(value or "").strip()
+    match = re.fullmatch(r"(\d{4})(\d{2})(\d{2})", text) \
+        or re.search(r"(\d{4})\D+(\d{1,2})\D+(\d{1,2})", text)
+    if not match:
+        return None
+    year, month, day = (int(part) for part in match.groups())
+    if not 1 <= month <= 12 or day < 1:
+        return None
+    try:
+        # 2월 30일처럼 없는 날짜는 그 달의 마지막 날로 맞춥니다
+        day = min(day, calendar.monthrange(year, month)[1])
+        return date(year, month, day).isoformat()
+    except ValueError:
+        # 0000년처럼 만들 수 없는 날짜는 빠진 값으로 보고 다시 묻습니다
+        return None
+
+def _coerce_birth_time(value) -> Optional[str]:
+    """출생 시간: "오후 3시 20분", "3:05 PM", "1520" 등을 HH:MM으로 맞춥니다."""
+    text = str(value or "").strip()
+    match = re.fullmatch(r"(\d{2})(\d{2})", text) or re.search(r"(\d{1,2})\s*(?:[:시]\s*(\d{1,2})?)?", text)
+    if not match:
+        return None
+    hour = int(match.group(1))
+    minute = int(match.group(2) or 0)
+    lowered = text.lower()
+    if ("오후" in text or "pm" in lowered) and hour < 12:
+        hour += 12
+    elif ("오전" in text or "am" in lowered) and hour == 12:
+        hour = 0
+    if hour > 23 or minute > 59:
+        return None
+    return f"{hour:02d}:{minute:02d}"
+
+class _RepairableModel(BaseModel):
+    """모든 항목이 선택값인 모델. 고칠 수 없는 값은 None이 되어 missing_fields()에 잡힙니다."""
+
+    model_config = ConfigDict(extra="ignore")
+
+    def missing_fields(self) -> list:
+        """비어 있는(다시 요청해야 하는) 항목 이름 목록"""
+        return [name for name in type(self).model_fields if getattr(self, name) is None]
+
+    def to_dict(self) -> dict:
+        return self.model_dump(exclude_none=True)
+
+class CharacterProfile(_RepairableModel):
+    """generate_character_profile 응답"""
+
+    name: Optional[str] = None
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    occupation: Optional[str] = None
+    personality: Optional[str] = None
+    concern: Optional[str] = None
+    birth_date: Optional[str] = None
+    birth_time: Optional[str] = None
+    speaking_style: Optional[str] = None
+
+    @field_validator("name", "occupation", "personality", "concern", "speaking_style", mode="before")
+    @classmethod
+    def _text(cls, value):
+        return _coerce_text(value)
+
+    @field_validator("age", mode="before")
+    @classmethod
+    def _age(cls, value):
+        return _coerce_age(value)
+
+    @field_validator("gender", mode="before")
+    @classmethod
+    def _gender(cls, value):
+        return _coerce_gender(value)
+
+    @field_validator("birth_date", mode="before")
+    @classmethod
+    def _birth_date(cls, value):
+        return _coerce_birth_date(value)
+
+    @field_validator("birth_time", mode="before")
+    @classmethod
+    def _birth_time(cls, value):
+        return _coerce_birth_time(value)
+
+    @model_validator(mode="after")
+    def _age_matches_birth_year(self):
+        # 나이와 생년이 맞지 않으면 화면에 보이는 나이를 기준으로 생년을 고칩니다
+        if self.age is not None and self.birth_date is not None:
+            expected_year = date.today().year - self.age
+            year = int(self.birth_date[:4])
+            if abs(year - expected_year) > 1:
+                self.birth_date = _coerce_birth_date(f"{expected_year}{self.birth_date[4:]}")
+        return self
+
+class FortuneResult(_RepairableModel):
+    """analyze_fortune 응답"""
+
+    fortune_analysis: Optional[str] = None
+    personality_analysis: Optional[str] = None
+    advice: Optional[str] = None
+    summary: Optional[str] = None
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def _text(cls, value):
+        return _coerce_text(value)
+
+def load_json_lenient(text: str) -> tuple:
+    """
+    JSON 텍스트를 최대한 읽어 냅니다.
+    코드 블록(```json)이나 앞뒤 설명이 섞여 있거나, 응답이 중간에 잘려도 완성된 항목까지는 살립니다.
+
+    Returns:
+        (딕셔너리, 로컬에서 고쳤는지 여부)
+    """
+    text = text or ""
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data, False
+    except json.JSONDecodeError:
+        pass
+
+    start = text.find("{")
+    if start < 0:
+        return {}, True
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text[start:])
+        if isinstance(data, dict):
+            return data, True
+    except json.JSONDecodeError:
+        pass
+
+    # 잘린 JSON: 값이 끝까지 도착한 항목만 사용합니다
+    parser = IncrementalJSONParser()
+    parser.feed(text[start:])
+    return dict(parser.result), True
+
+def parse_structured(model_cls, text: str) -> tuple:
+    """
+    응답 텍스트를 검증하고 고칩니다.
+
+    Args:
+        model_cls: CharacterProfile 또는 FortuneResult
+        text: OpenAI 응답 텍스트
+
+    Returns:
+        (모델 인스턴스, 로컬에서 고친 항목이 있는지 여부)
+    """
+    raw, repaired = load_json_lenient(text)
+    instance = model_cls.model_validate(raw)
+    if not repaired:
+        repaired = any(raw.get(key) != value for key, value in instance.to_dict().items())
+    return instance, repaired
+
+def load_json_array_lenient(text: str, key: str) -> tuple:
+    """
+    {"key": [객체, ...]} 형식의 응답에서 객체 목록을 읽어 냅니다.
+    응답이 배열 중간에 잘려도 끝까지 도착한 객체는 살립니다.
+
+    Returns:
+        (객체 리스트, 로컬에서 고쳤는지 여부)
+    """
+    data, repaired = load_json_lenient(text)
+    if isinstance(data.get(key), list):
+        return [item for item in data[key] if isinstance(item, dict)], repaired
+
+    text = text or ""
+    match = re.search(r'"%s"\s*:\s*\[' % re.escape(key), text)
+    if not match:
+        return [], True
+
+    items = []
+    decoder = json.JSONDecoder()
+    position = match.end()
+    while True:
+        while position < len(text) and text[position] in " \t\r\n,":
+            position += 1
+        if position >= len(text) or text[position] == "]":
+            break
+        try:
+            item, position = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            break
+        if isinstance(item, dict):
+            items.append(item)
+    return items, True
+
+def parse_structured_list(model_cls, text: str, key: str) -> tuple:
+    """
+    여러 개의 구조화 응답을 한 번에 검증합니다. 빠진 항목이 있는 객체는 버립니다.
+
+    Returns:
+        (완전한 모델 인스턴스 리스트, 받은 객체 수)
+    """
+    raw_items, _ = load_json_array_lenient(text, key)
+    instances = [model_cls.model_validate(raw) for raw in raw_items]
+    return [instance for instance in instances if not instance.missing_fields()], len(raw_items)
@@ -0,0 +1,265 @@
+"""
+세션별 메모리 사용량 제한
+브라우저 세션마다 st.session_state에 대화 전체가 쌓이면, 동시 접속과 방치된 세션이 많은 서버는 메모리가 계속 늘어납니다.
+
+- 대화 한 턴은 __slots__ 레코드(Turn)로 저장하고 역할 문자열은 intern해 모든 세션이 같은 객체를 씁니다.
+- 세션마다 최근 턴만 메모리에 둡니다 (SESSION_MEMORY_TURNS, SESSION_MEMORY_KB 중 먼저 닿는 쪽).
+  모든 턴은 보낼 때 이미 DB에 저장되므로, 넘친 앞부분은 메모리에서만 내려놓고 필요할 때 DB에서 다시 읽습니다.
+- SESSION_IDLE_MINUTES 동안 쓰이지 않은 세션의 대화는 메모리에서 모두 내려놓습니다. (다시 열면 최근 턴을 DB에서 읽음)
+- 세션별 사용량(추정 바이트)을 session_memory.* 지표로 남깁니다.
+
+메모리에서 내려놓는 것은 대화(Transcript)뿐입니다. 사주 결과, 초안, 초상화 작업 같은 다른 세션 상태는
+세션이 끝날 때까지 그대로 두며, 사용량 지표에만 포함됩니다.
+"""
+
+import os
+import sys
+import time
+import threading
+import weakref
+
+from utils import metrics
+
+# 세션마다 메모리에 두는 최대 턴 수와 바이트 수 (둘 중 먼저 닿는 쪽에서 앞부분을 내려놓습니다)
+MAX_RESIDENT_TURNS = int(os.getenv("SESSION_MEMORY_TURNS", "40"))
+MAX_RESIDENT_BYTES = int(os.getenv("SESSION_MEMORY_KB", "64")) * 1024
+# 아무리 길어도 메모리에 남겨 두는 최근 턴 수 (화면과 대화 문맥용)
+MIN_RESIDENT_TURNS = 4
+# 이 시간 동안 쓰이지 않은 세션은 대화를 메모리에서 모두 내려놓습니다
+IDLE_SECONDS = float(os.getenv("SESSION_IDLE_MINUTES", "30")) * 60
+# 방치된 세션 정리를 확인하는 최소 간격(초)
+EVICT_INTERVAL = 60.0
+# 세션 상태 전체의 크기를 다시 재는 최소 간격(초). 그 사이의 화면 갱신은 마지막 값을 씁니다
+TRACK_INTERVAL = float(os.getenv("SESSION_MEMORY_TRACK_SECONDS", "10"))
+
+def _sizeof(value, seen: set) -> int:
+    """객체가 차지하는 메모리를 대략 계산합니다. (dict, list, tuple, Turn을 따라 내려감)"""
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_sizeof(k, seen) + _sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(_sizeof(item, seen) for item in value)
+    elif isinstance(value, Turn):
+        size += _sizeof(value.content, seen)
+    elif isinstance(value, Transcript):
+        size += value.nbytes
+    return size
+
+class Turn:
+    """대화 한 턴. msg["role"], msg["content"] 로도 읽을 수 있습니다."""
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = sys.intern(role)
+        self.content = content
+
+    def __getitem__(self, key: str):
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.content)
+
+# 세션(client_id)별로 살아 있는 대화 (세션이 사라지면 함께 사라집니다)
+_transcripts = weakref.WeakValueDictionary()
+# 세션별 마지막 사용량: {client_id: (바이트, 마지막 사용 시각)}
+_footprints = {}
+_registry_lock = threading.Lock()
+_last_evict = 0.0
+
+class Transcript:
+    """
+    한 상담의 대화 기록. 최근 턴만 메모리에 두고 앞부분은 DB에서 필요할 때 읽습니다.
+
+    화면 코드는 list처럼 씁니다: append(dict), 반복(메모리의 최근 턴), 슬라이스, len(전체 턴 수).
+    """
+
+    def __init__(self, session_id: str = None, client_id: str = None, loader=None):
+        self.session_id = session_id
+        self.spilled = 0            # 메모리에서 내려놓은 앞부분 턴 수
+        self.nbytes = 0             # 메모리에 있는 턴의 추정 바이트
+        self.last_used = time.monotonic()
+        self._turns = []
+        self._loader = loader
+        self._lock = threading.Lock()
+        if client_id:
+            with _registry_lock:
+                _transcripts[client_id] = self
+
+    def _load(self) -> list:
+        """DB에서 이 세션의 대화 전체를 읽어 Turn 목록으로 반환합니다."""
+        loader = self._loader
+        if loader is None:
+            from utils.supabase_helper import get_conversation_history
+            loader = get_conversation_history
+        started = time.perf_counter()
+        rows = loader(self.session_id) or []
+        metrics.observe("session_memory.reload_seconds", time.perf_counter() - started)
+        metrics.incr("session_memory.reloads")
+        return [
+            Turn("assistant" if row.get("speaker") == "ai" else "user", row.get("message") or "")
+            for row in rows
+        ]
+
+    def _spill(self, keep: int = None) -> None:
+        """메모리 상한을 넘은 앞부분 턴을 내려놓습니다. (세션이 없으면 다시 읽을 수 없으므로 그대로 둠)"""
+        if not self.session_id:
+            return
+        if keep is None:
+            keep = MAX_RESIDENT_TURNS
+        dropped = 0
+        while len(self._turns) > MIN_RESIDENT_TURNS or (keep == 0 and self._turns):
+            if len(self._turns) <= keep and self.nbytes <= MAX_RESIDENT_BYTES:
+                break
+            turn = self._turns.pop(0)
+            self.nbytes -= turn.nbytes()
+            dropped += 1
+        if dropped:
+            self.spilled += dropped
+            metrics.incr("session_memory.spilled_turns", dropped)
+
+    def _ensure_resident(self) -> None:
+        """방치로 모두 내려놓은 대화를 다시 쓸 때 최근 턴을 DB에서 읽어 옵니다."""
+        if self._turns or not self.spilled:
+            return
+        turns = self._load()
+        recent = turns[-MAX_RESIDENT_TURNS:]
+        self._turns = recent
+        self.nbytes = sum(turn.nbytes() for turn in recent)
+        self.spilled = len(turns) - len(recent)
+        self._spill()
+
+    def append(self, message: dict) -> None:
+        """턴 하나를 추가합니다. ({"role", "content"})"""
+        with self._lock:
+            self.last_used = time.monotonic()
+            self._ensure_resident()
+            turn = Turn(message["role"], message["content"])
+            self._turns.append(turn)
+            self.nbytes += turn.nbytes()
+            self._spill()
+
+    def recent(self) -> list:
+        """메모리에 있는 최근 턴 목록을 반환합니다."""
+        with self._lock:
+            self.last_used = time.monotonic()
+            self._ensure_resident()
+            return list(self._turns)
+
+    def full(self) -> list:
+        """
+        대화 전체를 반환합니다. 내려놓은 앞부분이 있으면 DB에서 읽어 붙입니다.
+
+        Returns:
+            Turn 목록
+        """
+        recent = self.recent()
+        if not self.spilled:
+            return recent
+        older = self._load()[:self.spilled]
+        if len(older) < self.spilled:
+            # 저장에 실패한 턴이 있으면 DB에 있는 만큼만 붙입니다
+            print(f"⚠️ 이전 대화 일부를 불러오지 못했습니다 ({len(older)}/{self.spilled}턴)")
+            metrics.incr("session_memory.reload_short")
+        return older + recent
+
+    def evict(self) -> int:
+        """
+        메모리의 턴을 모두 내려놓습니다. (다음에 쓸 때 DB에서 최근 턴을 다시 읽음)
+
+        Returns:
+            내려놓은 바이트 수
+        """
+        with self._lock:
+            freed = self.nbytes
+            self._spill(keep=0)
+            return freed - self.nbytes
+
+    def __iter__(self):
+        return iter(self.recent())
+
+    def __getitem__(self, index):
+        return self.recent()[index]
+
+    def __len__(self) -> int:
+        return self.spilled + len(self._turns)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+def evict_idle(now: float = None) -> int:
+    """
+    IDLE_SECONDS 동안 쓰이지 않은 세션의 대화를 메모리에서 내려놓습니다.
+
+    Returns:
+        내려놓은 바이트 수
+    """
+    if now is None:
+        now = time.monotonic()
+    with _registry_lock:
+        idle = [t for t in _transcripts.values() if t.nbytes and now - t.last_used > IDLE_SECONDS]
+    freed = sum(transcript.evict() for transcript in idle)
+    if idle:
+        metrics.incr("session_memory.evicted_sessions", len(idle))
+        metrics.incr("session_memory.evicted_bytes", freed)
+        print(f"🔄 방치된 세션 {len(idle)}개의 대화를 메모리에서 내려놓았습니다 ({freed / 1024:.0f}KB)")
+    return freed
+
+def track(client_id: str, state) -> int:
+    """
+    세션 상태의 메모리 사용량을 기록하고, 가끔 방치된 세션의 대화를 내려놓습니다. (화면을 그릴 때마다 호출)
+    크기는 TRACK_INTERVAL 마다 한 번만 다시 잽니다.
+
+    Args:
+        client_id: 브라우저 세션 식별자
+        state: st.session_state
+
+    Returns:
+        이 세션의 추정 바이트
+    """
+    global _last_evict
+    now = time.monotonic()
+    with _registry_lock:
+        footprint = _footprints.get(client_id)
+    if footprint is not None and now - footprint[1] < TRACK_INTERVAL:
+        return footprint[0]
+
+    seen = set()
+    size = sum(_sizeof(state[key], seen) for key in list(state.keys()))
+    metrics.observe("session_memory.bytes", size)
+    with _registry_lock:
+        _footprints[client_id] = (size, now)
+        alive = set(_transcripts.keys())
+        for stale in [key for key, (_, seen_at) in _footprints.items() if key not in alive and now - seen_at > IDLE_SECONDS]:
+            del _footprints[stale]
+        due = now - _last_evict >= EVICT_INTERVAL
+        if due:
+            _last_evict = now
+    if due:
+        evict_idle(now)
+    return size
+
+def get_memory_stats() -> dict:
+    """
+    세션별 메모리 사용량 요약을 반환합니다.
+
+    Returns:
+        {"sessions", "total_bytes", "max_bytes", "p95_bytes", "resident_turns", "spilled_turns"}
+    """
+    with _registry_lock:
+        sizes = [size for size, _ in _footprints.values()]
+        transcripts = list(_transcripts.values())
+    return {
+        "sessions": len(sizes),
+        "total_bytes": sum(sizes),
+        "max_bytes": max(sizes, default=0),
+        "p95_bytes": metrics.percentile(sizes, 95),
+        "resident_turns": sum(len(t) - t.spilled for t in transcripts),
+        "spilled_turns": sum(t.spilled for t in transcripts),
+    }
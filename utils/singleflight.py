@@ -0,0 +1,123 @@
+"""
+비싼 동작의 중복 실행 방지 (single-flight)
+버튼을 두 번 누르거나 요청 도중 재실행이 일어나면 같은 사용자 동작이 다시 실행됩니다.
+동작마다 멱등 키를 붙이고, 같은 키의 작업은 프로세스 안에서 한 번만 실행해 결과를 나눠 씁니다.
+
+- 같은 키의 작업이 실행 중이면 새로 실행하지 않고 그 결과를 기다립니다. (shared)
+- 끝난 작업의 결과는 RESULT_TTL 동안 보관해 같은 키로 다시 요청하면 그대로 돌려줍니다. (replayed)
+- 예외가 났거나 결과가 None이면 보관하지 않으므로 다시 요청하면 새로 실행합니다.
+
+프로세스 사이의 중복(여러 서버, 재시도)은 데이터베이스의 idempotency_key 유니크 제약이 막습니다.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from utils import metrics
+
+# 끝난 작업의 결과를 보관하는 시간(초)
+RESULT_TTL = float(os.getenv("SINGLEFLIGHT_TTL_SECONDS", "600"))
+# 보관하는 결과 수 상한 (오래된 것부터 버립니다)
+MAX_RESULTS = 1024
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+class SingleFlight:
+    """키별로 작업을 한 번만 실행하고, 실행 중이거나 막 끝난 결과를 같은 키의 요청과 나눠 씁니다."""
+
+    def __init__(self, ttl: float = RESULT_TTL, max_results: int = MAX_RESULTS):
+        self.ttl = ttl
+        self.max_results = max_results
+        self._calls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, call: _Call, now: float) -> bool:
+        return call.finished_at is not None and now - call.finished_at > self.ttl
+
+    def do(self, key: str, fn, *args, **kwargs) -> tuple:
+        """
+        key 의 작업을 실행하거나, 이미 실행 중/완료된 결과를 돌려줍니다.
+
+        Returns:
+            (결과, 상태) - 상태는 "executed", "shared", "replayed" 중 하나
+        """
+        with self._lock:
+            now = time.monotonic()
+            call = self._calls.get(key)
+            if call is not None and self._expired(call, now):
+                del self._calls[key]
+                call = None
+            owner = call is None
+            if owner:
+                call = self._calls[key] = _Call()
+                # 보관 결과가 너무 많으면 오래된 완료 결과부터 버립니다 (실행 중인 작업은 남깁니다)
+                for stale in [k for k, c in self._calls.items() if c.finished_at is not None]:
+                    if len(self._calls) <= self.max_results:
+                        break
+                    del self._calls[stale]
+
+        if not owner:
+            status = "replayed" if call.done.is_set() else "shared"
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, status
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                call.finished_at = time.monotonic()
+                if call.error is not None or call.result is None:
+                    # 실패는 보관하지 않습니다 (다음 요청은 새로 실행)
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+            call.done.set()
+        return call.result, "executed"
+
+_flight = SingleFlight()
+
+def once(action: str, key: str, fn, *args, **kwargs):
+    """
+    사용자 동작 하나를 멱등 키 기준으로 한 번만 실행합니다.
+
+    Args:
+        action: 동작 이름 (지표 이름과 키 공간에 사용, 예: "profile", "portrait")
+        key: 멱등 키 (같은 사용자 동작이면 재실행되어도 같은 값)
+        fn: 실행할 함수 (나머지 인자는 fn에 그대로 전달)
+
+    Returns:
+        fn의 결과 (이미 실행 중이거나 끝난 같은 키 작업이 있으면 그 결과)
+    """
+    try:
+        result, status = _flight.do(f"{action}:{key}", fn, *args, **kwargs)
+    except Exception:
+        metrics.incr(f"singleflight.{action}.failed")
+        raise
+    metrics.incr(f"singleflight.{action}.{status}")
+    if status != "executed":
+        print(f"🔄 중복 요청을 합쳤습니다: {action} ({status})")
+    return result
+
+def get_duplicate_stats() -> dict:
+    """
+    동작별 실행 수와 합쳐진 중복 요청 수를 반환합니다.
+
+    Returns:
+        {동작 이름: {"executed", "shared", "replayed", "failed"}}
+    """
+    stats = {}
+    for name, value in metrics.snapshot("singleflight.")["counters"].items():
+        _, action, status = name.split(".", 2)
+        stats.setdefault(action, {"executed": 0, "shared": 0, "replayed": 0, "failed": 0})[status] = int(value)
+    return stats
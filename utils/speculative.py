@@ -0,0 +1,139 @@
+"""
+대화 중 미리 해 두는 사주 해석 (초안)
+N턴마다 백그라운드에서 초안 해석을 갱신해 두고, 상담 종료 시에는 초안을 그대로 쓰거나
+초안 이후의 대화만 반영하는 작은 갱신 요청으로 끝냅니다.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import metrics
+
+# 몇 턴(손님 응답 기준)마다 초안을 갱신할지
+EVERY_N_TURNS = int(os.getenv("SPECULATIVE_EVERY_N_TURNS", "3"))
+# 세션당 초안 해석 호출 상한 (비용 상한)
+MAX_CALLS_PER_SESSION = int(os.getenv("SPECULATIVE_MAX_CALLS", "3"))
+
+# 초안을 만든 뒤에도 사용자 버킷에 이만큼(대화 한 턴 + 상담 종료 해석)은 남아 있어야 초안을 만듭니다.
+# 초안도 사용자 버킷에서 차감하므로, 사용자별 한도 안에서 대화가 우선입니다.
+INTERACTIVE_RESERVE = float(os.getenv("SPECULATIVE_INTERACTIVE_RESERVE", "3"))
+
+# 초안 해석은 프로세스 전체에서 소수의 스레드로만 처리합니다
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SPECULATIVE_WORKERS", "2")),
+    thread_name_prefix="speculative"
+)
+
+def conversation_fingerprint(conversation: list) -> str:
+    """대화 내용의 지문(해시)을 계산합니다. 초안이 어떤 대화를 기준으로 만들어졌는지 확인하는 데 씁니다."""
+    canonical = json.dumps(
+        [[msg["speaker"], msg["message"]] for msg in conversation],
+        ensure_ascii=False, separators=(",", ":")
+    )
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+def draft_matches(draft: dict, conversation: list) -> bool:
+    """초안이 현재 대화의 앞부분을 기준으로 만들어졌는지 확인합니다."""
+    if not draft or not draft.get("result"):
+        return False
+    covered = draft.get("covered", 0)
+    if covered > len(conversation):
+        return False
+    return conversation_fingerprint(conversation[:covered]) == draft.get("fingerprint")
+
+class SpeculativeAnalyzer:
+    """
+    한 상담 세션의 초안 해석을 관리합니다.
+
+    on_turn()은 대화 한 턴이 끝날 때마다 호출하며, 조건이 맞으면 백그라운드에서 초안을 갱신합니다.
+    snapshot()은 상담 종료 시 작업 payload에 넣을 최신 초안을 돌려줍니다.
+    """
+
+    def __init__(self, character_data: dict, user_id: str = "anonymous",
+                 every_n_turns: int = EVERY_N_TURNS, max_calls: int = MAX_CALLS_PER_SESSION):
+        self.character_data = character_data
+        self.user_id = user_id
+        self.every_n_turns = every_n_turns
+        self.max_calls = max_calls
+        self.calls = 0
+        self._turns_since_draft = 0
+        self._draft = None
+        self._future = None
+        self._lock = threading.Lock()
+
+    def on_turn(self, conversation: list) -> bool:
+        """
+        대화 한 턴이 끝났음을 알립니다.
+
+        Args:
+            conversation: 지금까지의 대화 ({"speaker", "message"} 목록), 또는 그 목록을 돌려주는 함수.
+                함수는 초안을 실제로 갱신할 때만 백그라운드 스레드에서 호출하므로,
+                대화를 DB에서 다시 읽어야 하는 경우에도 대부분의 턴은 읽지 않고 끝납니다.
+
+        Returns:
+            초안 갱신을 시작했는지 여부
+        """
+        from utils.admission import get_admission_controller, COST_ANALYSIS
+
+        with self._lock:
+            self._turns_since_draft += 1
+            if self._turns_since_draft < self.every_n_turns:
+                return False
+            if self.calls >= self.max_calls:
+                metrics.incr("speculative.skipped.cost_cap")
+                return False
+            if self._future is not None and not self._future.done():
+                return False
+            # 대기열이 생길 만큼 바쁠 때는 사용자 요청을 위해 초안 해석을 건너뜁니다
+            controller = get_admission_controller()
+            if controller.stats()["queued"] > 0:
+                metrics.incr("speculative.skipped.busy")
+                return False
+            # 사용자가 한도에 가까우면 남은 토큰은 대화와 상담 종료 해석에 남겨 둡니다
+            if controller.tokens_available(self.user_id) < COST_ANALYSIS + INTERACTIVE_RESERVE:
+                metrics.incr("speculative.skipped.user_budget")
+                return False
+
+            self.calls += 1
+            self._turns_since_draft = 0
+            snapshot = conversation if callable(conversation) else [dict(msg) for msg in conversation]
+            self._future = _executor.submit(self._refresh, snapshot)
+            metrics.incr("speculative.calls")
+            return True
+
+    def _refresh(self, conversation) -> None:
+        from utils.admission import AdmissionRejected
+        from utils.openai_helper import analyze_fortune, get_last_usage
+
+        if callable(conversation):
+            conversation = conversation()
+        if not conversation:
+            return
+        try:
+            result = analyze_fortune(self.character_data, conversation, user_id=self.user_id)
+            usage = get_last_usage()
+        except AdmissionRejected:
+            metrics.incr("speculative.skipped.rate_limited")
+            return
+        if not result:
+            return
+
+        with self._lock:
+            # 늦게 끝난 이전 요청이 더 최신 초안을 덮어쓰지 않도록 합니다
+            if self._draft and self._draft["covered"] > len(conversation):
+                return
+            self._draft = {
+                "result": result,
+                "covered": len(conversation),
+                "fingerprint": conversation_fingerprint(conversation),
+                # 초안을 그대로 쓰면 이 사용량이 사주 결과에 저장됩니다
+                "usage": usage,
+            }
+
+    def snapshot(self) -> dict:
+        """현재까지 완성된 최신 초안을 반환합니다. (없으면 None)"""
+        with self._lock:
+            return dict(self._draft) if self._draft else None
@@ -0,0 +1,155 @@
+"""
+시작 시간 벤치마크
+새 프로세스에서 앱이 쓰는 모듈의 import 시간과 첫 화면 렌더링 시간을 재고,
+무거운 패키지(openai, supabase, PIL 등)가 시작 시점에 import되지 않는지 확인합니다.
+
+실행:
+    python -m utils.startup_bench                          # 측정만
+    python -m utils.startup_bench --save-baseline b.json   # 기준값 저장
+    python -m utils.startup_bench --baseline b.json        # 기준 대비 회귀 확인 (실패 시 종료 코드 1)
+"""
+
+import os
+import sys
+import ast
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def app_modules(path: str = os.path.join(ROOT, "app.py")) -> tuple:
+    """
+    app.py가 시작할 때 불러오는 utils 모듈 목록을 app.py의 import 문에서 읽어 옵니다.
+    함수 안의 import는 필요할 때 불러오는 것이므로 제외합니다.
+
+    Returns:
+        모듈 이름 튜플 (예: ("utils.openai_helper", "utils.metrics", ...))
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    modules = []
+    pending = list(tree.body)
+    while pending:
+        node = pending.pop(0)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module == "utils":
+            # from utils import metrics 처럼 모듈을 가져오는 경우
+            names = [f"utils.{alias.name}" for alias in node.names
+                     if os.path.exists(os.path.join(ROOT, "utils", f"{alias.name}.py"))]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names = [node.module]
+        else:
+            pending.extend(ast.iter_child_nodes(node))
+            continue
+        modules.extend(name for name in names if name.startswith("utils.") and name not in modules)
+    return tuple(modules)
+
+# app.py가 시작할 때 불러오는 utils 모듈 (app.py에 import가 늘어나면 함께 늘어납니다)
+APP_MODULES = app_modules()
+
+# 실제로 쓰기 전까지 import되면 안 되는 패키지
+LAZY_PACKAGES = ("openai", "supabase", "PIL", "pydantic", "requests", "httpx")
+
+_IMPORT_SCRIPT = """
+import sys, time, json
+started = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "eager": [p for p in {lazy!r} if p in sys.modules]}}))
+"""
+
+_RENDER_SCRIPT = """
+import time, json
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=60)
+started = time.perf_counter()
+at.run()
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "exception": [str(e.value) for e in at.exception]}}))
+"""
+
+def _environment() -> dict:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "startup-bench")
+    env["REALTIME_ENABLED"] = "0"
+    env["ANALYSIS_WORKER_MODE"] = "external"
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+def _run_fresh(script: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, env=_environment(),
+        capture_output=True, text=True, check=True
+    ).stdout
+    # 모듈이 출력하는 로그 뒤의 마지막 줄이 결과입니다
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure(repeat: int = 3) -> dict:
+    """
+    새 프로세스에서 repeat번씩 측정한 중앙값을 반환합니다.
+
+    Returns:
+        {"import_ms", "first_render_ms", "eager_packages", "render_errors"}
+    """
+    imports = [_run_fresh(_IMPORT_SCRIPT.format(modules=APP_MODULES, lazy=LAZY_PACKAGES)) for _ in range(repeat)]
+    renders = [_run_fresh(_RENDER_SCRIPT.format(app=os.path.join(ROOT, "app.py"))) for _ in range(repeat)]
+    return {
+        "import_ms": round(statistics.median(r["seconds"] for r in imports) * 1000, 1),
+        "first_render_ms": round(statistics.median(r["seconds"] for r in renders) * 1000, 1),
+        "eager_packages": sorted({p for r in imports for p in r["eager"]}),
+        "render_errors": sorted({e for r in renders for e in r["exception"]}),
+    }
+
+def check(result: dict, baseline: dict, tolerance: float) -> list:
+    """기준값 대비 회귀 항목을 설명하는 문구 목록을 반환합니다. (없으면 빈 목록)"""
+    problems = []
+    if result["eager_packages"]:
+        problems.append(f"시작 시점에 불러오면 안 되는 패키지: {', '.join(result['eager_packages'])}")
+    if result["render_errors"]:
+        problems.append(f"첫 화면 렌더링 오류: {'; '.join(result['render_errors'])}")
+    for key in ("import_ms", "first_render_ms"):
+        limit = baseline.get(key, 0) * (1 + tolerance)
+        if baseline.get(key) and result[key] > limit:
+            problems.append(f"{key} {result[key]:.0f} ms > 기준 {baseline[key]:.0f} ms (+{tolerance:.0%} 허용)")
+    return problems
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="사담 시작 시간 벤치마크")
+    parser.add_argument("--repeat", type=int, default=3, help="측정 반복 횟수 (중앙값 사용)")
+    parser.add_argument("--baseline", help="비교할 기준값 JSON 파일")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="기준 대비 허용 증가율")
+    parser.add_argument("--save-baseline", help="측정 결과를 기준값으로 저장할 파일")
+    args = parser.parse_args(argv)
+
+    print("🔄 시작 시간 측정 중...")
+    result = measure(args.repeat)
+    print(f"   utils import: {result['import_ms']:.0f} ms")
+    print(f"   첫 화면 렌더링: {result['first_render_ms']:.0f} ms")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"✅ 기준값 저장: {args.save_baseline}")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    problems = check(result, baseline, args.tolerance)
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem}")
+        return 1
+    print("✅ 시작 시간 회귀 없음")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
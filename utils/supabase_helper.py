@@ -4,30 +4,110 @@ Supabase Database Helper
 """
 
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
+import time
+import threading
 from datetime import datetime
 import uuid
 
+from utils.config import load_env
+from utils import metrics, traffic
+from utils.replica import get_replica, start_sync
+from utils.archive import load_conversations, USAGE_COLUMNS
+
 # Load environment variables
-load_dotenv()
+load_env()
+
+# Supabase 클라이언트는 처음 필요할 때 만들고 재사용합니다 (supabase 패키지 import 비용도 그때 냅니다)
+_client = None
+_client_lock = threading.Lock()
+
+def get_supabase_client():
+    """Supabase 클라이언트를 반환합니다. 프로세스당 한 번만 만들고 재사용합니다."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                url = os.getenv("SUPABASE_URL")
+                key = os.getenv("SUPABASE_KEY")
+                
+                if not url or not key:
+                    raise ValueError("SUPABASE_URL 또는 SUPABASE_KEY가 설정되지 않았습니다.")
+                
+                from supabase import create_client
+                _client = create_client(url, key)
+    # 트래픽 기록 모드(TRAFFIC_RECORD)에서는 호출을 기록하는 대리 객체를 돌려줍니다
+    return traffic.wrap_supabase(_client)
+
+def _write_through(method: str, *args) -> None:
+    """Supabase에 쓴 내용을 로컬 복제본에도 반영합니다. 복제본 오류는 저장 결과에 영향을 주지 않습니다."""
+    replica = get_replica()
+    if replica is None:
+        return
+    try:
+        getattr(replica, method)(*args)
+    except Exception as e:
+        print(f"⚠️ 로컬 복제본 반영 실패: {str(e)}")
+
+def _read_replica(method: str, *args):
+    """로컬 복제본에서 읽습니다. 복제본이 없거나 오류가 나면 None (Supabase에서 읽음)"""
+    replica = get_replica()
+    if replica is None:
+        return None
+    start_sync(lambda: get_supabase_client())
+    try:
+        started = time.perf_counter()
+        value = getattr(replica, method)(*args)
+    except Exception as e:
+        print(f"⚠️ 로컬 복제본 조회 실패: {str(e)}")
+        return None
+    metrics.observe(f"replica.{method}_seconds", time.perf_counter() - started)
+    metrics.incr(f"replica.{method}.{'hit' if value is not None else 'miss'}")
+    return value
 
-def get_supabase_client() -> Client:
-    """Supabase 클라이언트를 반환합니다."""
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
+def _insert_once(supabase, table: str, data: dict, idempotency_key: str = None) -> dict:
+    """
+    행 하나를 저장합니다. idempotency_key가 있으면 같은 키로 이미 저장된 행이 있을 때
+    새로 만들지 않고 그 행을 돌려줍니다. (idempotency_key 유니크 제약)
     
-    if not url or not key:
-        raise ValueError("SUPABASE_URL 또는 SUPABASE_KEY가 설정되지 않았습니다.")
+    Returns:
+        저장된 행
+    """
+    if not idempotency_key:
+        return supabase.table(table).insert(data).execute().data[0]
     
-    return create_client(url, key)
+    result = supabase.table(table)\
+        .upsert({**data, "idempotency_key": idempotency_key}, on_conflict="idempotency_key", ignore_duplicates=True)\
+        .execute()
+    if result.data:
+        return result.data[0]
+    
+    # 같은 동작이 이미 저장한 행 (중복 클릭, 재시도)
+    metrics.incr(f"idempotency.{table}.duplicate")
+    existing = supabase.table(table).select("*").eq("idempotency_key", idempotency_key).execute()
+    return existing.data[0]
+
+def _character_row(character_data: dict) -> dict:
+    # 프로필의 concern은 background_story 컬럼에 저장합니다
+    return {
+        "name": character_data.get("name"),
+        "age": character_data.get("age"),
+        "gender": character_data.get("gender"),
+        "occupation": character_data.get("occupation"),
+        "personality": character_data.get("personality"),
+        "background_story": character_data.get("concern"),
+        "birth_date": character_data.get("birth_date"),
+        "birth_time": character_data.get("birth_time"),
+        "speaking_style": character_data.get("speaking_style"),
+        "image_url": character_data.get("image_url")
+    }
 
-def create_character(character_data: dict) -> str:
+def create_character(character_data: dict, idempotency_key: str = None) -> str:
     """
     새로운 인물을 데이터베이스에 저장합니다.
     
     Args:
         character_data: 인물 정보 딕셔너리
+        idempotency_key: 사용자 동작의 멱등 키 (같은 키로 다시 호출하면 처음 만든 인물을 돌려줍니다)
         
     Returns:
         생성된 인물의 UUID
@@ -35,35 +115,51 @@ def create_character(character_data: dict) -> str:
     try:
         supabase = get_supabase_client()
         
-        data = {
-            "name": character_data.get("name"),
-            "age": character_data.get("age"),
-            "gender": character_data.get("gender"),
-            "occupation": character_data.get("occupation"),
-            "personality": character_data.get("personality"),
-            "background_story": character_data.get("concern"),
-            "birth_date": character_data.get("birth_date"),
-            "birth_time": character_data.get("birth_time"),
-            "speaking_style": character_data.get("speaking_style"),
-            "image_url": character_data.get("image_url")
-        }
+        data = _character_row(character_data)
         
-        result = supabase.table("characters").insert(data).execute()
-        character_id = result.data[0]["id"]
+        row = _insert_once(supabase, "characters", data, idempotency_key)
+        character_id = row["id"]
         print(f"✅ 인물 저장 완료: {character_id}")
+        _write_through("put_character", row)
         return character_id
         
     except Exception as e:
         print(f"❌ 인물 저장 실패: {str(e)}")
         return None
 
-def create_session(character_id: str, user_id: str = "anonymous") -> str:
+def create_characters(characters: list) -> list:
+    """
+    여러 인물을 한 번의 insert로 저장합니다.
+    
+    Args:
+        characters: 인물 정보 딕셔너리 리스트
+        
+    Returns:
+        생성된 인물 UUID 리스트 (입력 순서와 같음, 실패 시 빈 리스트)
+    """
+    if not characters:
+        return []
+    try:
+        supabase = get_supabase_client()
+        
+        result = supabase.table("characters").insert([_character_row(c) for c in characters]).execute()
+        for row in result.data:
+            _write_through("put_character", row)
+        print(f"✅ 인물 {len(result.data)}명 저장 완료")
+        return [row["id"] for row in result.data]
+        
+    except Exception as e:
+        print(f"❌ 인물 일괄 저장 실패: {str(e)}")
+        return []
+
+def create_session(character_id: str, user_id: str = "anonymous", idempotency_key: str = None) -> str:
     """
     새로운 상담 세션을 생성합니다.
     
     Args:
         character_id: 인물 UUID
         user_id: 사용자 ID (기본값: "anonymous")
+        idempotency_key: 사용자 동작의 멱등 키 (같은 키로 다시 호출하면 처음 만든 세션을 돌려줍니다)
         
     Returns:
         생성된 세션의 UUID
@@ -77,16 +173,70 @@ def create_session(character_id: str, user_id: str = "anonymous") -> str:
             "status": "active"
         }
         
-        result = supabase.table("sessions").insert(data).execute()
-        session_id = result.data[0]["id"]
+        row = _insert_once(supabase, "sessions", data, idempotency_key)
+        session_id = row["id"]
         print(f"✅ 세션 생성 완료: {session_id}")
+        _write_through("put_session", row)
         return session_id
         
     except Exception as e:
         print(f"❌ 세션 생성 실패: {str(e)}")
         return None
 
-def save_message(session_id: str, character_id: str, speaker: str, message: str) -> bool:
+def start_returning_guest(user_id: str = "anonymous", character_id: str = None, gender: str = None,
+                          min_age: int = None, max_age: int = None, idempotency_key: str = None) -> dict:
+    """
+    이미 만들어 둔 인물을 골라 새 상담 세션을 엽니다. (start_returning_guest RPC, 데이터베이스 왕복 한 번)
+    인물 프로필 생성과 초상화 생성 요청을 하지 않습니다.
+
+    Args:
+        user_id: 사용자 ID (기본값: "anonymous")
+        character_id: 부를 인물 UUID (없으면 조건에 맞는 초상화 있는 인물을 무작위로 고름)
+        gender: 성별 조건 ("남성" 또는 "여성")
+        min_age: 최소 나이
+        max_age: 최대 나이
+        idempotency_key: 사용자 동작의 멱등 키 (같은 키로 다시 호출하면 처음 만든 세션을 돌려줍니다)
+
+    Returns:
+        {"session_id", "character", "previous"} - previous는 같은 인물의 가장 최근 상담 요약
+        ({"session_id", "started_at", "summary", "advice"}, 없으면 None). 고를 인물이 없거나 실패하면 None
+    """
+    try:
+        supabase = get_supabase_client()
+
+        result = supabase.rpc("start_returning_guest", {
+            "p_user_id": user_id,
+            "p_character_id": character_id,
+            "p_gender": gender,
+            "p_min_age": min_age,
+            "p_max_age": max_age,
+            "p_idempotency_key": idempotency_key,
+        }).execute()
+
+        data = result.data
+        if not data:
+            print("⚠️ 다시 부를 수 있는 손님이 없습니다.")
+            return None
+
+        session = data["session"]
+        _write_through("put_session", session)
+        # DB에는 고민이 background_story 컬럼에 저장됩니다
+        character = {**data["character"], "concern": data["character"].get("background_story")}
+        metrics.incr("returning_guest.started")
+        print(f"✅ 다시 찾아온 손님 세션 생성 완료: {session['id']}")
+        return {"session_id": session["id"], "character": character, "previous": data.get("previous")}
+
+    except Exception as e:
+        print(f"❌ 다시 찾아온 손님 세션 생성 실패: {str(e)}")
+        return None
+
+def _usage_columns(usage: dict) -> dict:
+    """openai_helper.get_last_usage() 결과를 사용량 컬럼 값으로 바꿉니다."""
+    if not usage:
+        return {}
+    return {column: usage.get(column) for column in USAGE_COLUMNS}
+
+def save_message(session_id: str, character_id: str, speaker: str, message: str, usage: dict = None) -> bool:
     """
     대화 메시지를 저장합니다.
     
@@ -95,6 +245,7 @@ def save_message(session_id: str, character_id: str, speaker: str, message: str)
         character_id: 인물 UUID
         speaker: 'user' 또는 'ai'
         message: 메시지 내용
+        usage: 응답을 만든 요청의 사용량 (openai_helper.get_last_usage() 결과, 없으면 None)
         
     Returns:
         저장 성공 여부
@@ -106,10 +257,12 @@ def save_message(session_id: str, character_id: str, speaker: str, message: str)
             "session_id": session_id,
             "character_id": character_id,
             "speaker": speaker,
-            "message": message
+            "message": message,
+            **_usage_columns(usage)
         }
         
         supabase.table("conversations").insert(data).execute()
+        _write_through("invalidate_detail", session_id)
         return True
         
     except Exception as e:
@@ -129,13 +282,8 @@ def get_conversation_history(session_id: str) -> list:
     try:
         supabase = get_supabase_client()
         
-        result = supabase.table("conversations")\
-            .select("*")\
-            .eq("session_id", session_id)\
-            .order("timestamp")\
-            .execute()
-        
-        return result.data
+        # 보관된 대화록(conversation_archives)과 메시지 행을 합쳐서 읽습니다
+        return load_conversations(supabase, [session_id]).get(session_id, [])
         
     except Exception as e:
         print(f"❌ 대화 기록 조회 실패: {str(e)}")
@@ -143,13 +291,13 @@ def get_conversation_history(session_id: str) -> list:
 
 def end_session(session_id: str) -> bool:
     """
-    세션을 종료합니다.
+    세션을 종료합니다. 이미 완료된 세션은 종료 시각을 바꾸지 않습니다. (해석 작업 재시도 시)
     
     Args:
         session_id: 세션 UUID
         
     Returns:
-        종료 성공 여부
+        종료 성공 여부 (이미 완료된 세션도 True)
     """
     try:
         supabase = get_supabase_client()
@@ -159,19 +307,92 @@ def end_session(session_id: str) -> bool:
             "ended_at": datetime.now().isoformat()
         }
         
-        supabase.table("sessions")\
+        result = supabase.table("sessions")\
             .update(data)\
             .eq("id", session_id)\
+            .in_("status", ["active", "expired"])\
             .execute()
         
-        print(f"✅ 세션 종료 완료: {session_id}")
+        if result.data:
+            print(f"✅ 세션 종료 완료: {session_id}")
+            _write_through("mark_session", session_id, data["status"], data["ended_at"])
         return True
         
     except Exception as e:
         print(f"❌ 세션 종료 실패: {str(e)}")
         return False
 
-def save_fortune_result(session_id: str, character_id: str, result_data: dict) -> bool:
+def expire_sessions(session_ids: list) -> int:
+    """
+    끝나지 않은 채 버려진 세션들을 한 번에 만료(expired) 처리합니다.
+    이미 완료되었거나 만료된 세션은 건드리지 않습니다.
+    
+    Args:
+        session_ids: 세션 UUID 리스트
+        
+    Returns:
+        만료 처리한 세션 수 (실패 시 0)
+    """
+    if not session_ids:
+        return 0
+    try:
+        supabase = get_supabase_client()
+        
+        data = {
+            "status": "expired",
+            "ended_at": datetime.now().isoformat()
+        }
+        
+        result = supabase.table("sessions")\
+            .update(data)\
+            .in_("id", session_ids)\
+            .eq("status", "active")\
+            .execute()
+        
+        expired = result.data or []
+        for session in expired:
+            _write_through("mark_session", session["id"], data["status"], data["ended_at"])
+        return len(expired)
+        
+    except Exception as e:
+        print(f"❌ 세션 만료 처리 실패: {str(e)}")
+        return 0
+
+def delete_sessions(session_ids: list, idle_before: str = None) -> int:
+    """
+    세션과 그 대화 메시지를 지웁니다. (대화가 거의 없는 버려진 세션 정리용)
+    
+    Args:
+        session_ids: 세션 UUID 리스트
+        idle_before: 주면 지울 때 조건을 다시 확인합니다 (ISO 시각).
+            아직 active이고, 이 시각 전에 시작했고, 손님 메시지와 이 시각 이후 메시지가 없는 세션만 지웁니다.
+        
+    Returns:
+        지운 세션 수 (실패 시 0)
+    """
+    if not session_ids:
+        return 0
+    try:
+        supabase = get_supabase_client()
+        
+        if idle_before:
+            # 조회한 뒤 대화가 이어진 세션은 지우지 않습니다 (delete_idle_sessions 함수가 한 트랜잭션에서 확인)
+            rows = supabase.rpc("delete_idle_sessions", {
+                "p_session_ids": session_ids, "p_idle_before": idle_before
+            }).execute().data or []
+            deleted = [row if isinstance(row, str) else next(iter(row.values())) for row in rows]
+        else:
+            supabase.table("conversations").delete().in_("session_id", session_ids).execute()
+            deleted = [row["id"] for row in supabase.table("sessions").delete().in_("id", session_ids).execute().data or []]
+        if deleted:
+            _write_through("delete_sessions", deleted)
+        return len(deleted)
+        
+    except Exception as e:
+        print(f"❌ 세션 삭제 실패: {str(e)}")
+        return 0
+
+def save_fortune_result(session_id: str, character_id: str, result_data: dict, usage: dict = None) -> bool:
     """
     사주 해석 결과를 저장합니다.
     
@@ -179,6 +400,7 @@ def save_fortune_result(session_id: str, character_id: str, result_data: dict) -
         session_id: 세션 UUID
         character_id: 인물 UUID
         result_data: 해석 결과 딕셔너리
+        usage: 해석 요청의 사용량 (openai_helper.get_last_usage() 결과, 없으면 None)
         
     Returns:
         저장 성공 여부
@@ -192,11 +414,14 @@ def save_fortune_result(session_id: str, character_id: str, result_data: dict) -
             "fortune_analysis": result_data.get("fortune_analysis"),
             "personality_analysis": result_data.get("personality_analysis"),
             "advice": result_data.get("advice"),
-            "summary": result_data.get("summary")
+            "summary": result_data.get("summary"),
+            **_usage_columns(usage)
         }
         
-        supabase.table("fortune_results").insert(data).execute()
+        # session_id 기준 upsert: 재시도해도 세션당 결과는 하나만 남습니다
+        supabase.table("fortune_results").upsert(data, on_conflict="session_id").execute()
         print(f"✅ 사주 결과 저장 완료")
+        _write_through("invalidate_detail", session_id)
         return True
         
     except Exception as e:
@@ -214,6 +439,10 @@ def get_all_sessions(limit: int = 10, user_id: str = "anonymous") -> list:
     Returns:
         세션 리스트 (인물 정보 포함)
     """
+    sessions = _read_replica("list_sessions", user_id, limit)
+    if sessions is not None:
+        return sessions
+    
     try:
         supabase = get_supabase_client()
         
@@ -226,8 +455,6 @@ def get_all_sessions(limit: int = 10, user_id: str = "anonymous") -> list:
         
         return result.data if result.data else []
         
-        return result.data
-        
     except Exception as e:
         print(f"❌ 세션 목록 조회 실패: {str(e)}")
         return []
@@ -242,6 +469,10 @@ def get_session_detail(session_id: str) -> dict:
     Returns:
         세션 상세 정보 (인물, 대화, 사주 결과 포함)
     """
+    cached = _read_replica("get_detail", session_id)
+    if cached is not None:
+        return cached
+    
     try:
         supabase = get_supabase_client()
         
@@ -271,6 +502,10 @@ def get_session_detail(session_id: str) -> dict:
         else:
             session_data["fortune_result"] = None
         
+        # 끝난 세션만 복제본에 저장합니다 (진행 중인 세션은 계속 바뀌므로 매번 새로 읽음)
+        if session_data.get("status") == "completed" and session_data["fortune_result"]:
+            _write_through("put_detail", session_data)
+        
         return session_data
         
     except Exception as e:
@@ -303,6 +538,59 @@ def get_fortune_result_by_session(session_id: str) -> dict:
         print(f"❌ 사주 결과 조회 실패: {str(e)}")
         return None
 
+def summarize_usage(session_detail: dict) -> dict:
+    """
+    세션 상세 정보(get_session_detail 결과)에서 사용량 합계를 계산합니다.
+    사용량이 기록되기 전에 저장된 메시지는 빠집니다.
+    
+    Args:
+        session_detail: 세션 상세 정보
+        
+    Returns:
+        {"requests", "prompt_tokens", "completion_tokens", "cached_tokens", "latency_ms", "max_latency_ms"}
+        (사용량이 기록된 행이 없으면 None)
+    """
+    rows = list(session_detail.get("conversations") or [])
+    if session_detail.get("fortune_result"):
+        rows.append(session_detail["fortune_result"])
+    rows = [row for row in rows if row.get("model")]
+    if not rows:
+        return None
+    
+    totals = {
+        column: sum(row.get(column) or 0 for row in rows)
+        for column in ("prompt_tokens", "completion_tokens", "cached_tokens", "latency_ms")
+    }
+    totals["requests"] = len(rows)
+    totals["max_latency_ms"] = max(row.get("latency_ms") or 0 for row in rows)
+    return totals
+
+def get_session_usage(limit: int = 20, order_by: str = "total_tokens") -> list:
+    """
+    세션별 사용량 합계(session_usage 뷰)를 큰 순서대로 가져옵니다.
+    
+    Args:
+        limit: 가져올 세션 수
+        order_by: 정렬 기준 컬럼 (예: "total_tokens", "chat_latency_ms", "fortune_latency_ms")
+        
+    Returns:
+        세션별 사용량 리스트
+    """
+    try:
+        supabase = get_supabase_client()
+        
+        result = supabase.table("session_usage")\
+            .select("*")\
+            .order(order_by, desc=True)\
+            .limit(limit)\
+            .execute()
+        
+        return result.data if result.data else []
+        
+    except Exception as e:
+        print(f"❌ 세션 사용량 조회 실패: {str(e)}")
+        return []
+
 def upload_image_to_storage(image_data: bytes, character_id: str) -> str:
     """
     이미지를 Supabase Storage에 업로드합니다.
@@ -353,13 +641,60 @@ def upload_image_to_storage(image_data: bytes, character_id: str) -> str:
         traceback.print_exc()
         return None
 
-def update_character_image(character_id: str, image_url: str) -> bool:
+def upload_portrait(image_data: bytes, character_id: str) -> dict:
+    """
+    원본 이미지와 크기별 WebP 썸네일을 Supabase Storage에 업로드합니다.
+    
+    Args:
+        image_data: 원본 이미지 바이트 데이터
+        character_id: 인물 UUID (파일명으로 사용)
+        
+    Returns:
+        image_variants 딕셔너리 ({"original": {"url", "bytes", "width"}, "96": {...}, ...})
+        원본 업로드에 실패하면 None
+    """
+    from utils.image_helper import make_portrait_derivatives, image_width
+
+    original_url = upload_image_to_storage(image_data, character_id)
+    if not original_url:
+        return None
+    
+    variants = {"original": {"url": original_url, "bytes": len(image_data), "width": None}}
+    
+    try:
+        variants["original"]["width"] = image_width(image_data)
+        supabase = get_supabase_client()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        for size, webp_data in make_portrait_derivatives(image_data).items():
+            file_name = f"characters/{character_id}_{timestamp}_{size}.webp"
+            supabase.storage.from_("character-images").upload(
+                path=file_name,
+                file=webp_data,
+                file_options={"content-type": "image/webp", "upsert": "true", "cache-control": "31536000"}
+            )
+            variants[str(size)] = {
+                "url": supabase.storage.from_("character-images").get_public_url(file_name),
+                "bytes": len(webp_data),
+                "width": size
+            }
+        
+        print(f"✅ 썸네일 업로드 완료: {', '.join(k for k in variants if k != 'original')}")
+        
+    except Exception as e:
+        # 썸네일이 없어도 원본으로 표시할 수 있으므로 계속 진행합니다
+        print(f"❌ 썸네일 생성/업로드 실패: {str(e)}")
+    
+    return variants
+
+def update_character_image(character_id: str, image_url: str, image_variants: dict = None) -> bool:
     """
     인물의 이미지 URL을 업데이트합니다.
     
     Args:
         character_id: 인물 UUID
         image_url: 이미지 URL
+        image_variants: 크기별 이미지 정보 (upload_portrait 반환값)
         
     Returns:
         업데이트 성공 여부
@@ -367,18 +702,78 @@ def update_character_image(character_id: str, image_url: str) -> bool:
     try:
         supabase = get_supabase_client()
         
+        data = {"image_url": image_url}
+        if image_variants is not None:
+            data["image_variants"] = image_variants
+        
         supabase.table("characters")\
-            .update({"image_url": image_url})\
+            .update(data)\
             .eq("id", character_id)\
             .execute()
         
         print(f"✅ 인물 이미지 URL 업데이트 완료")
+        _write_through("update_character", character_id, data)
         return True
         
     except Exception as e:
         print(f"❌ 이미지 URL 업데이트 실패: {str(e)}")
         return False
 
+def _storage_path(url: str) -> str:
+    """공개 URL에서 character-images 버킷 안의 파일 경로를 꺼냅니다. (이 버킷 URL이 아니면 None)"""
+    marker = "/character-images/"
+    if not url or marker not in url:
+        return None
+    return url.split(marker, 1)[1].split("?", 1)[0]
+
+def character_image_paths(character: dict) -> list:
+    """
+    인물의 원본 이미지와 크기별 썸네일의 Storage 경로 목록을 반환합니다.
+    
+    Args:
+        character: image_url, image_variants 를 포함한 인물 딕셔너리
+    """
+    urls = [character.get("image_url")]
+    urls += [variant.get("url") for variant in (character.get("image_variants") or {}).values()]
+    return sorted({path for path in map(_storage_path, urls) if path})
+
+def delete_characters(characters: list) -> dict:
+    """
+    인물 행과 그 인물의 Storage 이미지를 지웁니다. 행을 먼저 지우면 실패했을 때 이미지가
+    어디에서도 참조되지 않은 채 남으므로 이미지부터 지웁니다.
+    
+    Args:
+        characters: id, image_url, image_variants 를 포함한 인물 딕셔너리 리스트
+        
+    Returns:
+        {"characters": 지운 인물 수, "images": 지운 이미지 수}
+    """
+    if not characters:
+        return {"characters": 0, "images": 0}
+    try:
+        supabase = get_supabase_client()
+        
+        paths = [path for character in characters for path in character_image_paths(character)]
+        if paths:
+            supabase.storage.from_("character-images").remove(paths)
+        
+        character_ids = [character["id"] for character in characters]
+        result = supabase.table("characters").delete().in_("id", character_ids).execute()
+        _write_through("delete_characters", character_ids)
+        return {"characters": len(result.data or []), "images": len(paths)}
+        
+    except Exception as e:
+        print(f"❌ 인물 삭제 실패: {str(e)}")
+        return {"characters": 0, "images": 0}
+
+# 트래픽 기록 모드에서는 helper 호출을 기록합니다 (utils/traffic.py)
+traffic.instrument(globals(), (
+    "create_character", "create_characters", "create_session", "start_returning_guest", "save_message", "get_conversation_history",
+    "end_session", "expire_sessions", "delete_sessions", "save_fortune_result", "get_all_sessions", "get_session_detail", "get_session_usage",
+    "get_fortune_result_by_session", "upload_image_to_storage", "upload_portrait", "update_character_image",
+    "delete_characters",
+))
+
 if __name__ == "__main__":
     # Test database connection
     print("🔄 데이터베이스 연결 테스트 중...")
@@ -0,0 +1,734 @@
+"""
+트래픽 기록 / 재생
+실제 사용 중의 openai_helper / supabase_helper 호출을 기록해 두었다가, 현재 코드에서 같은 호출을 다시 실행해
+로컬 처리 시간(전체 시간 - OpenAI/Supabase 응답 대기 시간)이 늘었는지 확인합니다.
+
+기록 (기본값은 꺼짐):
+    TRAFFIC_RECORD=logs/traffic.jsonl.gz streamlit run app.py
+    helper 호출 하나(안에서 부른 다른 helper 포함)마다 인자, 외부 호출의 응답과 소요 시간을 한 줄로 남깁니다.
+    API 키 등 비밀 값은 남기지 않고, 이름/대화 같은 자유 텍스트는 글자 수와 형식만 남기고 가립니다.
+
+재생:
+    python -m utils.traffic replay logs/traffic.jsonl.gz --save-baseline replay_baseline.json
+    python -m utils.traffic replay logs/traffic.jsonl.gz --baseline replay_baseline.json   # 회귀 시 종료 코드 1
+    외부 호출은 기록된 응답을 기록된 지연 시간만큼 기다렸다가 돌려주는 가짜 클라이언트가 대신합니다.
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import uuid
+import atexit
+import hashlib
+import inspect
+import argparse
+import functools
+import threading
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+
+TRAFFIC_RECORD = os.getenv("TRAFFIC_RECORD", "").strip()
+TRACE_VERSION = 1
+# gzip 파일은 이만큼 기록할 때마다 디스크에 내보냅니다
+GZIP_FLUSH_EVERY = 20
+# 이보다 작은 로컬 처리 시간 증가는 측정 오차로 봅니다 (ms)
+MIN_REGRESSION_MS = 1.0
+
+# 가리지 않고 그대로 남기는 값 (코드가 분기에 쓰는 고정 값)
+KEEP_VALUES = {
+    "남성", "여성", "user", "ai", "assistant", "system", "anonymous",
+    "active", "completed", "queued", "running", "failed", "stop", "length",
+}
+# 값을 가리지 않고 그대로 남기는 키 (모델 이름과 사용량 숫자는 재생 시 계량 경로가 같은 자료형으로 돌도록 유지)
+KEEP_KEYS = {
+    "model", "prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens",
+    "reasoning_tokens", "requests",
+}
+# 기록 파일 안에서 일관된 가명으로 바꾸는 키 (같은 값끼리의 비교가 재생에서도 같도록)
+PSEUDONYM_KEYS = {"user_id", "idempotency_key"}
+# 비밀 값의 키 이름 (prompt_tokens, idempotency_key 같은 이름이 걸리지 않도록 이름 전체를 비교합니다)
+_SECRET_KEY = re.compile(
+    r"^(?:[\w-]*[_-])?(?:api[_-]?key|apikey|secret|password|passwd|authorization|cookie|"
+    r"access[_-]?token|refresh[_-]?token|id[_-]?token|bearer)$|^(?:key|token|supabase[_-]?key)$",
+    re.I,
+)
+_UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.I)
+# 날짜/시각은 가상 인물의 생년월일과 기록 시각뿐이므로 형식 검증이 같도록 그대로 둡니다
+_DATE_OR_TIME = re.compile(r"^(\d{4}-\d{2}-\d{2}([T ][\d:.]+(Z|[+-]\d{2}:?\d{2})?)?|\d{1,2}:\d{2}(:\d{2})?)$")
+_URL = re.compile(r"^https?://")
+
+def is_recording() -> bool:
+    """기록 모드(TRAFFIC_RECORD)가 켜져 있는지 여부"""
+    return bool(TRAFFIC_RECORD)
+
+# ---- 개인정보/비밀 값 가리기 ----
+
+class Scrubber:
+    """
+    기록할 값을 가립니다. 구조(키, 자료형, 글자 수, JSON 형식)는 그대로 두어 재생할 때 같은 코드 경로를 타게 합니다.
+
+    - 비밀 값(api_key, authorization, password, secret, access_token 등): "***"
+    - 모델 이름과 토큰 사용량(KEEP_KEYS): 그대로
+    - UUID, user_id, idempotency_key: 기록 파일마다 다른 가명 (같은 파일 안에서는 일관됨)
+    - URL: 가명 URL
+    - 자유 텍스트: 한글 → "가", 다른 문자 → "x", 숫자 → "0" (공백/문장부호 유지), JSON 문자열은 안쪽 값만 가림
+    """
+
+    def __init__(self):
+        # 가명용 salt는 파일에 남기지 않으므로 기록을 원래 값과 이을 수 없습니다
+        self._salt = os.urandom(16)
+
+    def pseudonym(self, value: str) -> str:
+        digest = hashlib.sha256(self._salt + value.encode("utf-8")).digest()
+        return str(uuid.UUID(bytes=digest[:16], version=4))
+
+    def text(self, value: str) -> str:
+        if value in KEEP_VALUES or _DATE_OR_TIME.match(value):
+            return value
+        if _UUID.match(value):
+            return self.pseudonym(value)
+        if _URL.match(value):
+            return f"https://scrubbed.invalid/{self.pseudonym(value)}"
+        stripped = value.strip()
+        if stripped[:1] in ("{", "["):
+            try:
+                return json.dumps(self.value(json.loads(stripped)), ensure_ascii=False)
+            except ValueError:
+                pass
+        return "".join(
+            "가" if "가" <= ch <= "힣" else
+            "0" if ch.isdigit() else
+            "x" if ch.isalpha() else ch
+            for ch in value
+        )
+
+    def value(self, value, key: str = None):
+        if key and _SECRET_KEY.match(key) and value:
+            return "***"
+        if key in KEEP_KEYS and (value is None or isinstance(value, (str, bool, int, float))):
+            return value
+        if key in PSEUDONYM_KEYS and isinstance(value, str) and value not in KEEP_VALUES:
+            return self.pseudonym(value)
+        if isinstance(value, dict):
+            return {k: self.value(v, str(k)) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.value(v) for v in value]
+        if isinstance(value, (bytes, bytearray)):
+            return {"__bytes__": len(value)}
+        if isinstance(value, str):
+            return self.text(value)
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        if callable(value):
+            return None
+        return {"__type__": type(value).__name__}
+
+# ---- 기록 ----
+
+class _Writer:
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = gzip.open(path, "at", encoding="utf-8") if path.endswith(".gz") else \
+            open(path, "a", encoding="utf-8")
+        self._gzip = path.endswith(".gz")
+        self._lock = threading.Lock()
+        self._pending = 0
+        atexit.register(self.close)
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._pending += 1
+            if not self._gzip or self._pending >= GZIP_FLUSH_EVERY:
+                self._file.flush()
+                self._pending = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+_local = threading.local()
+_writer = None
+_scrubber = None
+_setup_lock = threading.Lock()
+
+def _get_writer() -> _Writer:
+    global _writer, _scrubber
+    if _writer is None:
+        with _setup_lock:
+            if _writer is None:
+                _scrubber = Scrubber()
+                _writer = _Writer(TRAFFIC_RECORD)
+                _writer.write({"trace_version": TRACE_VERSION, "created_at": datetime.now().isoformat()})
+    return _writer
+
+class _Call:
+    """helper 호출 하나의 기록"""
+
+    def __init__(self, helper: str, arguments: dict):
+        self.helper = helper
+        self.arguments = arguments
+        self.backend = []
+        self.backend_seconds = 0.0
+
+    def add(self, record: dict) -> None:
+        self.backend.append(record)
+        self.backend_seconds += record["seconds"]
+
+def _result_shape(result) -> str:
+    # 재생 결과가 기록과 같은 경로를 탔는지 비교하는 데 씁니다
+    if result is None:
+        return "none"
+    if isinstance(result, (list, dict, str, bytes)) and not result:
+        return "empty"
+    return type(result).__name__
+
+def _finish(call: _Call, seconds: float, shape: str, error: str = None) -> None:
+    try:
+        writer = _get_writer()
+        record = {
+            "helper": call.helper,
+            "arguments": _scrubber.value(call.arguments),
+            "seconds": round(seconds, 6),
+            "backend_seconds": round(call.backend_seconds, 6),
+            "result": shape,
+            "calls": call.backend,
+        }
+        if error:
+            record["error"] = error
+        writer.write(record)
+    except Exception as e:
+        print(f"⚠️ 트래픽 기록 실패: {str(e)}")
+
+def recorded(func):
+    """
+    helper 호출을 기록하는 데코레이터입니다. 기록 모드가 꺼져 있으면 원래 함수를 그대로 돌려줍니다.
+    helper 안에서 부른 다른 helper는 따로 기록하지 않고 바깥 호출에 포함됩니다.
+    """
+    if not is_recording():
+        return func
+
+    name = f"{func.__module__}.{func.__name__}"
+    signature = inspect.signature(func)
+
+    def arguments(args, kwargs) -> dict:
+        try:
+            return dict(signature.bind(*args, **kwargs).arguments)
+        except TypeError:
+            return {"args": list(args), **kwargs}
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            if getattr(_local, "call", None) is not None:
+                yield from func(*args, **kwargs)
+                return
+            call = _Call(name, arguments(args, kwargs))
+            inner = func(*args, **kwargs)
+            active, items, error = 0.0, 0, None
+            try:
+                while True:
+                    # 소비하는 쪽이 항목 사이에 쓰는 시간은 빼고, 생성기 안에서 보낸 시간만 잽니다
+                    _local.call = call
+                    started = time.perf_counter()
+                    try:
+                        item = next(inner)
+                    except StopIteration:
+                        break
+                    except Exception as e:
+                        error = type(e).__name__
+                        raise
+                    finally:
+                        active += time.perf_counter() - started
+                        _local.call = None
+                    items += 1
+                    yield item
+            finally:
+                _finish(call, active, "list" if items else "empty", error)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if getattr(_local, "call", None) is not None:
+            return func(*args, **kwargs)
+        call = _Call(name, arguments(args, kwargs))
+        _local.call = call
+        started = time.perf_counter()
+        result, error = None, None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            _local.call = None
+            _finish(call, time.perf_counter() - started, _result_shape(result), error)
+    return wrapper
+
+def instrument(namespace: dict, names: tuple) -> None:
+    """모듈의 helper들을 기록 모드일 때만 recorded로 감쌉니다. 모듈 맨 끝에서 globals()와 함께 호출합니다."""
+    if not is_recording():
+        return
+    for name in names:
+        namespace[name] = recorded(namespace[name])
+
+def _scrub(value):
+    _get_writer()
+    return _scrubber.value(value)
+
+def _record_backend(kind: str, op: str, started: float, scrubbed: dict = None, **fields) -> None:
+    """
+    helper 호출 안에서 일어난 외부 호출을 기록합니다. (helper 밖의 호출은 기록하지 않음)
+
+    Args:
+        scrubbed: 가려서 남길 값 (응답 내용)
+        fields: 그대로 남길 값 (토큰 수, 메서드 이름 등)
+    """
+    call = getattr(_local, "call", None)
+    if call is None:
+        return
+    seconds = round(time.perf_counter() - started, 6)
+    call.add({"kind": kind, "op": op, "seconds": seconds, **fields,
+              **{key: _scrub(value) for key, value in (scrubbed or {}).items()}})
+
+class _RecordingStream:
+    """스트리밍 응답을 그대로 넘겨주면서 조각별 대기 시간과 내용을 모읍니다."""
+
+    def __init__(self, stream, op: str):
+        self._stream = iter(stream)
+        self._op = op
+        self._call = getattr(_local, "call", None)
+        self._chunks = []
+        self._content = []
+        self._usage = None
+        self._waited = 0.0
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            chunk = next(self._stream)
+        except StopIteration:
+            self._waited += time.perf_counter() - started
+            self._flush()
+            raise
+        wait = time.perf_counter() - started
+        self._waited += wait
+        text = ""
+        if chunk.choices:
+            text = getattr(chunk.choices[0].delta, "content", None) or ""
+        if getattr(chunk, "usage", None):
+            self._usage = _usage_dict(chunk.usage)
+        self._chunks.append([round(wait, 6), len(text)])
+        self._content.append(text)
+        return chunk
+
+    def _flush(self) -> None:
+        if self._done or self._call is None:
+            return
+        self._done = True
+        content = "".join(self._content)
+        self._call.add({
+            "kind": "openai", "op": self._op, "seconds": round(self._waited, 6), "stream": True,
+            "content": _scrub(content), "chunks": self._chunks, "usage": self._usage,
+        })
+
+def _usage_dict(usage) -> dict:
+    if usage is None:
+        return None
+    values = {key: getattr(usage, key, 0) or 0 for key in ("prompt_tokens", "completion_tokens", "total_tokens")}
+    cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+    values["prompt_tokens_details"] = {"cached_tokens": cached}
+    return values
+
+class _RecordingCompletions:
+    def __init__(self, completions):
+        self._completions = completions
+
+    def create(self, **kwargs):
+        started = time.perf_counter()
+        response = self._completions.create(**kwargs)
+        if kwargs.get("stream"):
+            return _RecordingStream(response, "chat")
+        choice = response.choices[0]
+        _record_backend(
+            "openai", "chat", started, scrubbed={"content": choice.message.content},
+            finish_reason=getattr(choice, "finish_reason", None), usage=_usage_dict(getattr(response, "usage", None)),
+        )
+        return response
+
+class _RecordingImages:
+    def __init__(self, images):
+        self._images = images
+
+    def generate(self, **kwargs):
+        started = time.perf_counter()
+        response = self._images.generate(**kwargs)
+        _record_backend("openai", "image", started, scrubbed={"url": response.data[0].url})
+        return response
+
+def wrap_openai(client):
+    """기록 모드에서 OpenAI 클라이언트 호출을 기록하는 대리 객체를 돌려줍니다. (꺼져 있으면 그대로)"""
+    if not is_recording() or client is None:
+        return client
+    return SimpleNamespace(
+        chat=SimpleNamespace(completions=_RecordingCompletions(client.chat.completions)),
+        images=_RecordingImages(client.images),
+    )
+
+class _RecordingQuery:
+    """Supabase 질의 빌더를 감싸 execute() 결과를 기록합니다."""
+
+    def __init__(self, query, op: str):
+        self._query = query
+        self._op = op
+        self._chain = []
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+
+        def method(*args, **kwargs):
+            self._chain.append(name)
+            self._query = attr(*args, **kwargs)
+            return self
+        return method
+
+    def execute(self):
+        started = time.perf_counter()
+        result = self._query.execute()
+        _record_backend(
+            "supabase", self._op, started, scrubbed={"data": getattr(result, "data", None)},
+            chain=self._chain, count=getattr(result, "count", None),
+        )
+        return result
+
+class _RecordingBucket:
+    def __init__(self, bucket):
+        self._bucket = bucket
+
+    def __getattr__(self, name):
+        attr = getattr(self._bucket, name)
+
+        def method(*args, **kwargs):
+            started = time.perf_counter()
+            result = attr(*args, **kwargs)
+            _record_backend("storage", name, started, scrubbed={"result": result if isinstance(result, str) else None})
+            return result
+        return method
+
+class _RecordingSupabase:
+    def __init__(self, client):
+        self._client = client
+        self.storage = SimpleNamespace(from_=lambda name: _RecordingBucket(client.storage.from_(name)))
+
+    def table(self, name: str):
+        return _RecordingQuery(self._client.table(name), name)
+
+    def rpc(self, name: str, params: dict = None):
+        return _RecordingQuery(self._client.rpc(name, params or {}), f"rpc:{name}")
+
+def wrap_supabase(client):
+    """기록 모드에서 Supabase 클라이언트 호출을 기록하는 대리 객체를 돌려줍니다. (꺼져 있으면 그대로)"""
+    if not is_recording() or client is None:
+        return client
+    return _RecordingSupabase(client)
+
+# ---- 재생 ----
+
+class TraceMismatch(Exception):
+    """재생 중인 코드가 기록과 다른 외부 호출을 할 때 발생합니다."""
+
+class _Playback:
+    """helper 호출 하나의 기록된 외부 호출을 순서대로 돌려줍니다."""
+
+    def __init__(self, calls: list, speed: float):
+        self.calls = list(calls)
+        self.speed = speed
+        self.position = 0
+        self.slept = 0.0
+        self.mismatches = []
+
+    def next(self, kind: str, op: str = None) -> dict:
+        if self.position >= len(self.calls):
+            self.mismatches.append(f"추가 호출 {kind}:{op}")
+            raise TraceMismatch(f"기록에 없는 호출: {kind}:{op}")
+        record = self.calls[self.position]
+        self.position += 1
+        if record["kind"] != kind or (op is not None and record["op"] != op):
+            self.mismatches.append(f"{record['kind']}:{record['op']} 대신 {kind}:{op}")
+        if not record.get("stream"):
+            self.sleep(record["seconds"])
+        return record
+
+    def sleep(self, seconds: float) -> None:
+        seconds *= self.speed
+        if seconds > 0:
+            started = time.perf_counter()
+            time.sleep(seconds)
+            self.slept += time.perf_counter() - started
+
+_playback = threading.local()
+
+def _current() -> _Playback:
+    return _playback.current
+
+def _namespace(value):
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: _namespace(v) for k, v in value.items()})
+    return value
+
+class _StubCompletions:
+    def create(self, **kwargs):
+        playback = _current()
+        record = playback.next("openai", "chat")
+        usage = _namespace(record.get("usage")) if record.get("usage") else None
+        content = record.get("content") or ""
+        if not record.get("stream"):
+            message = SimpleNamespace(content=content, role="assistant")
+            choice = SimpleNamespace(message=message, finish_reason=record.get("finish_reason"))
+            return SimpleNamespace(choices=[choice], usage=usage)
+
+        def chunks():
+            # 조각 길이를 가린 내용 길이에 맞춰 나눕니다
+            total = sum(length for _, length in record["chunks"]) or 1
+            scale = len(content) / total
+            position, consumed = 0, 0
+            for wait, length in record["chunks"]:
+                playback.sleep(wait)
+                consumed += length
+                end = round(consumed * scale)
+                text, position = content[position:end], end
+                if length or text:
+                    delta = SimpleNamespace(content=text)
+                    yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+            yield SimpleNamespace(choices=[], usage=usage)
+        return chunks()
+
+class _StubImages:
+    def generate(self, **kwargs):
+        record = _current().next("openai", "image")
+        return SimpleNamespace(data=[SimpleNamespace(url=record.get("url"))])
+
+class _StubQuery:
+    def __init__(self, op: str):
+        self._op = op
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        record = _current().next("supabase", self._op)
+        return SimpleNamespace(data=record.get("data"), count=record.get("count"))
+
+class _StubBucket:
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            return _current().next("storage", name).get("result")
+        return method
+
+class _StubSupabase:
+    def __init__(self):
+        self.storage = SimpleNamespace(from_=lambda name: _StubBucket())
+
+    def table(self, name: str):
+        return _StubQuery(name)
+
+    def rpc(self, name: str, params: dict = None):
+        return _StubQuery(f"rpc:{name}")
+
+def load_trace(path: str) -> list:
+    """기록 파일의 helper 호출 기록 목록을 읽습니다."""
+    opener = gzip.open if path.endswith(".gz") else open
+    entries = []
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 기록 중에 끊긴 마지막 줄
+                continue
+            if "helper" in record:
+                entries.append(record)
+    return entries
+
+def _restore(value, image: bytes):
+    if isinstance(value, dict):
+        if "__bytes__" in value:
+            return image
+        if "__type__" in value:
+            return None
+        return {k: _restore(v, image) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_restore(v, image) for v in value]
+    return value
+
+def _resolve(helper: str):
+    module_name, _, name = helper.rpartition(".")
+    module = __import__(module_name, fromlist=[name])
+    return getattr(module, name)
+
+def replay_entry(entry: dict, speed: float, image: bytes) -> dict:
+    """
+    기록된 helper 호출 하나를 현재 코드로 다시 실행합니다.
+
+    Returns:
+        {"helper", "overhead", "recorded_overhead", "mismatches", "result"}
+    """
+    playback = _Playback(entry["calls"], speed)
+    _playback.current = playback
+    func = _resolve(entry["helper"])
+    kwargs = _restore(entry["arguments"], image)
+
+    started = time.perf_counter()
+    try:
+        result = func(**kwargs)
+        if inspect.isgenerator(result):
+            result = list(result)
+        shape = _result_shape(result)
+    except Exception as e:
+        shape = "error"
+        if not isinstance(e, TraceMismatch):
+            playback.mismatches.append(f"예외 {type(e).__name__}")
+    elapsed = time.perf_counter() - started
+    _playback.current = None
+
+    if playback.position < len(playback.calls):
+        playback.mismatches.append(f"빠진 호출 {len(playback.calls) - playback.position}개")
+    expected = "error" if entry.get("error") else entry.get("result")
+    if expected and shape != expected:
+        playback.mismatches.append(f"결과 {expected} 대신 {shape}")
+    return {
+        "helper": entry["helper"],
+        "overhead": max(0.0, elapsed - playback.slept),
+        "recorded_overhead": max(0.0, entry["seconds"] - entry["backend_seconds"]),
+        "mismatches": playback.mismatches,
+    }
+
+def replay(entries: list, speed: float = 1.0, repeat: int = 1) -> dict:
+    """
+    기록 전체를 repeat번 재생하고 helper별 로컬 처리 시간을 모읍니다.
+
+    Args:
+        entries: load_trace 결과
+        speed: 기록된 지연 시간 배율 (0이면 기다리지 않음)
+        repeat: 반복 횟수
+
+    Returns:
+        {helper: {"count", "p50_ms", "p95_ms", "recorded_p50_ms", "mismatches"}}
+    """
+    from utils import metrics, openai_helper, supabase_helper
+    from utils.admission import configure_admission
+    from utils.fakes import fake_image_bytes
+
+    openai_helper._client = SimpleNamespace(chat=SimpleNamespace(completions=_StubCompletions()), images=_StubImages())
+    supabase_helper._client = _StubSupabase()
+    # 재생은 수락 제어 한도에 걸리지 않아야 합니다
+    configure_admission(rate_per_minute=1_000_000, burst=1_000_000, max_concurrency=64)
+    image = fake_image_bytes()
+
+    overheads = defaultdict(list)
+    recorded = defaultdict(list)
+    mismatches = defaultdict(list)
+    for _ in range(repeat):
+        for entry in entries:
+            # 외부 호출 없이 로컬에서 끝난 호출(로컬 복제본 조회 등)은 재생 환경에서 재현할 수 없어 건너뜁니다
+            if not entry["calls"]:
+                continue
+            result = replay_entry(entry, speed, image)
+            overheads[result["helper"]].append(result["overhead"])
+            recorded[result["helper"]].append(result["recorded_overhead"])
+            if result["mismatches"]:
+                mismatches[result["helper"]].append("; ".join(result["mismatches"]))
+
+    return {
+        helper: {
+            "count": len(values),
+            "p50_ms": round(metrics.percentile(values, 50) * 1000, 3),
+            "p95_ms": round(metrics.percentile(values, 95) * 1000, 3),
+            "recorded_p50_ms": round(metrics.percentile(recorded[helper], 50) * 1000, 3),
+            "mismatches": sorted(set(mismatches[helper]))[:5],
+            "mismatch_count": len(mismatches[helper]),
+        }
+        for helper, values in sorted(overheads.items())
+    }
+
+def check(report: dict, baseline: dict, tolerance: float) -> list:
+    """기준 재생 결과 대비 로컬 처리 시간이 늘어난 helper를 설명하는 문구 목록을 반환합니다."""
+    problems = []
+    for helper, stats in report.items():
+        base = baseline.get(helper)
+        if not base:
+            continue
+        limit = base["p50_ms"] * (1 + tolerance)
+        if stats["p50_ms"] > limit and stats["p50_ms"] - base["p50_ms"] > MIN_REGRESSION_MS:
+            problems.append(f"{helper}: 로컬 처리 p50 {stats['p50_ms']:.1f} ms > 기준 {base['p50_ms']:.1f} ms "
+                            f"(+{tolerance:.0%} 허용)")
+    return problems
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="사담 트래픽 재생 (로컬 처리 시간 회귀 확인)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay_parser = subparsers.add_parser("replay", help="기록을 현재 코드로 재생")
+    replay_parser.add_argument("trace", help="기록 파일 (TRAFFIC_RECORD로 남긴 .jsonl 또는 .jsonl.gz)")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="기록된 지연 시간 배율 (0이면 기다리지 않음)")
+    replay_parser.add_argument("--repeat", type=int, default=1, help="반복 재생 횟수")
+    replay_parser.add_argument("--baseline", help="비교할 기준 재생 결과 JSON 파일")
+    replay_parser.add_argument("--tolerance", type=float, default=0.25, help="기준 대비 허용 증가율")
+    replay_parser.add_argument("--save-baseline", help="재생 결과를 기준값으로 저장할 파일")
+    replay_parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    args = parser.parse_args(argv)
+
+    # 재생 환경: 외부 연결과 로컬 복제본 없이 기록만으로 실행합니다
+    os.environ["REPLICA_PATH"] = ""
+    os.environ.setdefault("OPENAI_API_KEY", "traffic-replay")
+
+    entries = load_trace(args.trace)
+    print(f"🔄 helper 호출 {len(entries)}건 재생 중...")
+    report = replay(entries, args.speed, args.repeat)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"   {'helper':<48}{'횟수':>6}{'기록 p50':>10}{'재생 p50':>10}{'재생 p95':>10}{'불일치':>8}")
+        for helper, stats in report.items():
+            print(f"   {helper.replace('utils.', ''):<48}{stats['count']:>6}{stats['recorded_p50_ms']:>10.2f}"
+                  f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['mismatch_count']:>8}")
+        for helper, stats in report.items():
+            for mismatch in stats["mismatches"]:
+                print(f"⚠️ {helper}: 기록과 다른 호출 - {mismatch}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ 기준값 저장: {args.save_baseline}")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    problems = check(report, baseline, args.tolerance)
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem}")
+        return 1
+    print("✅ 로컬 처리 시간 회귀 없음")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())